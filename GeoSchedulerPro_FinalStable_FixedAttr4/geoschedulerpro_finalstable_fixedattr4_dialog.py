@@ -1,11 +1,15 @@
 \
-from qgis.PyQt import QtWidgets, QtCore
+from qgis.PyQt import QtWidgets
 from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsField, QgsFeature, QgsGeometry,
-    QgsPointXY, QgsVectorFileWriter, QgsCoordinateTransform, QgsVectorDataProvider
+    QgsApplication, QgsProject, QgsVectorLayer, QgsField, QgsFeature, QgsGeometry,
+    QgsPointXY, QgsCoordinateTransform, QgsVectorLayerFeatureSource
 )
 from qgis.PyQt.QtCore import QVariant
-import processing, tempfile, os, math, random
+import os
+
+from geoscheduler_core import NS_EW_SPLITS, TIME_MODES, default_workers, junction_weights
+from geoscheduler_core.qgis_io import AttributeWriteError, CentroidCache, write_attribute_values
+from .geoschedulerpro_finalstable_fixedattr4_task import GeoSchedulerProFinalStableFixedAttr4Task
 
 class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
     """
@@ -33,7 +37,7 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
         param_row = QtWidgets.QHBoxLayout()
         param_row.addWidget(QtWidgets.QLabel('Max representatives per side:'))
         self.max_spin = QtWidgets.QSpinBox()
-        self.max_spin.setRange(1,20)
+        self.max_spin.setRange(1,500)
         self.max_spin.setValue(5)
         param_row.addWidget(self.max_spin)
 
@@ -44,13 +48,49 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
         self.density.setValue(0.1)
         param_row.addWidget(self.density)
 
+        param_row.addWidget(QtWidgets.QLabel('Worker processes:'))
+        self.workers_spin = QtWidgets.QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(default_workers())
+        param_row.addWidget(self.workers_spin)
+
         layout.addLayout(param_row)
 
+        # junctions further than this from a network node get no corridor density
+        snap_row = QtWidgets.QHBoxLayout()
+        snap_row.addWidget(QtWidgets.QLabel('Junction snap tolerance (map units):'))
+        self.snap_spin = QtWidgets.QDoubleSpinBox()
+        self.snap_spin.setDecimals(6)
+        self.snap_spin.setRange(0.000001, 1000.0)
+        self.snap_spin.setSingleStep(0.1)
+        self.snap_spin.setValue(0.000001)
+        snap_row.addWidget(self.snap_spin)
+        # representatives are picked by k-means; a fixed seed makes runs repeatable
+        snap_row.addWidget(QtWidgets.QLabel('Clustering seed:'))
+        self.seed_spin = QtWidgets.QSpinBox()
+        self.seed_spin.setRange(-1, 2147483647)
+        self.seed_spin.setSpecialValueText('random')
+        self.seed_spin.setValue(0)
+        snap_row.addWidget(self.seed_spin)
+        layout.addLayout(snap_row)
+
+        # adaptive sampling routes OD pairs in batches until corridors stop changing
+        adaptive_row = QtWidgets.QHBoxLayout()
+        self.adaptive_check = QtWidgets.QCheckBox('Adaptive sampling (stop when corridors converge)')
+        adaptive_row.addWidget(self.adaptive_check)
+        adaptive_row.addWidget(QtWidgets.QLabel('Convergence tolerance:'))
+        self.adaptive_tol = QtWidgets.QDoubleSpinBox()
+        self.adaptive_tol.setRange(0.0, 0.5)
+        self.adaptive_tol.setSingleStep(0.01)
+        self.adaptive_tol.setValue(0.02)
+        adaptive_row.addWidget(self.adaptive_tol)
+        layout.addLayout(adaptive_row)
+
         # Time-of-day selector
         time_row = QtWidgets.QHBoxLayout()
         time_row.addWidget(QtWidgets.QLabel('Time of Day:'))
         self.time_combo = QtWidgets.QComboBox()
-        self.time_combo.addItems(['AM Peak','PM Peak','Off-Peak'])
+        self.time_combo.addItems(list(TIME_MODES))
         time_row.addWidget(self.time_combo)
         layout.addLayout(time_row)
 
@@ -58,17 +98,44 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
         debug_row = QtWidgets.QHBoxLayout()
         self.debug_check = QtWidgets.QCheckBox('Create debug centroid layers (visible)')
         debug_row.addWidget(self.debug_check)
+        self.cache_check = QtWidgets.QCheckBox('Reuse cached routes')
+        self.cache_check.setChecked(True)
+        debug_row.addWidget(self.cache_check)
         layout.addLayout(debug_row)
 
+        btn_row = QtWidgets.QHBoxLayout()
         self.run_btn = QtWidgets.QPushButton('Run Stable GeoScheduler')
         self.run_btn.clicked.connect(self.run_model)
-        layout.addWidget(self.run_btn)
+        btn_row.addWidget(self.run_btn)
+        # reroutes only the pairs a road edit affects, reusing the last run
+        self.update_btn = QtWidgets.QPushButton('Update after network edits')
+        self.update_btn.setEnabled(False)
+        self.update_btn.clicked.connect(self.update_model)
+        btn_row.addWidget(self.update_btn)
+        self.cancel_btn = QtWidgets.QPushButton('Cancel')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_run)
+        btn_row.addWidget(self.cancel_btn)
+        layout.addLayout(btn_row)
 
         self.status = QtWidgets.QLabel('')
         layout.addWidget(self.status)
 
         self.setLayout(layout)
         self.populate_all()
+        self.task = None
+        self.debug_created = []
+        # per-junction corridor density of the last run, reused by reweight()
+        self.junction_layer = None
+        self.junction_fids = []
+        self.junction_density = None
+        # zone centroids reused by later runs until a zone layer changes
+        self.centroid_cache = CentroidCache()
+        self.centroid_layers = (None, None)
+        # (RouteIndex, CorridorUsage) of the last run, for update_model()
+        self.route_state = None
+        self.time_combo.currentIndexChanged.connect(self.reweight)
+        self.density.valueChanged.connect(self.reweight)
 
     def layer_selector(self, label):
         box = QtWidgets.QHBoxLayout()
@@ -115,94 +182,21 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
             return None, None, None, None
         return origin[0], dest[0], road[0], junction[0]
 
-    def centroids_with_reprojection(self, layer, target_crs):
-        pts = []
-        src_crs = layer.crs()
-        transform = QgsCoordinateTransform(src_crs, target_crs, QgsProject.instance())
-        for feat in layer.getFeatures():
-            geom = feat.geometry()
-            if not geom or geom.isEmpty():
-                continue
-            try:
-                c = geom.centroid()
-                pt = c.asPoint()
-                tpt = transform.transform(pt)
-                pts.append(tpt)
-            except Exception:
-                continue
-        return pts
-
-    def km_reduce(self, pts, k):
-        if len(pts) <= k:
-            return pts
-        arr = [(p.x(), p.y()) for p in pts]
-        centers = random.sample(arr, k)
-        for _ in range(8):
-            clusters = [[] for _ in range(k)]
-            for p in arr:
-                dists = [ (p[0]-c[0])**2 + (p[1]-c[1])**2 for c in centers ]
-                idx = dists.index(min(dists))
-                clusters[idx].append(p)
-            new = []
-            for group in clusters:
-                if group:
-                    x = sum([p[0] for p in group]) / len(group)
-                    y = sum([p[1] for p in group]) / len(group)
-                    new.append((x,y))
-                else:
-                    new.append(random.choice(arr))
-            centers = new
-        return [QgsPointXY(c[0], c[1]) for c in centers]
-
-    def to_qneat_point_str(self, pt, crs):
-        return f"{pt.x()},{pt.y()} [{crs.authid()}]"
-
-    def run_qneat(self, road_layer, start_str, end_str):
-        params = {
-            'DEFAULT_DIRECTION' : 2,
-            'DEFAULT_SPEED' : 5,
-            'DIRECTION_FIELD' : '',
-            'END_POINT' : end_str,
-            'ENTRY_COST_CALCULATION_METHOD' : 0,
-            'INPUT' : road_layer.source() if hasattr(road_layer, 'source') else road_layer,
-            'OUTPUT' : 'memory:',
-            'SPEED_FIELD' : '',
-            'START_POINT' : start_str,
-            'STRATEGY' : 0,
-            'TOLERANCE' : 0,
-            'VALUE_BACKWARD' : '',
-            'VALUE_BOTH' : '',
-            'VALUE_FORWARD' : ''
-        }
-        try:
-            res = processing.run('qneat3:shortestpathpointtopoint', params)
-            out = res.get('OUTPUT') or res.get('output') or list(res.values())[0]
-            if isinstance(out, str) and os.path.exists(out):
-                lyr = QgsVectorLayer(out, 'qneat3_path', 'ogr')
-                return lyr if lyr.isValid() else None
-            if isinstance(out, QgsVectorLayer):
-                return out
-            return None
-        except Exception:
-            return None
-
-    def aggregate_paths_density(self, path_layers):
-        counts = {}
-        for lyr in path_layers:
-            for feat in lyr.getFeatures():
-                geom = feat.geometry()
-                if not geom: continue
-                if geom.isMultipart():
-                    parts = geom.asMultiPolyline()
-                else:
-                    parts = [geom.asPolyline()]
-                for part in parts:
-                    for p in part:
-                        key = (round(p.x(),6), round(p.y(),6))
-                        counts[key] = counts.get(key, 0) + 1
-        maxc = max(counts.values()) if counts else 1
-        density = {k: v/maxc for k, v in counts.items()}
-        return density
+    def make_debug_layer(self, pts, name, crs):
+        mem = QgsVectorLayer('Point?crs={}'.format(crs.authid()), name, 'memory')
+        prov = mem.dataProvider()
+        prov.addAttributes([QgsField('id', QVariant.Int)])
+        mem.updateFields()
+        feats = []
+        i = 1
+        for x, y in pts:
+            f = QgsFeature(mem.fields())
+            f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(float(x), float(y))))
+            f['id'] = i; i += 1
+            feats.append(f)
+        prov.addFeatures(feats); mem.updateExtents()
+        QgsProject.instance().addMapLayer(mem)
+        self.debug_created.append(mem)
 
     def ensure_junction_fields(self, junction_layer):
         # Try to add missing fields, return list of actually available field names after attempt
@@ -222,7 +216,15 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
                 return existing
         return existing
 
+    def run_folder(self):
+        # Attr4 has no output file of its own, so files kept between runs live in the QGIS profile
+        folder = os.path.join(QgsApplication.qgisSettingsDirPath(), 'GeoScheduler')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
     def run_model(self):
+        if self.task is not None:
+            return
         origin_name = self.origin_combo['combo'].currentText()
         dest_name = self.dest_combo['combo'].currentText()
         road_name = self.road_combo['combo'].currentText()
@@ -232,141 +234,159 @@ class GeoSchedulerProFinalStableFixedAttr4Dialog(QtWidgets.QDialog):
         if origin_layer is None:
             return
 
-        self.status.setText('Computing centroids and reprojecting to road CRS...')
-        QtCore.QCoreApplication.processEvents()
-
+        # feature sources are snapshots that are safe to iterate from the task thread
         road_crs = road_layer.crs()
-        origin_pts = self.centroids_with_reprojection(origin_layer, road_crs)
-        dest_pts = self.centroids_with_reprojection(dest_layer, road_crs)
+        ctx = QgsProject.instance().transformContext()
+        params = {
+            'origin_source': QgsVectorLayerFeatureSource(origin_layer),
+            'origin_transform': QgsCoordinateTransform(origin_layer.crs(), road_crs, ctx),
+            'dest_source': QgsVectorLayerFeatureSource(dest_layer),
+            'dest_transform': QgsCoordinateTransform(dest_layer.crs(), road_crs, ctx),
+            'road_source': QgsVectorLayerFeatureSource(road_layer),
+            'junction_source': QgsVectorLayerFeatureSource(junction_layer),
+            'maxrep': int(self.max_spin.value()),
+            'workers': int(self.workers_spin.value()),
+            'threshold': self.density.value(),
+            'snap_tolerance': self.snap_spin.value(),
+            'seed': self.seed_spin.value(),
+            'adaptive': self.adaptive_check.isChecked(),
+            'adaptive_tol': self.adaptive_tol.value(),
+            'cache_path': os.path.join(self.run_folder(), 'Attr4_route_cache.sqlite') if self.cache_check.isChecked() else '',
+            'time_mode': self.time_combo.currentText(),
+            'origin_xy': self.centroid_cache.get(origin_layer, road_crs),
+            'dest_xy': self.centroid_cache.get(dest_layer, road_crs),
+            'report_path': os.path.join(self.run_folder(), 'Attr4_run_report.json'),
+        }
+        self.centroid_layers = (origin_layer, dest_layer)
+        self.junction_layer = junction_layer
+        self.junction_density = None
+        self.route_state = None
+        self.road_crs = road_crs
+        self.debug_created = []
 
-        if not origin_pts or not dest_pts:
-            self.show_message('No centroids found after reprojection. Check layer extents and CRS.')
-            return
+        self.start_task(params)
 
-        # optional debug layers
-        debug_created = []
-        if self.debug_check.isChecked():
-            orig_mem = QgsVectorLayer('Point?crs={}'.format(road_crs.authid()), 'geo_orig_debug', 'memory')
-            prov = orig_mem.dataProvider()
-            prov.addAttributes([QgsField('id', QVariant.Int)])
-            orig_mem.updateFields()
-            feats = []
-            i = 1
-            for p in origin_pts:
-                f = QgsFeature(orig_mem.fields())
-                f.setGeometry(QgsGeometry.fromPointXY(p))
-                f['id'] = i; i += 1
-                feats.append(f)
-            prov.addFeatures(feats); orig_mem.updateExtents()
-            QgsProject.instance().addMapLayer(orig_mem)
-            debug_created.append(orig_mem)
-
-            dest_mem = QgsVectorLayer('Point?crs={}'.format(road_crs.authid()), 'geo_dest_debug', 'memory')
-            prov2 = dest_mem.dataProvider()
-            prov2.addAttributes([QgsField('id', QVariant.Int)])
-            dest_mem.updateFields()
-            feats2 = []
-            i = 1
-            for p in dest_pts:
-                f = QgsFeature(dest_mem.fields())
-                f.setGeometry(QgsGeometry.fromPointXY(p))
-                f['id'] = i; i += 1
-                feats2.append(f)
-            prov2.addFeatures(feats2); dest_mem.updateExtents()
-            QgsProject.instance().addMapLayer(dest_mem)
-            debug_created.append(dest_mem)
-
-        # reduce representatives if needed
-        maxrep = int(self.max_spin.value())
-        if len(origin_pts) > maxrep:
-            origin_pts = self.km_reduce(origin_pts, maxrep)
-        if len(dest_pts) > maxrep:
-            dest_pts = self.km_reduce(dest_pts, maxrep)
-
-        total_pairs = len(origin_pts) * len(dest_pts)
-        self.status.setText(f'Routing {len(origin_pts)}x{len(dest_pts)} = {total_pairs} pairs...')
-        QtCore.QCoreApplication.processEvents()
-
-        path_layers = []
-        processed = 0
-        for o in origin_pts:
-            for d in dest_pts:
-                processed += 1
-                self.status.setText(f'Routing {processed}/{total_pairs}...')
-                QtCore.QCoreApplication.processEvents()
-                start_str = self.to_qneat_point_str(o, road_crs)
-                end_str = self.to_qneat_point_str(d, road_crs)
-                pl = self.run_qneat(road_layer, start_str, end_str)
-                if pl is not None:
-                    path_layers.append(pl)
-
-        if not path_layers:
-            self.show_message('No paths could be computed. Check QNEAT3 and network layer.')
-            for layer in debug_created:
-                try: QgsProject.instance().removeMapLayer(layer.id())
-                except Exception: pass
+    def update_model(self):
+        if self.task is not None or self.route_state is None:
             return
-
-        self.status.setText('Aggregating path density...')
-        QtCore.QCoreApplication.processEvents()
-        density = self.aggregate_paths_density(path_layers)
-        threshold = self.density.value()
-
-        # ensure junction fields exist and get actual fields
-        actual_fields = self.ensure_junction_fields(junction_layer)
-
-        # update junctions based on density; only write fields that actually exist
-        writable = set(actual_fields)
-        try:
-            if not junction_layer.isEditable():
-                ok = junction_layer.startEditing()
-        except Exception:
-            ok = False
-
-        updated = 0
-        for feat in junction_layer.getFeatures():
-            geom = feat.geometry()
-            if not geom: continue
-            pt = geom.asPoint()
-            key = (round(pt.x(),6), round(pt.y(),6))
-            dens = density.get(key, 0.0)
-            if dens >= threshold:
-                t = self.time_combo.currentText()
-                if t == 'AM Peak':
-                    ns, ew = 0.75, 0.25
-                elif t == 'PM Peak':
-                    ns, ew = 0.25, 0.75
-                else:
-                    ns, ew = 0.5, 0.5
-                if 'UsedByCommuters' in writable:
-                    feat['UsedByCommuters'] = 1
-            else:
-                ns, ew = 0.5, 0.5
-                if 'UsedByCommuters' in writable:
-                    feat['UsedByCommuters'] = 0
-            if 'N_S_Weight' in writable:
-                feat['N_S_Weight'] = ns
-            if 'E_W_Weight' in writable:
-                feat['E_W_Weight'] = ew
-            try:
-                junction_layer.updateFeature(feat)
-                updated += 1
-            except Exception:
-                # if update fails (e.g., read-only shapefile), skip writing and continue
-                continue
-
+        road_layer = QgsProject.instance().mapLayersByName(self.road_combo['combo'].currentText())
         try:
-            if junction_layer.isEditable():
-                junction_layer.commitChanges()
-        except Exception:
-            pass
+            junction_ok = QgsProject.instance().mapLayer(self.junction_layer.id()) is not None
+        except RuntimeError:
+            junction_ok = False
+        if not road_layer or not junction_ok:
+            self.show_message('The road network or junction layer of the last run is missing.')
+            return
+        # the feature source includes unsaved edits, so closures can be tried before saving
+        params = {
+            'road_source': QgsVectorLayerFeatureSource(road_layer[0]),
+            'junction_source': QgsVectorLayerFeatureSource(self.junction_layer),
+            'snap_tolerance': self.snap_spin.value(),
+            'previous': self.route_state,
+            'report_path': os.path.join(self.run_folder(), 'Attr4_run_report.json'),
+        }
+        self.debug_created = []
+        self.start_task(params)
 
+    def start_task(self, params):
+        task = GeoSchedulerProFinalStableFixedAttr4Task(params)
+        task.statusChanged.connect(self.status.setText)
+        if self.debug_check.isChecked():
+            task.centroidsReady.connect(self.show_debug_centroids)
+        task.taskCompleted.connect(self.task_completed)
+        task.taskTerminated.connect(self.task_terminated)
+        self.task = task
+        self.run_btn.setEnabled(False)
+        self.update_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        QgsApplication.taskManager().addTask(task)
+
+    def cancel_run(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def show_debug_centroids(self):
+        self.make_debug_layer(self.task.origin_pts, 'geo_orig_debug', self.road_crs)
+        self.make_debug_layer(self.task.dest_pts, 'geo_dest_debug', self.road_crs)
+
+    def finish_run(self):
         # cleanup debug layers if any
-        for layer in debug_created:
+        for layer in self.debug_created:
             try:
                 QgsProject.instance().removeMapLayer(layer.id())
             except Exception:
                 pass
-
-        self.status.setText(f'Completed. Updated {updated} junctions.')
+        self.debug_created = []
+        self.task = None
+        self.run_btn.setEnabled(True)
+        self.update_btn.setEnabled(self.route_state is not None)
+        self.cancel_btn.setEnabled(False)
+
+    def task_terminated(self):
+        message = self.task.message
+        self.finish_run()
+        if message:
+            self.status.setText(message)
+            self.show_message(message)
+        else:
+            self.status.setText('Run cancelled.')
+
+    def write_junction_weights(self):
+        """Apply the weighting rule to the stored junction densities and write the fields."""
+        junction_layer = self.junction_layer
+        used, ns, ew = junction_weights(self.junction_density, self.density.value(),
+                                        self.time_combo.currentText(), NS_EW_SPLITS)
+
+        # ensure junction fields exist; only fields that actually exist are written
+        self.ensure_junction_fields(junction_layer)
+        fields = junction_layer.fields()
+        iu, ins, iew = fields.indexOf('UsedByCommuters'), fields.indexOf('N_S_Weight'), fields.indexOf('E_W_Weight')
+        values = {}
+        for fid, u, a, b in zip(self.junction_fids, used, ns, ew):
+            attrs = {}
+            if iu >= 0:
+                attrs[iu] = int(u)
+            if ins >= 0:
+                attrs[ins] = float(a)
+            if iew >= 0:
+                attrs[iew] = float(b)
+            if attrs:
+                values[fid] = attrs
+        if not values:
+            return 0
+        try:
+            return write_attribute_values(junction_layer, values)
+        except AttributeWriteError as e:
+            # read-only or locked source (e.g. shapefile in use elsewhere)
+            self.show_message(f'Junction weights were not fully written ({e.written} junctions changed): {e}')
+            return e.written
+
+    def reweight(self):
+        # time mode / threshold changes only redo the weighting, routing results are kept
+        if self.task is not None or self.junction_density is None:
+            return
+        try:
+            if QgsProject.instance().mapLayer(self.junction_layer.id()) is None:
+                return
+        except RuntimeError:
+            # junction layer was deleted since the run
+            return
+        updated = self.write_junction_weights()
+        self.status.setText(f'{self.time_combo.currentText()}: {updated} junctions changed.')
+
+    def task_completed(self):
+        task = self.task
+        self.status.setText('Writing junction weights...')
+        self.junction_fids = task.junction_fids
+        self.junction_density = task.junction_density
+        self.route_state = (task.route_index, task.usage)
+        self.centroid_cache.put(self.centroid_layers[0], self.road_crs, task.origin_pts)
+        self.centroid_cache.put(self.centroid_layers[1], self.road_crs, task.dest_pts)
+        updated = self.write_junction_weights()
+
+        self.finish_run()
+        note = task.sampling_note + task.cache_note + task.update_note
+        if task.report_file:
+            note += f' Run report: {task.report_file}'
+        self.status.setText(f'Completed. Updated {updated} junctions.' + note)
         self.show_message('GeoScheduler Pro finished successfully.')
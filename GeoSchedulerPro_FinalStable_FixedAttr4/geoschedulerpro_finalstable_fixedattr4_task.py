@@ -0,0 +1,231 @@
+from qgis.core import QgsTask
+from qgis.PyQt.QtCore import pyqtSignal
+import time
+
+import numpy as np
+
+from geoscheduler_core import (
+    RouteIndex, RoutingCanceled, RunReport, density_at, match_points, representatives,
+    reroute_after_edit, route_od
+)
+from geoscheduler_core.qgis_io import graph_from_layer, point_arrays, zone_centroids
+
+
+class GeoSchedulerProFinalStableFixedAttr4Task(QgsTask):
+    """
+    Background part of a run: centroids, representative reduction, routing,
+    density aggregation and the corridor density of every junction. It only reads from
+    feature sources; edits to the junction layer and debug layers are applied
+    by the dialog once the task is back on the main thread.
+    """
+    statusChanged = pyqtSignal(str)
+    centroidsReady = pyqtSignal()
+
+    def __init__(self, params):
+        super().__init__('GeoScheduler Pro (Stable Fixed Attr4)', QgsTask.CanCancel)
+        self.params = params
+        # zone centroids in the road CRS, (n, 2) arrays
+        self.origin_pts = None
+        self.dest_pts = None
+        self.junction_fids = []
+        self.junction_density = None
+        self.route_count = 0
+        self.sampling_note = ''
+        self.cache_note = ''
+        self.update_note = ''
+        # routes and corridor counts of the run, kept for incremental updates
+        self.route_index = None
+        self.usage = None
+        self.message = ''
+        # timings, counters and pair failures, written next to the junction layer as JSON
+        self.report = RunReport()
+        self.report_file = ''
+
+    def set_status(self, text):
+        self.statusChanged.emit(text)
+
+    def seed(self):
+        seed = self.params['seed']
+        return None if seed < 0 else seed
+
+    def match_junctions(self, junction_source, graph):
+        # every junction is matched to its nearest network node within the snap tolerance
+        with self.report.stage('junction_match'):
+            fids, xs, ys = point_arrays(junction_source)
+            nodes = match_points(graph.node_x, graph.node_y, xs, ys, self.params['snap_tolerance'])
+        self.report.count('junctions', len(fids))
+        self.report.count('junctions_unmatched', np.count_nonzero(nodes < 0))
+        return fids, nodes
+
+    def route_pairs(self, graph, origin_xy, dest_xy, origin_w, dest_w, jnodes):
+        p = self.params
+        started = time.time()
+
+        def progress(done, total):
+            self.setProgress(15 + 70.0 * done / total)
+            eta = (time.time() - started) / done * (total - done)
+            self.set_status(f'Routing {done}/{total}... (about {eta:.0f}s left)')
+
+        res = route_od(graph, origin_xy, dest_xy, origin_w, dest_w, jnodes, p['threshold'],
+                       workers=p['workers'], adaptive=p['adaptive'], adaptive_tol=p['adaptive_tol'],
+                       seed=self.seed(), cache_path=p['cache_path'],
+                       progress=progress, is_canceled=self.isCanceled)
+        attempted = res.sampler.drawn if res.sampler is not None else len(origin_xy) * len(dest_xy)
+        self.report.count('pairs_attempted', attempted)
+        self.report.count('pairs_routed', len(res.routes))
+        self.report.count('route_segments', sum(len(r.edges) for r in res.routes))
+        # snapped ends in different network components
+        self.report.fail('unreachable', attempted - len(res.routes))
+        if res.sampler is not None:
+            self.sampling_note = (f' Routed {res.sampler.drawn}/{res.sampler.total_pairs} pairs, '
+                                  f'confidence {res.sampler.confidence:.2f}.')
+        self.route_index = RouteIndex(graph, res.routes, res.origin_nodes, res.dest_nodes,
+                                      res.sampler.drawn_mask() if res.sampler is not None else None,
+                                      origin_xy, dest_xy)
+        self.usage = res.usage
+        if res.cache_summary:
+            self.cache_note = ' ' + res.cache_summary.capitalize() + '.'
+        return res.routes, res.usage
+
+    def run(self):
+        try:
+            if self.params.get('previous') is not None:
+                ok = self.run_update()
+            else:
+                ok = self.run_pipeline()
+            self.report.finish('completed' if ok else 'canceled' if self.isCanceled() else 'failed')
+            return ok
+        except Exception as e:
+            self.message = f'GeoScheduler run failed: {e}'
+            self.report.set(error=str(e))
+            self.report.finish('failed')
+            return False
+        finally:
+            self.write_report()
+
+    def write_report(self):
+        p = self.params
+        if self.message:
+            self.report.set(message=self.message)
+        self.report.set(update=p.get('previous') is not None,
+                        settings={k: p[k] for k in ('maxrep', 'workers', 'threshold', 'snap_tolerance', 'seed',
+                                                     'adaptive', 'adaptive_tol', 'cache_path', 'time_mode')
+                                  if k in p})
+        if not p.get('report_path'):
+            return
+        try:
+            self.report_file = self.report.write(p['report_path'])
+        except OSError:
+            # a missing report never fails the run
+            self.report_file = ''
+
+    def run_pipeline(self):
+        p = self.params
+        report = self.report
+        self.set_status('Computing centroids and reprojecting to road CRS...')
+        # centroids cached by the dialog from an earlier run are passed in as arrays
+        with report.stage('centroids'):
+            self.origin_pts = p.get('origin_xy')
+            if self.origin_pts is None:
+                self.origin_pts = zone_centroids(p['origin_source'], p['origin_transform'], self.isCanceled)
+            self.setProgress(5)
+            self.dest_pts = p.get('dest_xy')
+            if self.dest_pts is None:
+                self.dest_pts = zone_centroids(p['dest_source'], p['dest_transform'], self.isCanceled)
+        report.count('origin_zones', len(self.origin_pts))
+        report.count('destination_zones', len(self.dest_pts))
+        self.setProgress(10)
+        if self.isCanceled():
+            return False
+        if not len(self.origin_pts) or not len(self.dest_pts):
+            self.message = 'No centroids found after reprojection. Check layer extents and CRS.'
+            return False
+        self.centroidsReady.emit()
+
+        # reduce representatives if needed
+        maxrep = p['maxrep']
+        with report.stage('representatives'):
+            origin_pts, origin_w = representatives(self.origin_pts, maxrep, self.seed())
+            dest_pts, dest_w = representatives(self.dest_pts, maxrep, self.seed())
+        report.count('origin_representatives', len(origin_pts))
+        report.count('destination_representatives', len(dest_pts))
+        self.setProgress(15)
+
+        # one graph build for the whole run
+        with report.stage('graph'):
+            graph = graph_from_layer(p['road_source'])
+        report.count('network_nodes', graph.node_count)
+        report.count('network_edges', graph.edge_count)
+        if graph.node_count == 0:
+            self.message = 'The road network layer has no usable lines.'
+            return False
+        jfids, jnodes = self.match_junctions(p['junction_source'], graph)
+
+        total_pairs = len(origin_pts) * len(dest_pts)
+        self.set_status(f'Routing {len(origin_pts)}x{len(dest_pts)} = {total_pairs} pairs...')
+        try:
+            with report.stage('routing'):
+                routes, usage = self.route_pairs(graph, origin_pts, dest_pts, origin_w, dest_w, jnodes)
+        except RoutingCanceled:
+            return False
+        if not routes:
+            self.message = 'No paths could be computed. Check the road network layer.'
+            return False
+        self.route_count = len(routes)
+
+        self.set_status('Aggregating path density...')
+        # usage is counted per network edge; junction density comes from edge endpoints
+        with report.stage('aggregate'):
+            density = usage.node_density()
+            self.setProgress(90)
+            if self.isCanceled():
+                return False
+
+            # weights are applied by the dialog so time mode and threshold can change without rerouting
+            self.junction_fids = jfids
+            self.junction_density = density_at(jnodes, density)
+        self.setProgress(100)
+        return not self.isCanceled()
+
+    def run_update(self):
+        """Reroute only what a road network edit affects, starting from the previous run."""
+        p = self.params
+        report = self.report
+        index, usage = p['previous']
+        self.set_status('Reloading the road network...')
+        with report.stage('graph'):
+            graph = graph_from_layer(p['road_source'])
+        report.count('network_nodes', graph.node_count)
+        report.count('network_edges', graph.edge_count)
+        if graph.node_count == 0:
+            self.message = 'The road network layer has no usable lines.'
+            return False
+        self.setProgress(10)
+
+        def progress(done, total):
+            self.setProgress(10 + 80.0 * done / total)
+            self.set_status(f'Rerouting affected pairs, origin {done}/{total}...')
+
+        try:
+            with report.stage('reroute'):
+                index, usage, stats = reroute_after_edit(index, usage, graph, progress, self.isCanceled)
+        except RoutingCanceled:
+            return False
+        self.route_index, self.usage = index, usage
+        self.route_count = len(index.routes)
+        report.count('removed_edges', stats['removed_edges'])
+        report.count('added_edges', stats['added_edges'])
+        report.count('moved_ends', stats['moved_ends'])
+        report.count('rerouted_pairs', stats['rerouted_pairs'])
+        report.count('pairs_attempted', stats['total_pairs'])
+        report.count('pairs_routed', self.route_count)
+        # pairs the edit disconnected, and those that were unreachable before it
+        report.fail('unreachable', stats['total_pairs'] - self.route_count)
+        self.update_note = (f" Rerouted {stats['rerouted_pairs']}/{stats['total_pairs']} pairs after "
+                            f"{stats['removed_edges']} removed and {stats['added_edges']} added segments.")
+
+        jfids, jnodes = self.match_junctions(p['junction_source'], graph)
+        self.junction_fids = jfids
+        self.junction_density = density_at(jnodes, usage.node_density())
+        self.setProgress(100)
+        return not self.isCanceled()
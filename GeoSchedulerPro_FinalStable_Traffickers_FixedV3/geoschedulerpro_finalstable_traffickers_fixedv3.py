@@ -1,19 +1,30 @@
 from qgis.PyQt import QtWidgets
+from qgis.core import QgsApplication
 from .geoschedulerpro_finalstable_traffickers_fixedv3_dialog import GeoSchedulerProFinalStableTraffickersFixedV3Dialog
+from .geoschedulerpro_finalstable_traffickers_fixedv3_processing import GeoSchedulerProvider
 
 class GeoSchedulerProFinalStableTraffickersFixedV3:
     def __init__(self, iface):
         self.iface = iface
         self.action = None
         self.dialog = None
+        self.provider = None
+
+    def initProcessing(self):
+        # also called by qgis_process, which never runs initGui
+        self.provider = GeoSchedulerProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
 
     def initGui(self):
+        self.initProcessing()
         self.action = QtWidgets.QAction('GeoScheduler Pro (Traffickers Fixed V3)', self.iface.mainWindow())
         self.action.triggered.connect(self.run)
         self.iface.addPluginToMenu('GeoScheduler Pro (Traffickers Fixed V3)', self.action)
         self.iface.addToolBarIcon(self.action)
 
     def unload(self):
+        if self.provider:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
         if self.action:
             self.iface.removePluginMenu('GeoScheduler Pro (Traffickers Fixed V3)', self.action)
             self.iface.removeToolBarIcon(self.action)
@@ -1,10 +1,14 @@
 from qgis.PyQt import QtWidgets, QtCore
-from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsField, QgsFeature, QgsGeometry, QgsPointXY,
-    QgsVectorFileWriter, QgsCoordinateTransform, QgsCoordinateTransformContext
+from qgis.core import QgsApplication, QgsProject, QgsVectorLayer
+import tempfile, os
+
+from geoscheduler_core import (
+    CORRIDOR_SPLITS, MAX_DETOUR, TIME_MODES, LiveReweighter, ResultStore, default_workers, junction_weights, open_feed,
+    store_path
 )
-from qgis.PyQt.QtCore import QVariant
-import processing, tempfile, os, random
+from geoscheduler_core.binning import SHAPES
+from geoscheduler_core.qgis_io import AttributeWriteError, CentroidCache, density_grid_renderer, write_attribute_values
+from .geoschedulerpro_finalstable_traffickers_fixedv3_task import GeoSchedulerProFinalStableTraffickersFixedV3Task, task_params
 
 class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
     def __init__(self, iface):
@@ -27,7 +31,7 @@ class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
         param_row = QtWidgets.QHBoxLayout()
         param_row.addWidget(QtWidgets.QLabel('Max representatives per side:'))
         self.max_spin = QtWidgets.QSpinBox()
-        self.max_spin.setRange(1,20)
+        self.max_spin.setRange(1,500)
         self.max_spin.setValue(5)
         param_row.addWidget(self.max_spin)
         param_row.addWidget(QtWidgets.QLabel('Density threshold (0-1):'))
@@ -36,16 +40,124 @@ class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
         self.density.setSingleStep(0.05)
         self.density.setValue(0.1)
         param_row.addWidget(self.density)
+        param_row.addWidget(QtWidgets.QLabel('Worker processes:'))
+        self.workers_spin = QtWidgets.QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(default_workers())
+        param_row.addWidget(self.workers_spin)
         layout.addLayout(param_row)
 
+        # junctions further than this from a network node get no corridor density
+        snap_row = QtWidgets.QHBoxLayout()
+        snap_row.addWidget(QtWidgets.QLabel('Junction snap tolerance (map units):'))
+        self.snap_spin = QtWidgets.QDoubleSpinBox()
+        self.snap_spin.setDecimals(6)
+        self.snap_spin.setRange(0.000001, 1000.0)
+        self.snap_spin.setSingleStep(0.1)
+        self.snap_spin.setValue(0.000001)
+        snap_row.addWidget(self.snap_spin)
+        # representatives are picked by k-means; a fixed seed makes runs repeatable
+        snap_row.addWidget(QtWidgets.QLabel('Clustering seed:'))
+        self.seed_spin = QtWidgets.QSpinBox()
+        self.seed_spin.setRange(-1, 2147483647)
+        self.seed_spin.setSpecialValueText('random')
+        self.seed_spin.setValue(0)
+        snap_row.addWidget(self.seed_spin)
+        layout.addLayout(snap_row)
+
+        # adaptive sampling routes OD pairs in batches until corridors stop changing
+        adaptive_row = QtWidgets.QHBoxLayout()
+        self.adaptive_check = QtWidgets.QCheckBox('Adaptive sampling (stop when corridors converge)')
+        adaptive_row.addWidget(self.adaptive_check)
+        adaptive_row.addWidget(QtWidgets.QLabel('Convergence tolerance:'))
+        self.adaptive_tol = QtWidgets.QDoubleSpinBox()
+        self.adaptive_tol.setRange(0.0, 0.5)
+        self.adaptive_tol.setSingleStep(0.01)
+        self.adaptive_tol.setValue(0.02)
+        adaptive_row.addWidget(self.adaptive_tol)
+        layout.addLayout(adaptive_row)
+
+        # tiled routing loads the network one tile at a time; for city-wide road layers
+        tile_row = QtWidgets.QHBoxLayout()
+        tile_row.addWidget(QtWidgets.QLabel('Tile size (map units, 0 = off):'))
+        self.tile_spin = QtWidgets.QDoubleSpinBox()
+        self.tile_spin.setDecimals(1)
+        self.tile_spin.setRange(0.0, 1e9)
+        self.tile_spin.setSingleStep(1000.0)
+        self.tile_spin.setValue(0.0)
+        self.tile_spin.setToolTip('Each tile stores the distance between every two of its border nodes, so a tile '
+                                  'crossed by B streets keeps about B\u00b2 / 2 distances for the whole run. '
+                                  'Smaller tiles have fewer border nodes each but more border in total.')
+        tile_row.addWidget(self.tile_spin)
+        # checks the weights against queues: peak vs off-peak delay on the routed traffic
+        tile_row.addWidget(QtWidgets.QLabel('Simulated vehicles per hour (0 = off):'))
+        self.sim_spin = QtWidgets.QSpinBox()
+        self.sim_spin.setRange(0, 10000000)
+        self.sim_spin.setSingleStep(1000)
+        self.sim_spin.setValue(0)
+        tile_row.addWidget(self.sim_spin)
+        layout.addLayout(tile_row)
+
+        # corridor density as hexagon / square cells; coarser levels take over when zooming out
+        bin_row = QtWidgets.QHBoxLayout()
+        bin_row.addWidget(QtWidgets.QLabel('Density cells:'))
+        self.bin_combo = QtWidgets.QComboBox()
+        self.bin_combo.addItems(list(SHAPES))
+        bin_row.addWidget(self.bin_combo)
+        bin_row.addWidget(QtWidgets.QLabel('Finest cell size (map units, 0 = auto):'))
+        self.bin_spin = QtWidgets.QDoubleSpinBox()
+        self.bin_spin.setDecimals(3)
+        self.bin_spin.setRange(0.0, 1e7)
+        self.bin_spin.setSingleStep(10.0)
+        self.bin_spin.setValue(0.0)
+        bin_row.addWidget(self.bin_spin)
+        layout.addLayout(bin_row)
+
+        # alternative routes spread each pair over near-equal parallel roads
+        alt_row = QtWidgets.QHBoxLayout()
+        alt_row.addWidget(QtWidgets.QLabel('Routes per pair (1 = shortest only):'))
+        self.alt_spin = QtWidgets.QSpinBox()
+        self.alt_spin.setRange(1, 10)
+        self.alt_spin.setValue(1)
+        self.alt_spin.setToolTip('Above 1, routing takes about 3 times as long (2.6 to 3.2 times), already at 2 '
+                                 'routes per pair, and holds 16 bytes per destination and network node in memory.')
+        alt_row.addWidget(self.alt_spin)
+        alt_row.addWidget(QtWidgets.QLabel('Max detour (%):'))
+        self.detour_spin = QtWidgets.QSpinBox()
+        self.detour_spin.setRange(1, 100)
+        self.detour_spin.setValue(int(round(MAX_DETOUR * 100)))
+        alt_row.addWidget(self.detour_spin)
+        layout.addLayout(alt_row)
+
+        # hourly travel times: all 24 hours routed in one run, weight curves per junction
+        hourly_row = QtWidgets.QHBoxLayout()
+        self.hourly_check = QtWidgets.QCheckBox('Hourly travel times (24 h)')
+        hourly_row.addWidget(self.hourly_check)
+        hourly_row.addWidget(QtWidgets.QLabel('Speed field (km/h or table key):'))
+        self.speed_field_edit = QtWidgets.QLineEdit()
+        hourly_row.addWidget(self.speed_field_edit)
+        hourly_row.addWidget(QtWidgets.QLabel('Speed table (CSV):'))
+        self.speed_table_edit = QtWidgets.QLineEdit()
+        hourly_row.addWidget(self.speed_table_edit)
+        speed_browse = QtWidgets.QPushButton('Browse')
+        speed_browse.clicked.connect(self.browse_speed_table)
+        hourly_row.addWidget(speed_browse)
+        layout.addLayout(hourly_row)
+
         # time and debug
         time_row = QtWidgets.QHBoxLayout()
         time_row.addWidget(QtWidgets.QLabel('Time of Day:'))
         self.time_combo = QtWidgets.QComboBox()
-        self.time_combo.addItems(['AM Peak','PM Peak','Off-Peak'])
+        self.time_combo.addItems(list(TIME_MODES))
         time_row.addWidget(self.time_combo)
         self.debug_check = QtWidgets.QCheckBox('Create debug centroid layers (visible)')
         time_row.addWidget(self.debug_check)
+        self.cache_check = QtWidgets.QCheckBox('Reuse cached routes')
+        self.cache_check.setChecked(True)
+        time_row.addWidget(self.cache_check)
+        # the run report is always written; profiling adds cProfile dumps of the hot stages
+        self.profile_check = QtWidgets.QCheckBox('Profile run')
+        time_row.addWidget(self.profile_check)
         layout.addLayout(time_row)
 
         # output path
@@ -58,14 +170,66 @@ class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
         out_row.addWidget(choose)
         layout.addLayout(out_row)
 
+        # live detector counts blended into the weights of the last run
+        live_row = QtWidgets.QHBoxLayout()
+        live_row.addWidget(QtWidgets.QLabel('Live counts (file or udp://host:port):'))
+        self.feed_edit = QtWidgets.QLineEdit()
+        live_row.addWidget(self.feed_edit)
+        live_row.addWidget(QtWidgets.QLabel('Window (s):'))
+        self.window_spin = QtWidgets.QSpinBox()
+        self.window_spin.setRange(10, 86400)
+        self.window_spin.setValue(300)
+        live_row.addWidget(self.window_spin)
+        live_row.addWidget(QtWidgets.QLabel('Live share:'))
+        self.blend_spin = QtWidgets.QDoubleSpinBox()
+        self.blend_spin.setRange(0.0, 1.0)
+        self.blend_spin.setSingleStep(0.1)
+        self.blend_spin.setValue(0.5)
+        live_row.addWidget(self.blend_spin)
+        live_row.addWidget(QtWidgets.QLabel('Refresh (ms):'))
+        self.refresh_spin = QtWidgets.QSpinBox()
+        self.refresh_spin.setRange(100, 60000)
+        self.refresh_spin.setSingleStep(500)
+        self.refresh_spin.setValue(2000)
+        live_row.addWidget(self.refresh_spin)
+        self.live_btn = QtWidgets.QPushButton('Start live feed')
+        self.live_btn.clicked.connect(self.toggle_live)
+        live_row.addWidget(self.live_btn)
+        layout.addLayout(live_row)
+
+        btn_row = QtWidgets.QHBoxLayout()
         self.run_btn = QtWidgets.QPushButton('Run and Create Visual Outputs')
         self.run_btn.clicked.connect(self.run_model)
-        layout.addWidget(self.run_btn)
+        btn_row.addWidget(self.run_btn)
+        self.cancel_btn = QtWidgets.QPushButton('Cancel')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_run)
+        btn_row.addWidget(self.cancel_btn)
+        # reopen the result store of an earlier run for time-of-day switching
+        self.load_btn = QtWidgets.QPushButton('Load saved results')
+        self.load_btn.clicked.connect(self.load_results)
+        btn_row.addWidget(self.load_btn)
+        layout.addLayout(btn_row)
 
         self.status = QtWidgets.QLabel('')
         layout.addWidget(self.status)
         self.setLayout(layout)
         self.populate_all()
+        self.task = None
+        # last run's junction densities, reused by reweight(); columns of self.results
+        self.results = None
+        self.weighted_layer = None
+        self.feed = None
+        self.live = None
+        self.live_timer = QtCore.QTimer(self)
+        self.live_timer.timeout.connect(self.live_tick)
+        self.out_fids = []
+        self.junction_density = None
+        # zone centroids reused by later runs until a zone layer changes
+        self.centroid_cache = CentroidCache()
+        self.centroid_layers = (None, None)
+        self.time_combo.currentIndexChanged.connect(self.reweight)
+        self.density.valueChanged.connect(self.reweight)
 
     def layer_selector(self, label):
         box = QtWidgets.QHBoxLayout()
@@ -96,6 +260,11 @@ class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
                 fn += '.gpkg'
             self.out_edit.setText(fn)
 
+    def browse_speed_table(self):
+        fn, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Hourly speed table', '', 'CSV (*.csv)')
+        if fn:
+            self.speed_table_edit.setText(fn)
+
     def show_message(self, text):
         QtWidgets.QMessageBox.information(self, 'GeoScheduler Pro (Traffickers Fixed V3)', text)
 
@@ -103,203 +272,227 @@ class GeoSchedulerProFinalStableTraffickersFixedV3Dialog(QtWidgets.QDialog):
         items = QgsProject.instance().mapLayersByName(name)
         return items[0] if items else None
 
-    def centroids_reproject(self, layer, target_crs):
-        pts = []
-        src_crs = layer.crs()
-        transform = QgsCoordinateTransform(src_crs, target_crs, QgsProject.instance())
-        for feat in layer.getFeatures():
-            geom = feat.geometry()
-            if not geom: continue
-            try:
-                c = geom.centroid().asPoint()
-                t = transform.transform(c)
-                pts.append(t)
-            except Exception:
-                continue
-        return pts
-
-    def km_reduce(self, pts, k):
-        if len(pts) <= k: return pts
-        arr = [(p.x(), p.y()) for p in pts]
-        centers = random.sample(arr, k)
-        for _ in range(8):
-            clusters = [[] for _ in range(k)]
-            for p in arr:
-                dists = [ (p[0]-c[0])**2 + (p[1]-c[1])**2 for c in centers ]
-                idx = dists.index(min(dists))
-                clusters[idx].append(p)
-            new = []
-            for group in clusters:
-                if group:
-                    x = sum([p[0] for p in group])/len(group)
-                    y = sum([p[1] for p in group])/len(group)
-                    new.append((x,y))
-                else:
-                    new.append(random.choice(arr))
-            centers = new
-        return [QgsPointXY(c[0], c[1]) for c in centers]
-
-    def to_qneat(self, pt, crs):
-        return f"{pt.x()},{pt.y()} [{crs.authid()}]"
-
-    def run_qneat_pair(self, road_layer, start, end):
-        params = {
-            'DEFAULT_DIRECTION':2, 'DEFAULT_SPEED':5, 'DIRECTION_FIELD':'',
-            'END_POINT': end, 'ENTRY_COST_CALCULATION_METHOD':0,
-            'INPUT': road_layer.source() if hasattr(road_layer,'source') else road_layer, 'OUTPUT':'memory:', 'SPEED_FIELD':'',
-            'START_POINT': start, 'STRATEGY':0, 'TOLERANCE':0,
-            'VALUE_BACKWARD':'', 'VALUE_BOTH':'', 'VALUE_FORWARD':''
-        }
+    def output_path(self):
+        return self.out_edit.text().strip() or os.path.join(tempfile.gettempdir(), 'GeoScheduler_Output_v3.gpkg')
+
+    def release_results(self):
+        # the columns map the store file, which the next run replaces
+        self.stop_live()
+        self.out_fids, self.junction_density = [], None
+        if self.results is not None:
+            self.results.close()
+            self.results = None
+
+    def open_results(self, out_gpkg, weighted_layer):
+        self.release_results()
+        self.results = ResultStore(store_path(out_gpkg))
+        self.weighted_layer = weighted_layer
+        self.out_fids = self.results.column('junctions', 'fid')
+        self.junction_density = self.results.column('junctions', 'density')
+
+    def load_results(self):
+        if self.task is not None:
+            return
+        out_gpkg = self.output_path()
+        if not os.path.exists(store_path(out_gpkg)):
+            self.show_message(f'No saved results for {out_gpkg}'); return
+        uri = f'{out_gpkg}|layername=junctions_weighted'
+        # reuse the output layer if it is already in the project
+        layer = next((lyr for lyr in QgsProject.instance().mapLayers().values()
+                      if isinstance(lyr, QgsVectorLayer) and lyr.source() == uri), None)
+        if layer is None:
+            layer = QgsVectorLayer(uri, 'junctions_weighted', 'ogr')
+            if not layer.isValid():
+                self.show_message(f'No junctions_weighted layer in {out_gpkg}'); return
+            QgsProject.instance().addMapLayer(layer)
         try:
-            res = processing.run('qneat3:shortestpathpointtopoint', params)
-            out = res.get('OUTPUT') or list(res.values())[0]
-            if isinstance(out, str) and os.path.exists(out):
-                lyr = QgsVectorLayer(out, 'path', 'ogr')
-                return lyr if lyr.isValid() else None
-            if isinstance(out, QgsVectorLayer):
-                return out
-            return None
-        except Exception:
-            return None
-
-    def aggregate_density(self, path_layers):
-        counts={}
-        for lyr in path_layers:
-            for f in lyr.getFeatures():
-                geom = f.geometry()
-                if not geom: continue
-                lines = geom.asMultiPolyline() if geom.isMultipart() else [geom.asPolyline()]
-                for ln in lines:
-                    for p in ln:
-                        key=(round(p.x(),6), round(p.y(),6))
-                        counts[key]=counts.get(key,0)+1
-        maxc = max(counts.values()) if counts else 1
-        return {k: v/maxc for k,v in counts.items()}
-
-    def write_gpkg_layer(self, layer, gpkg_path, layer_name):
-        # Use writeAsVectorFormatV3 for QGIS 3.40+
-        opts = QgsVectorFileWriter.SaveVectorOptions()
-        opts.driverName = 'GPKG'
-        opts.layerName = layer_name
-        opts.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
-        ctx = QgsCoordinateTransformContext()
-        return QgsVectorFileWriter.writeAsVectorFormatV3(layer, gpkg_path, ctx, opts)
+            self.open_results(out_gpkg, layer)
+        except (OSError, ValueError) as e:
+            self.show_message(f'Cannot open saved results: {e}'); return
+        self.status.setText(f'Loaded results of {self.results.meta.get("route_count", 0)} routes from {store_path(out_gpkg)}.')
+        self.reweight()
 
     def run_model(self):
+        if self.task is not None:
+            return
         origin = self.get_layer(self.origin_combo['combo'].currentText())
         dest = self.get_layer(self.dest_combo['combo'].currentText())
         road = self.get_layer(self.road_combo['combo'].currentText())
         jun = self.get_layer(self.junction_combo['combo'].currentText())
         if not all([origin,dest,road,jun]):
             self.show_message('Missing layers'); return
-
-        road_crs = road.crs()
-        orig_pts = self.centroids_reproject(origin, road_crs)
-        dest_pts = self.centroids_reproject(dest, road_crs)
-        if not orig_pts or not dest_pts:
-            self.show_message('No centroids found'); return
-
-        m = self.max_spin.value()
-        if len(orig_pts)>m: orig_pts=self.km_reduce(orig_pts,m)
-        if len(dest_pts)>m: dest_pts=self.km_reduce(dest_pts,m)
-
-        paths = []
-        total = len(orig_pts)*len(dest_pts)
-        c=0
-        for o in orig_pts:
-            for d in dest_pts:
-                c+=1
-                self.status.setText(f'Routing {c}/{total}'); QtCore.QCoreApplication.processEvents()
-                s = self.to_qneat(o, road_crs); e = self.to_qneat(d, road_crs)
-                p = self.run_qneat_pair(road, s, e)
-                if p: paths.append(p)
-
-        if not paths:
-            self.show_message('No paths computed'); return
-
-        density = self.aggregate_density(paths)
-        thresh = self.density.value()
+        speed_field = self.speed_field_edit.text().strip()
+        if speed_field and road.fields().indexOf(speed_field) < 0:
+            self.show_message(f'No field {speed_field} on the road layer'); return
 
         # determine output path
-        out_gpkg = self.out_edit.text().strip() or os.path.join(tempfile.gettempdir(), 'GeoScheduler_Output_v3.gpkg')
-
-        # create OD routes layer by merging path geometries into a memory layer
-        od_layer = QgsVectorLayer(f'LineString?crs={road_crs.authid()}', 'GeoScheduler_OD_Routes', 'memory')
-        od_dp = od_layer.dataProvider()
-        od_dp.addAttributes([QgsField('route_id', QVariant.Int)])
-        od_layer.updateFields()
-        rid = 1
-        for p in paths:
-            for feat in p.getFeatures():
-                geom = feat.geometry()
-                nf = QgsFeature(od_layer.fields())
-                nf.setGeometry(geom)
-                nf['route_id'] = rid
-                od_dp.addFeature(nf)
-                rid += 1
-        od_layer.updateExtents()
-
-        # create density points layer (memory)
-        pts_layer = QgsVectorLayer(f'Point?crs={road_crs.authid()}&field=density:double', 'GeoScheduler_Density_Points', 'memory')
-        prov = pts_layer.dataProvider()
-        feats = []
-        for (x,y),val in density.items():
-            f = QgsFeature(pts_layer.fields())
-            f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x,y)))
-            f['density'] = float(val)
-            feats.append(f)
-        prov.addFeatures(feats); pts_layer.updateExtents()
-
-        # create junctions_weighted (memory) with new field names
-        jun_out = QgsVectorLayer(f'Point?crs={road_crs.authid()}', 'junctions_weighted', 'memory')
-        pprov = jun_out.dataProvider()
-        pprov.addAttributes([QgsField('UsedByComm',QVariant.Int), QgsField('Corridor_Weight',QVariant.Double), QgsField('CrossTraffic_Weight',QVariant.Double)])
-        jun_out.updateFields()
-        feats2 = []
-        for f in jun.getFeatures():
-            g = f.geometry()
-            if not g: continue
-            pt = g.asPoint()
-            key = (round(pt.x(),6), round(pt.y(),6))
-            dens = density.get(key, 0.0)
-            if dens >= thresh:
-                used = 1
-                if self.time_combo.currentText() == 'AM Peak':
-                    cw, xw = 0.75, 0.25
-                elif self.time_combo.currentText() == 'PM Peak':
-                    cw, xw = 0.75, 0.25
-                else:
-                    cw, xw = 0.5, 0.5
-            else:
-                used = 0; cw, xw = 0.5, 0.5
-            nf = QgsFeature(jun_out.fields())
-            nf.setGeometry(QgsGeometry.fromPointXY(pt))
-            nf['UsedByComm'] = int(used)
-            nf['Corridor_Weight'] = float(cw)
-            nf['CrossTraffic_Weight'] = float(xw)
-            feats2.append(nf)
-        pprov.addFeatures(feats2); jun_out.updateExtents()
-
-        # write layers to GeoPackage (overwrite mode)
+        out_gpkg = self.output_path()
+
+        settings = {
+            'maxrep': self.max_spin.value(),
+            'workers': self.workers_spin.value(),
+            'threshold': self.density.value(),
+            'snap_tolerance': self.snap_spin.value(),
+            'seed': self.seed_spin.value(),
+            'adaptive': self.adaptive_check.isChecked(),
+            'adaptive_tol': self.adaptive_tol.value(),
+            'use_cache': self.cache_check.isChecked(),
+            'profile': self.profile_check.isChecked(),
+            'tile_size': self.tile_spin.value(),
+            'sim_vehicles': self.sim_spin.value(),
+            'bin_shape': self.bin_combo.currentText(),
+            'bin_size': self.bin_spin.value(),
+            'alternatives': self.alt_spin.value(),
+            'max_detour': self.detour_spin.value() / 100.0,
+            'hourly': self.hourly_check.isChecked(),
+            'speed_field': self.speed_field_edit.text().strip(),
+            'speed_table': self.speed_table_edit.text().strip(),
+            'time_mode': self.time_combo.currentText(),
+            'out_gpkg': out_gpkg,
+        }
+        params = task_params(origin, dest, road, jun, settings, QgsProject.instance().transformContext())
+        params['origin_xy'] = self.centroid_cache.get(origin, road.crs())
+        params['dest_xy'] = self.centroid_cache.get(dest, road.crs())
+        self.centroid_layers = (origin, dest)
+        task = GeoSchedulerProFinalStableTraffickersFixedV3Task(params)
+        task.statusChanged.connect(self.status.setText)
+        task.taskCompleted.connect(self.task_completed)
+        task.taskTerminated.connect(self.task_terminated)
+        self.task = task
+        self.release_results()
+        self.run_btn.setEnabled(False); self.cancel_btn.setEnabled(True)
+        QgsApplication.taskManager().addTask(task)
+
+    def cancel_run(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def task_terminated(self):
+        message = self.task.message
+        self.task = None
+        self.run_btn.setEnabled(True); self.cancel_btn.setEnabled(False)
+        if message:
+            self.status.setText(message); self.show_message(message)
+        else:
+            self.status.setText('Run cancelled.')
+
+    def task_completed(self):
+        task = self.task
+        road_crs = task.params['road_crs']
+        self.centroid_cache.put(self.centroid_layers[0], road_crs, task.origin_xy)
+        self.centroid_cache.put(self.centroid_layers[1], road_crs, task.dest_xy)
+        out_gpkg = task.params['out_gpkg']
+        note = task.sampling_note + task.cache_note
+        if task.report_file:
+            note += f' Run report: {task.report_file}'
+        self.task = None
+        self.run_btn.setEnabled(True); self.cancel_btn.setEnabled(False)
+
+        # add layers and apply simple styling; the task wrote them complete with
+        # spatial indexes, so nothing is read back beyond opening each layer once
+        options = QgsVectorLayer.LayerOptions(QgsProject.instance().transformContext())
+        options.loadDefaultStyle = False
+        loaded = {}
+        names = ('junctions_weighted', 'GeoScheduler_Density_Grid', 'GeoScheduler_Corridors')
+        if task.hourly is not None:
+            names += ('junctions_hourly',)
+        for name in names:
+            try:
+                lyr = QgsVectorLayer(f'{out_gpkg}|layername={name}', name, 'ogr', options)
+                if lyr.isValid():
+                    if name == 'GeoScheduler_Density_Grid':
+                        lyr.setRenderer(density_grid_renderer(task.density_levels))
+                    QgsProject.instance().addMapLayer(lyr)
+                    loaded[name] = lyr
+            except Exception:
+                pass
+
+        # usage table for instant time-mode switching: output fid -> corridor density
+        if loaded.get('junctions_weighted') is not None:
+            self.open_results(out_gpkg, loaded['junctions_weighted'])
+
+        self.status.setText(f'Completed. Outputs written to {out_gpkg}.' + note)
+        self.show_message(f'Completed. GeoPackage created at: {out_gpkg}')
+
+    def write_weights(self, index, used, cw, xw, reload=True):
+        """
+        Write weights for the junctions at `index` (output order); returns how
+        many changed, or None. Live ticks pass reload=False and only repaint.
+        """
         try:
-            # Overwrite entire gpkg by creating/truncating layers with CreateOrOverwriteLayer option
-            self.write_gpkg_layer(od_layer, out_gpkg, 'GeoScheduler_OD_Routes')
-            self.write_gpkg_layer(pts_layer, out_gpkg, 'GeoScheduler_Density_Points')
-            self.write_gpkg_layer(jun_out, out_gpkg, 'junctions_weighted')
-        except Exception as e:
-            # final fallback: try legacy writer without options
-            QgsVectorFileWriter.writeAsVectorFormat(od_layer, out_gpkg, 'utf-8', QgsCoordinateTransformContext(), 'GPKG')
-            QgsVectorFileWriter.writeAsVectorFormat(pts_layer, out_gpkg, 'utf-8', QgsCoordinateTransformContext(), 'GPKG')
-            QgsVectorFileWriter.writeAsVectorFormat(jun_out, out_gpkg, 'utf-8', QgsCoordinateTransformContext(), 'GPKG')
-
-        # add layers and apply simple styling
-        QgsProject.instance().addMapLayer(jun_out)
-        QgsProject.instance().addMapLayer(pts_layer)
+            lyr = self.weighted_layer
+            fields = lyr.fields()
+        except RuntimeError:
+            # output layer was removed from the project
+            self.weighted_layer = None
+            self.stop_live()
+            return None
+        iu, ic, ix = fields.indexOf('UsedByComm'), fields.indexOf('Corridor_Weight'), fields.indexOf('CrossTraffic_Weight')
+        changes = {int(self.out_fids[i]): {iu: int(u), ic: float(c), ix: float(x)}
+                   for i, u, c, x in zip(index, used, cw, xw)}
         try:
-            od_loaded = QgsVectorLayer(out_gpkg + '|layername=GeoScheduler_OD_Routes', 'GeoScheduler_OD_Routes', 'ogr')
-            if od_loaded.isValid(): QgsProject.instance().addMapLayer(od_loaded)
-        except Exception:
-            pass
+            return write_attribute_values(lyr, changes, reload=reload)
+        except AttributeWriteError as e:
+            # a layer that refuses writes would fail on every live tick too
+            self.stop_live()
+            self.status.setText(f'Weights only partly written: {e}')
+            self.show_message(f'Junction weights were not fully written ({e.written} junctions changed): {e}')
+            return None
 
-        self.status.setText(f'Completed. Outputs written to {out_gpkg}')
-        self.show_message(f'Completed. GeoPackage created at: {out_gpkg}')
+    def reweight(self):
+        # time mode / threshold changes only redo the weighting, routing results are kept
+        if self.task is not None or self.junction_density is None or self.weighted_layer is None:
+            return
+        if self.live is not None:
+            # the live blend owns the weights; it picks up the new mode and threshold
+            self.live_tick()
+            return
+        used, cw, xw = junction_weights(self.junction_density, self.density.value(),
+                                        self.time_combo.currentText(), CORRIDOR_SPLITS)
+        updated = self.write_weights(range(len(used)), used, cw, xw)
+        if updated is not None:
+            self.status.setText(f'{self.time_combo.currentText()}: {updated} junctions changed.')
+
+    def toggle_live(self):
+        if self.live is not None:
+            self.stop_live()
+            self.status.setText('Live feed stopped.')
+            return
+        if self.task is not None or self.results is None or self.weighted_layer is None:
+            self.show_message('Run the model or load saved results first.'); return
+        spec = self.feed_edit.text().strip()
+        if not spec:
+            self.show_message('Enter a count file or udp://host:port'); return
+        try:
+            self.feed = open_feed(spec)
+        except (OSError, ValueError) as e:
+            self.show_message(f'Cannot open live feed: {e}'); return
+        # detectors report source junction fids; routed density is the baseline
+        self.live = LiveReweighter(self.results.column('junctions', 'src_fid'), self.junction_density,
+                                   self.density.value(), self.time_combo.currentText(), CORRIDOR_SPLITS,
+                                   blend=self.blend_spin.value(), window=self.window_spin.value())
+        self.live_btn.setText('Stop live feed')
+        self.run_btn.setEnabled(False)
+        # the refresh interval throttles layer writes and repaints
+        self.live_timer.start(self.refresh_spin.value())
+
+    def stop_live(self):
+        if self.live is None:
+            return
+        self.live_timer.stop()
+        self.feed.close()
+        self.feed = self.live = None
+        self.live_btn.setText('Start live feed')
+        self.run_btn.setEnabled(self.task is None)
+
+    def live_tick(self):
+        live = self.live
+        lines = self.feed.read_lines()
+        live.ingest(lines)
+        live.threshold, live.mode = self.density.value(), self.time_combo.currentText()
+        index, used, cw, xw = live.changes()
+        updated = self.write_weights(index, used, cw, xw, reload=False) if len(index) else 0
+        if updated is None:
+            return
+        self.status.setText(f'Live: {len(lines)} records in the last {self.refresh_spin.value()} ms, '
+                            f'{live.records} in total ({live.unknown} skipped), {updated} junctions changed.')
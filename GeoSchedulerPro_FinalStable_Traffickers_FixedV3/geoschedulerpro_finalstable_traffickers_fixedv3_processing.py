@@ -0,0 +1,350 @@
+"""
+Processing provider for headless runs (qgis_process, models, scripts).
+
+'Run GeoScheduler' is one run of the V3 pipeline. 'Batch GeoScheduler' reads
+parameter sets from a CSV file and runs them all in one process; the road
+graph, junction coordinates and zone centroids are loaded once and shared
+between rows through the task's session cache.
+"""
+import csv
+import os
+
+from qgis.PyQt.QtCore import Qt
+from qgis.core import (
+    QgsProcessing, QgsProcessingAlgorithm, QgsProcessingContext, QgsProcessingException,
+    QgsProcessingLayerPostProcessorInterface,
+    QgsProcessingOutputFile, QgsProcessingOutputNumber, QgsProcessingOutputVectorLayer,
+    QgsProcessingParameterBoolean, QgsProcessingParameterEnum, QgsProcessingParameterField, QgsProcessingParameterFile,
+    QgsProcessingParameterFileDestination, QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterNumber, QgsProcessingParameterVectorLayer, QgsProcessingProvider,
+    QgsProcessingUtils
+)
+
+from geoscheduler_core import MAX_DETOUR, TIME_MODES, default_workers, store_path
+from geoscheduler_core.binning import SHAPES
+from geoscheduler_core.qgis_io import density_grid_renderer
+from .geoschedulerpro_finalstable_traffickers_fixedv3_task import (
+    CORRIDOR_LAYERS, GeoSchedulerProFinalStableTraffickersFixedV3Task, task_params
+)
+
+OUTPUT_LAYERS = ('GeoScheduler_Corridors', 'GeoScheduler_Routes', 'GeoScheduler_Route_Segments',
+                 'GeoScheduler_Density_Grid', 'junctions_weighted')
+# CSV columns a batch row may set; anything missing falls back to the algorithm parameters
+BATCH_COLUMNS = ('name', 'origins', 'destinations', 'maxrep', 'threshold', 'time_mode',
+                 'snap_tolerance', 'seed', 'adaptive', 'output')
+
+
+def run_task(params, feedback):
+    """Run the pipeline synchronously in the calling thread, reporting to `feedback`."""
+    task = GeoSchedulerProFinalStableTraffickersFixedV3Task(params)
+    task.statusChanged.connect(feedback.pushInfo)
+    task.progressChanged.connect(feedback.setProgress)
+    # feedback lives in the GUI thread while the algorithm blocks this one
+    feedback.canceled.connect(task.cancel, Qt.DirectConnection)
+    try:
+        if feedback.isCanceled():
+            task.cancel()
+        ok = task.run()
+    finally:
+        # batch runs call this once per row; a finished task must not stay connected
+        feedback.canceled.disconnect(task.cancel)
+    if not ok:
+        raise QgsProcessingException(task.message or 'GeoScheduler run cancelled.')
+    return task
+
+
+class DensityGridStyle(QgsProcessingLayerPostProcessorInterface):
+    """Gives the loaded density grid its scale-switching renderer."""
+
+    def __init__(self, levels):
+        super().__init__()
+        self.levels = levels
+
+    def postProcessLayer(self, layer, context, feedback):
+        layer.setRenderer(density_grid_renderer(self.levels))
+        layer.triggerRepaint()
+
+
+class GeoSchedulerAlgorithmBase(QgsProcessingAlgorithm):
+    ORIGINS = 'ORIGINS'
+    DESTINATIONS = 'DESTINATIONS'
+    ROADS = 'ROADS'
+    JUNCTIONS = 'JUNCTIONS'
+    MAX_REPS = 'MAX_REPS'
+    THRESHOLD = 'THRESHOLD'
+    TIME_MODE = 'TIME_MODE'
+    SNAP_TOLERANCE = 'SNAP_TOLERANCE'
+    SEED = 'SEED'
+    WORKERS = 'WORKERS'
+    ADAPTIVE = 'ADAPTIVE'
+    ADAPTIVE_TOL = 'ADAPTIVE_TOL'
+    USE_CACHE = 'USE_CACHE'
+    TILE_SIZE = 'TILE_SIZE'
+    PROFILE = 'PROFILE'
+    SIM_VEHICLES = 'SIM_VEHICLES'
+    HOURLY = 'HOURLY'
+    SPEED_FIELD = 'SPEED_FIELD'
+    SPEED_TABLE = 'SPEED_TABLE'
+    BIN_SHAPE = 'BIN_SHAPE'
+    BIN_SIZE = 'BIN_SIZE'
+    ALTERNATIVES = 'ALTERNATIVES'
+    MAX_DETOUR = 'MAX_DETOUR'
+
+    def group(self):
+        return 'GeoScheduler'
+
+    def groupId(self):
+        return 'geoscheduler'
+
+    def add_pipeline_parameters(self):
+        polygons = [QgsProcessing.TypeVectorPolygon]
+        self.addParameter(QgsProcessingParameterVectorLayer(self.ORIGINS, 'Origin zones', polygons))
+        self.addParameter(QgsProcessingParameterVectorLayer(self.DESTINATIONS, 'Destination zones', polygons))
+        self.addParameter(QgsProcessingParameterVectorLayer(self.ROADS, 'Road network', [QgsProcessing.TypeVectorLine]))
+        self.addParameter(QgsProcessingParameterVectorLayer(self.JUNCTIONS, 'Junctions', [QgsProcessing.TypeVectorPoint]))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.MAX_REPS, 'Max representatives per side', QgsProcessingParameterNumber.Integer, 5, minValue=1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.THRESHOLD, 'Density threshold (0-1)', QgsProcessingParameterNumber.Double, 0.1, minValue=0.0, maxValue=1.0))
+        self.addParameter(QgsProcessingParameterEnum(self.TIME_MODE, 'Time of day', list(TIME_MODES), defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SNAP_TOLERANCE, 'Junction snap tolerance (map units)', QgsProcessingParameterNumber.Double,
+            0.000001, minValue=0.000001))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SEED, 'Clustering seed (-1 for random)', QgsProcessingParameterNumber.Integer, 0, minValue=-1))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.WORKERS, 'Worker processes', QgsProcessingParameterNumber.Integer, default_workers(), minValue=1))
+        self.addParameter(QgsProcessingParameterBoolean(self.ADAPTIVE, 'Adaptive sampling', False))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ADAPTIVE_TOL, 'Convergence tolerance', QgsProcessingParameterNumber.Double, 0.02,
+            minValue=0.0, maxValue=0.5))
+        self.addParameter(QgsProcessingParameterBoolean(self.USE_CACHE, 'Reuse cached routes', True))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.TILE_SIZE, 'Tile size for tiled routing (map units, 0 = off)', QgsProcessingParameterNumber.Double,
+            0.0, minValue=0.0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.SIM_VEHICLES, 'Simulated vehicles per hour for signal validation (0 = off)',
+            QgsProcessingParameterNumber.Integer, 0, minValue=0))
+        self.addParameter(QgsProcessingParameterEnum(self.BIN_SHAPE, 'Density cell shape', list(SHAPES), defaultValue=0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.BIN_SIZE, 'Finest density cell size (map units, 0 = from the extent)',
+            QgsProcessingParameterNumber.Double, 0.0, minValue=0.0))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.ALTERNATIVES, 'Routes per OD pair (1 = shortest path only)', QgsProcessingParameterNumber.Integer,
+            1, minValue=1, maxValue=10))
+        self.addParameter(QgsProcessingParameterNumber(
+            self.MAX_DETOUR, 'Max detour of an alternative route (fraction above the shortest)',
+            QgsProcessingParameterNumber.Double, MAX_DETOUR, minValue=0.01, maxValue=1.0))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.HOURLY, 'Route all 24 hours on hourly travel times', False))
+        self.addParameter(QgsProcessingParameterField(
+            self.SPEED_FIELD, 'Road speed field (km/h, or speed table key)', parentLayerParameterName=self.ROADS,
+            optional=True))
+        self.addParameter(QgsProcessingParameterFile(
+            self.SPEED_TABLE, 'Hourly speed table (CSV: key, 1 or 24 speeds in km/h)', QgsProcessingParameterFile.File,
+            'csv', optional=True))
+        self.addParameter(QgsProcessingParameterBoolean(self.PROFILE, 'Profile hot stages (cProfile)', False))
+
+    def layers(self, parameters, context):
+        names = (self.ORIGINS, self.DESTINATIONS, self.ROADS, self.JUNCTIONS)
+        layers = [self.parameterAsVectorLayer(parameters, name, context) for name in names]
+        if not all(layers):
+            raise QgsProcessingException('Missing input layers')
+        return layers
+
+    def settings(self, parameters, context):
+        return {
+            'maxrep': self.parameterAsInt(parameters, self.MAX_REPS, context),
+            'workers': self.parameterAsInt(parameters, self.WORKERS, context),
+            'threshold': self.parameterAsDouble(parameters, self.THRESHOLD, context),
+            'snap_tolerance': self.parameterAsDouble(parameters, self.SNAP_TOLERANCE, context),
+            'seed': self.parameterAsInt(parameters, self.SEED, context),
+            'adaptive': self.parameterAsBool(parameters, self.ADAPTIVE, context),
+            'adaptive_tol': self.parameterAsDouble(parameters, self.ADAPTIVE_TOL, context),
+            'use_cache': self.parameterAsBool(parameters, self.USE_CACHE, context),
+            'tile_size': self.parameterAsDouble(parameters, self.TILE_SIZE, context),
+            'sim_vehicles': self.parameterAsInt(parameters, self.SIM_VEHICLES, context),
+            'bin_shape': SHAPES[self.parameterAsEnum(parameters, self.BIN_SHAPE, context)],
+            'bin_size': self.parameterAsDouble(parameters, self.BIN_SIZE, context),
+            'alternatives': self.parameterAsInt(parameters, self.ALTERNATIVES, context),
+            'max_detour': self.parameterAsDouble(parameters, self.MAX_DETOUR, context),
+            'hourly': self.parameterAsBool(parameters, self.HOURLY, context),
+            'speed_field': (self.parameterAsFields(parameters, self.SPEED_FIELD, context) or [''])[0],
+            'speed_table': self.parameterAsFile(parameters, self.SPEED_TABLE, context),
+            'profile': self.parameterAsBool(parameters, self.PROFILE, context),
+            'time_mode': TIME_MODES[self.parameterAsEnum(parameters, self.TIME_MODE, context)],
+        }
+
+
+class GeoSchedulerRunAlgorithm(GeoSchedulerAlgorithmBase):
+    OUTPUT = 'OUTPUT'
+    ROUTE_COUNT = 'ROUTE_COUNT'
+    RESULTS = 'RESULTS'
+    REPORT = 'REPORT'
+    HOURLY_JUNCTIONS = 'JUNCTIONS_HOURLY'
+
+    def name(self):
+        return 'run'
+
+    def displayName(self):
+        return 'Run GeoScheduler'
+
+    def shortHelpString(self):
+        return ('Routes representative OD pairs over the road network, aggregates corridor density '
+                'and writes corridor segments with their route tables, a density grid and weighted '
+                'junctions to a GeoPackage. Routes per OD pair above 1 make routing about 3 times as '
+                'slow (2.6 to 3.2 times), already at 2, and hold 16 bytes per destination and network '
+                'node in memory. With a tile size, each tile keeps the distances between every two of '
+                'its border nodes: about B\u00b2 / 2 for a tile crossed by B streets.')
+
+    def createInstance(self):
+        return GeoSchedulerRunAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.add_pipeline_parameters()
+        self.addParameter(QgsProcessingParameterFileDestination(self.OUTPUT, 'Output GeoPackage', 'GeoPackage (*.gpkg)'))
+        for name in OUTPUT_LAYERS:
+            self.addOutput(QgsProcessingOutputVectorLayer(name.upper(), name))
+        self.addOutput(QgsProcessingOutputNumber(self.ROUTE_COUNT, 'Routes computed'))
+        self.addOutput(QgsProcessingOutputFile(self.RESULTS, 'Result store'))
+        self.addOutput(QgsProcessingOutputFile(self.REPORT, 'Run report'))
+        self.addOutput(QgsProcessingOutputVectorLayer(self.HOURLY_JUNCTIONS, 'junctions_hourly'))
+
+    def processAlgorithm(self, parameters, context, feedback):
+        origin, dest, road, junctions = self.layers(parameters, context)
+        settings = self.settings(parameters, context)
+        out_gpkg = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+        settings['out_gpkg'] = out_gpkg
+        task = run_task(task_params(origin, dest, road, junctions, settings, context.transformContext()), feedback)
+        feedback.pushInfo(f'{task.route_count} routes.' + task.sampling_note + task.cache_note)
+
+        results = {self.OUTPUT: out_gpkg, self.ROUTE_COUNT: task.route_count, self.RESULTS: store_path(out_gpkg),
+                   self.REPORT: task.report_file}
+        for name in OUTPUT_LAYERS:
+            if settings['tile_size'] and name in CORRIDOR_LAYERS:
+                continue  # tiled runs write no corridors or route tables
+            uri = f'{out_gpkg}|layername={name}'
+            results[name.upper()] = uri
+            details = QgsProcessingContext.LayerDetails(name, context.project(), name)
+            if name == 'GeoScheduler_Density_Grid':
+                # kept on the algorithm: QGIS holds no reference to post processors
+                self.grid_style = DensityGridStyle(task.density_levels)
+                details.setPostProcessor(self.grid_style)
+            context.addLayerToLoadOnCompletion(uri, details)
+        if task.hourly is not None:
+            uri = f'{out_gpkg}|layername=junctions_hourly'
+            results[self.HOURLY_JUNCTIONS] = uri
+            context.addLayerToLoadOnCompletion(uri, QgsProcessingContext.LayerDetails(
+                'junctions_hourly', context.project(), 'junctions_hourly'))
+        return results
+
+
+class GeoSchedulerBatchAlgorithm(GeoSchedulerAlgorithmBase):
+    PARAMETER_SETS = 'PARAMETER_SETS'
+    OUTPUT_FOLDER = 'OUTPUT_FOLDER'
+    SUMMARY = 'SUMMARY'
+    RUN_COUNT = 'RUN_COUNT'
+
+    def name(self):
+        return 'batch'
+
+    def displayName(self):
+        return 'Batch GeoScheduler'
+
+    def shortHelpString(self):
+        return ('Runs GeoScheduler once per row of a CSV file. Recognised columns: '
+                + ', '.join(BATCH_COLUMNS) + '. origins / destinations are layer paths or project '
+                'layer names for per-AOI zones; empty cells use the values set below. The road '
+                'network, junctions and zone centroids are loaded once for the whole batch. '
+                'Each run writes <name>.gpkg into the output folder unless an output path is given, '
+                'and batch_summary.csv lists the outcome of every row.')
+
+    def createInstance(self):
+        return GeoSchedulerBatchAlgorithm()
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterFile(
+            self.PARAMETER_SETS, 'Parameter sets (CSV)', QgsProcessingParameterFile.File, 'csv'))
+        self.add_pipeline_parameters()
+        self.addParameter(QgsProcessingParameterFolderDestination(self.OUTPUT_FOLDER, 'Output folder'))
+        self.addOutput(QgsProcessingOutputFile(self.SUMMARY, 'Batch summary'))
+        self.addOutput(QgsProcessingOutputNumber(self.RUN_COUNT, 'Successful runs'))
+
+    def row_settings(self, row, defaults, index, folder):
+        settings = dict(defaults)
+        for key, cast in (('maxrep', int), ('threshold', float), ('snap_tolerance', float), ('seed', int)):
+            if row.get(key):
+                settings[key] = cast(row[key])
+        if row.get('time_mode'):
+            if row['time_mode'] not in TIME_MODES:
+                raise QgsProcessingException(f"Unknown time_mode '{row['time_mode']}'")
+            settings['time_mode'] = row['time_mode']
+        if row.get('adaptive'):
+            settings['adaptive'] = row['adaptive'].strip().lower() in ('1', 'true', 'yes')
+        name = row.get('name') or f'run_{index:03d}'
+        settings['out_gpkg'] = row.get('output') or os.path.join(folder, name + '.gpkg')
+        return name, settings
+
+    def row_layer(self, value, default, context):
+        if not value:
+            return default
+        layer = QgsProcessingUtils.mapLayerFromString(value, context)
+        if layer is None:
+            raise QgsProcessingException(f'Cannot load layer {value}')
+        return layer
+
+    def processAlgorithm(self, parameters, context, feedback):
+        origin, dest, road, junctions = self.layers(parameters, context)
+        defaults = self.settings(parameters, context)
+        folder = self.parameterAsString(parameters, self.OUTPUT_FOLDER, context)
+        os.makedirs(folder, exist_ok=True)
+        with open(self.parameterAsFile(parameters, self.PARAMETER_SETS, context), newline='') as fh:
+            rows = [{k.strip().lower(): (v or '').strip() for k, v in row.items() if k} for row in csv.DictReader(fh)]
+        if not rows:
+            raise QgsProcessingException('The parameter CSV has no rows')
+
+        # graph, junctions and centroids loaded by one row are reused by the next
+        session = {}
+        summary = []
+        ok_runs = 0
+        for i, row in enumerate(rows, 1):
+            if feedback.isCanceled():
+                break
+            name, settings = self.row_settings(row, defaults, i, folder)
+            feedback.pushInfo(f'[{i}/{len(rows)}] {name}')
+            params = task_params(self.row_layer(row.get('origins'), origin, context),
+                                 self.row_layer(row.get('destinations'), dest, context),
+                                 road, junctions, settings, context.transformContext())
+            params['session'] = session
+            try:
+                task = run_task(params, feedback)
+            except QgsProcessingException as e:
+                if feedback.isCanceled():
+                    break
+                feedback.reportError(f'{name}: {e}')
+                summary.append((name, settings['out_gpkg'], 0, str(e)))
+                continue
+            ok_runs += 1
+            summary.append((name, settings['out_gpkg'], task.route_count, 'ok'))
+
+        summary_path = os.path.join(folder, 'batch_summary.csv')
+        with open(summary_path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(('name', 'output', 'routes', 'status'))
+            writer.writerows(summary)
+        return {self.SUMMARY: summary_path, self.RUN_COUNT: ok_runs}
+
+
+class GeoSchedulerProvider(QgsProcessingProvider):
+    def id(self):
+        return 'geoscheduler'
+
+    def name(self):
+        return 'GeoScheduler'
+
+    def longName(self):
+        return 'GeoScheduler Pro (Traffickers Fixed V3)'
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(GeoSchedulerRunAlgorithm())
+        self.addAlgorithm(GeoSchedulerBatchAlgorithm())
@@ -0,0 +1,508 @@
+from qgis.core import (
+    QgsTask, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsUnitTypes, QgsVectorLayerFeatureSource
+)
+from qgis.PyQt.QtCore import pyqtSignal
+import os
+import time
+
+import numpy as np
+
+from geoscheduler_core import (
+    CORRIDOR_SPLITS, RoutingCanceled, density_at, junction_weights, match_points, representatives, route_od,
+    RunReport, SignalNetwork, compare_modes, report_path, route_tiled, store_path, write_results,
+    HOURS, edge_travel_times, hourly_speeds, hourly_weights, load_speed_table, route_hourly,
+    cell_rings, density_levels, corridor_segments, listed_route_ids, MAX_DETOUR
+)
+from geoscheduler_core.gpkg import GpkgWriter, linestring_wkb, point_wkb, polygon_wkb
+from geoscheduler_core.qgis_io import feature_values, graph_from_layer, point_arrays, tile_loader, zone_centroids
+
+
+# stages run under cProfile when params['profile'] is set
+PROFILE_STAGES = ('graph', 'routing', 'aggregate', 'gpkg_write', 'simulation', 'hourly')
+# corridor outputs of whole-network runs: segment layer, route table, route -> segment table
+CORRIDOR_LAYERS = ('GeoScheduler_Corridors', 'GeoScheduler_Routes', 'GeoScheduler_Route_Segments')
+# weightings compared by the signal simulation
+SIMULATED_MODES = ('AM Peak', 'Off-Peak')
+
+
+def layer_key(layer, *extra):
+    """Identity of a layer's contents for the batch session cache."""
+    return (layer.source(), layer.subsetString()) + extra
+
+
+def task_params(origin, dest, road, junctions, settings, transform_context):
+    """
+    Task parameters for a run on four layers. `settings` holds maxrep, workers,
+    threshold, snap_tolerance, seed, adaptive, adaptive_tol, use_cache,
+    time_mode, tile_size (0 routes on the whole network), sim_vehicles (routed
+    vehicles per hour for the signal simulation, 0 = off), hourly, speed_field
+    (road attribute with km/h speeds or speed table keys, '' = default speed),
+    speed_table (CSV of hourly speeds, '' = none), bin_shape ('hex' or
+    'square'), bin_size (finest density cell in map units, 0 = from the
+    extent), alternatives (routes per OD pair, 1 = shortest path only),
+    max_detour (cost cap of an alternative above the shortest path, e.g.
+    0.25), profile and out_gpkg.
+    """
+    road_crs = road.crs()
+    extent = road.extent()
+    out_gpkg = settings['out_gpkg']
+    params = dict(settings)
+    params.update({
+        'origin_source': QgsVectorLayerFeatureSource(origin),
+        'origin_transform': QgsCoordinateTransform(origin.crs(), road_crs, transform_context),
+        'dest_source': QgsVectorLayerFeatureSource(dest),
+        'dest_transform': QgsCoordinateTransform(dest.crs(), road_crs, transform_context),
+        'road_source': QgsVectorLayerFeatureSource(road),
+        'road_crs': road_crs,
+        'road_extent': (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()),
+        'speed_field_index': road.fields().indexOf(settings['speed_field']) if settings.get('speed_field') else -1,
+        # hourly travel times need segment lengths in metres
+        'metres_per_unit': QgsUnitTypes.fromUnitToUnitFactor(road_crs.mapUnits(), QgsUnitTypes.DistanceMeters),
+        'junction_source': QgsVectorLayerFeatureSource(junctions),
+        # the route cache lives next to the output GeoPackage
+        'cache_path': os.path.splitext(out_gpkg)[0] + '_route_cache.sqlite' if settings['use_cache'] else '',
+        # session cache keys; only used when params['session'] is set
+        'origin_key': layer_key(origin, road_crs.authid()),
+        'dest_key': layer_key(dest, road_crs.authid()),
+        'road_key': layer_key(road),
+        'junction_key': layer_key(junctions),
+    })
+    return params
+
+
+class GeoSchedulerProFinalStableTraffickersFixedV3Task(QgsTask):
+    """
+    Runs the whole pipeline off the GUI thread, GeoPackage export included.
+    The dialog only loads the written layers into the project when it is done.
+    """
+    statusChanged = pyqtSignal(str)
+
+    def __init__(self, params):
+        super().__init__('GeoScheduler Pro (Traffickers Fixed V3)', QgsTask.CanCancel)
+        self.params = params
+        self.sampling_note = ''
+        self.cache_note = ''
+        self.junction_fids = []
+        self.junction_density = None
+        self.out_fids = []
+        self.origin_xy = None
+        self.dest_xy = None
+        self.route_count = 0
+        self.simulation = {}
+        # (24, junctions) density and corridor weights of an hourly run
+        self.hourly = None
+        # (level, from_scale, to_scale) of the density grid, for the scale-switching renderer
+        self.density_levels = []
+        self.message = ''
+        # timings, counters and pair failures, written next to the output as JSON
+        self.report = RunReport(profile=PROFILE_STAGES if params.get('profile') else ())
+        self.report_file = ''
+
+    def set_status(self, text):
+        self.statusChanged.emit(text)
+
+    def cached(self, kind, key, build):
+        # batch runs share loaded inputs through params['session'], a dict kept between runs
+        session = self.params.get('session')
+        if session is None or key is None:
+            return build()
+        if (kind, key) not in session:
+            value = build()
+            if self.isCanceled():
+                return value
+            session[(kind, key)] = value
+        return session[(kind, key)]
+
+    def seed(self):
+        seed = self.params['seed']
+        return None if seed < 0 else seed
+
+    def route_pairs(self, graph, orig_pts, dest_pts, orig_w, dest_w, jnodes):
+        p = self.params
+        started = time.time()
+
+        def progress(done, total):
+            self.setProgress(10 + 60.0 * done / total)
+            eta = (time.time() - started) / done * (total - done)
+            self.set_status(f'Routing {done}/{total} (about {eta:.0f}s left)')
+
+        alternatives = p.get('alternatives', 1)
+        if alternatives > 1 and (p['adaptive'] or p['cache_path']):
+            self.report.set(alternatives='all pairs routed: adaptive sampling and the route cache take one route per pair')
+        res = route_od(graph, orig_pts, dest_pts, orig_w, dest_w, jnodes, p['threshold'],
+                       workers=p['workers'], adaptive=p['adaptive'], adaptive_tol=p['adaptive_tol'],
+                       seed=self.seed(), cache_path=p['cache_path'], alternatives=alternatives,
+                       max_detour=p.get('max_detour', MAX_DETOUR), progress=progress, is_canceled=self.isCanceled)
+        attempted = res.sampler.drawn if res.sampler is not None else len(orig_pts) * len(dest_pts)
+        pairs = len({(r.origin, r.dest) for r in res.routes}) if res.probability is not None else len(res.routes)
+        self.report.count('pairs_attempted', attempted)
+        self.report.count('pairs_routed', pairs)
+        self.report.count('alternative_routes', len(res.routes) - pairs)
+        self.report.count('route_segments', sum(len(r.edges) for r in res.routes))
+        # snapped ends in different network components
+        self.report.fail('unreachable', attempted - pairs)
+        if res.sampler is not None:
+            self.sampling_note = f' Routed {res.sampler.drawn}/{res.sampler.total_pairs} pairs, confidence {res.sampler.confidence:.2f}.'
+        if res.probability is not None and pairs:
+            self.sampling_note += f' {len(res.routes) / pairs:.1f} routes per pair.'
+        if res.cache_summary:
+            self.cache_note = ' ' + res.cache_summary.capitalize() + '.'
+        return res.routes, res.usage, res.probability
+
+    def route_network(self, orig_pts, dest_pts, orig_w, dest_w, xs, ys):
+        """Route on the whole network in memory; returns the run outputs for used nodes."""
+        p = self.params
+        report = self.report
+        with report.stage('graph'):
+            graph = self.cached('graph', p.get('road_key'), lambda: graph_from_layer(p['road_source']))
+        report.count('network_nodes', graph.node_count)
+        report.count('network_edges', graph.edge_count)
+        if graph.node_count == 0:
+            self.message = 'No paths computed'; return None
+        # match every junction to its nearest network node within the snap tolerance
+        with report.stage('junction_match'):
+            jnodes = match_points(graph.node_x, graph.node_y, xs, ys, p['snap_tolerance'])
+        report.count('junctions_unmatched', np.count_nonzero(jnodes < 0))
+        try:
+            with report.stage('routing'):
+                paths, usage, prob = self.route_pairs(graph, orig_pts, dest_pts, orig_w, dest_w, jnodes)
+        except RoutingCanceled:
+            return None
+        if not paths:
+            self.message = 'No paths computed'; return None
+        self.route_count = len(paths)
+
+        self.set_status('Aggregating density...')
+        with report.stage('aggregate'):
+            node_counts, density = usage.node_counts(), usage.node_density()
+            used_nodes = np.nonzero(node_counts)[0]
+            per_feature = usage.feature_counts(len(graph.feature_ids))
+            used_features = np.nonzero(per_feature)[0]
+            features = (np.asarray(graph.feature_ids, dtype=np.int64)[used_features], per_feature[used_features])
+            # shared road geometry once per segment; routes become segment lists
+            segments = corridor_segments(graph, paths, prob)
+        report.count('corridor_segments', len(segments.feature))
+        if prob is None:
+            prob = np.ones(len(paths))
+        if p.get('sim_vehicles'):
+            # each route carries the zones its representatives stand for, split over a pair's alternatives
+            weights = [orig_w[r.origin] * dest_w[r.dest] * pr for r, pr in zip(paths, prob)]
+            self.simulate_signals(graph, paths, weights, usage, jnodes, density_at(jnodes, density))
+        if p.get('hourly'):
+            try:
+                self.route_hours(graph, orig_pts, dest_pts, jnodes)
+            except RoutingCanceled:
+                return None
+        od = np.array([(r.origin, r.dest, r.cost) for r in paths]).reshape(-1, 3)
+        # 0 for a pair's shortest route, then 1, 2, ... for its alternatives
+        first = np.r_[True, (od[1:, 0] != od[:-1, 0]) | (od[1:, 1] != od[:-1, 1])] if len(od) else np.zeros(0, dtype=bool)
+        index = np.arange(len(od))
+        alternative = index - np.maximum.accumulate(np.where(first, index, 0))
+        corridors = (segments, np.asarray(graph.feature_ids, dtype=np.int64)[segments.feature],
+                     np.column_stack((od, alternative, prob)))
+        return (corridors, graph.node_x[used_nodes], graph.node_y[used_nodes], node_counts[used_nodes],
+                density[used_nodes], density_at(jnodes, density), features)
+
+    def simulate_signals(self, graph, paths, weights, usage, jnodes, jdensity):
+        """Queue delays at every junction under peak and off-peak weights, on the same traffic."""
+        p = self.params
+        self.set_status('Simulating signals...')
+        with self.report.stage('simulation'):
+            scenario = SignalNetwork(graph, jnodes, usage.edge_counts).scenario(
+                paths, weights, vehicles_per_hour=p['sim_vehicles'], seed=self.seed() or 0,
+                metres_per_unit=p.get('metres_per_unit', 1.0))
+            self.simulation = compare_modes(scenario, jdensity, p['threshold'], SIMULATED_MODES, CORRIDOR_SPLITS)
+        self.report.count('simulated_vehicles', scenario.vehicle_count)
+        self.report.set(simulation={mode: {'mean_delay': r.network_mean_delay, 'max_queue': int(r.max_queue.max(initial=0)),
+                                           'junction_passages': r.events}
+                                    for mode, r in self.simulation.items()})
+        self.sampling_note += ' Mean signal delay ' + ', '.join(
+            f'{mode} {r.network_mean_delay:.1f}s' for mode, r in self.simulation.items()) + '.'
+
+    def route_hours(self, graph, orig_pts, dest_pts, jnodes):
+        """Route all 24 hours on hourly travel times; fills self.hourly."""
+        p = self.params
+        started = time.time()
+
+        def progress(done, total):
+            self.setProgress(70 + 5.0 * done / total)
+            eta = (time.time() - started) / done * (total - done)
+            self.set_status(f'Hourly routing {done}/{total} (about {eta:.0f}s left)')
+
+        with self.report.stage('hourly'):
+            # the speed field holds km/h, or the keys of the speed table when one is given
+            if p.get('speed_field_index', -1) >= 0:
+                values = feature_values(p['road_source'], p['speed_field_index'], graph.feature_ids)
+            else:
+                values = [None] * len(graph.feature_ids)
+            table = load_speed_table(p['speed_table']) if p.get('speed_table') else None
+            times = edge_travel_times(graph, hourly_speeds(values, table=table), p.get('metres_per_unit', 1.0))
+            res = route_hourly(graph, orig_pts, dest_pts, jnodes, times, workers=p['workers'],
+                               progress=progress, is_canceled=self.isCanceled)
+            used, cw, _ = hourly_weights(res.junction_density, p['threshold'], CORRIDOR_SPLITS)
+        self.hourly = (res.junction_density, cw)
+        self.report.count('hourly_cost_sets', int(res.cost_set.max()) + 1 if len(res.cost_set) else 0)
+        self.report.count('hourly_routes', res.route_counts.sum())
+        self.report.set(hourly={'used_junctions': used.sum(axis=1).tolist(), 'routes': res.route_counts.tolist(),
+                                'cost_set': res.cost_set.tolist()})
+        self.sampling_note += f' Hourly run: {int(res.cost_set.max()) + 1} distinct travel-time sets, peak hour {int(used.sum(axis=1).argmax()):02d}:00.'
+
+    def route_tiles(self, orig_pts, dest_pts, xs, ys):
+        """Route tile by tile with bounded memory; no corridor segments or route tables are produced."""
+        p = self.params
+        started = time.time()
+
+        def progress(done, total):
+            self.setProgress(10 + 60.0 * done / total)
+            eta = (time.time() - started) / done * (total - done)
+            self.set_status(f'Tiled routing, step {done}/{total} (about {eta:.0f}s left)')
+
+        report = self.report
+        try:
+            with report.stage('routing'):
+                res = route_tiled(tile_loader(p['road_source']), p['road_extent'], p['tile_size'],
+                                  orig_pts, dest_pts, np.column_stack((xs, ys)), p['snap_tolerance'],
+                                  progress=progress, is_canceled=self.isCanceled)
+        except RoutingCanceled:
+            return None
+        report.count('tiles', res.tile_count)
+        report.count('boundary_nodes', res.boundary_count)
+        report.count('network_nodes', len(res.node_x))
+        report.count('pairs_attempted', res.costs.size)
+        report.count('pairs_routed', res.route_count)
+        report.fail('unreachable', res.costs.size - res.route_count)
+        if not res.route_count:
+            self.message = 'No paths computed'; return None
+        self.route_count = res.route_count
+        self.sampling_note = f' Tiled run over {res.tile_count} tiles, {res.boundary_count} boundary nodes.'
+        features = (np.fromiter(res.feature_counts.keys(), dtype=np.int64, count=len(res.feature_counts)),
+                    np.fromiter(res.feature_counts.values(), dtype=np.int64, count=len(res.feature_counts)))
+        return (None, res.node_x, res.node_y, res.node_counts, res.node_density, res.junction_density,
+                features)
+
+    def write_corridors(self, writer, corridors):
+        """Corridor segments plus the route and route -> segment tables that replace route geometries."""
+        segments, road_fids, od = corridors
+        ptr = segments.vertex_ptr
+        count = self.report.count
+        count('features_written', writer.write_layer(
+            'GeoScheduler_Corridors', 'LineString',
+            [('road_fid', 'int64'), ('routes', 'int'), ('flow', 'double'), ('rank', 'int'), ('route_ids', 'str')],
+            ((s + 1, linestring_wkb(segments.x[ptr[s]:ptr[s + 1]], segments.y[ptr[s]:ptr[s + 1]]),
+              (int(road_fids[s]), int(segments.route_count[s]), float(segments.flow[s]), int(segments.rank[s]),
+               listed_route_ids(segments, s)))
+             for s in range(len(road_fids))),
+            is_canceled=self.isCanceled))
+        count('features_written', writer.write_layer(
+            'GeoScheduler_Routes', None,
+            [('route_id', 'int'), ('origin', 'int'), ('destination', 'int'), ('cost', 'double'),
+             ('alternative', 'int'), ('probability', 'double')],
+            ((rid, None, (rid, int(o), int(d), float(c), int(a), float(pr)))
+             for rid, (o, d, c, a, pr) in enumerate(od, 1)),
+            is_canceled=self.isCanceled))
+        # seq orders the segments along the route; corridor_fid is the fid in GeoScheduler_Corridors
+        path_route = np.repeat(np.arange(1, len(od) + 1), np.diff(segments.path_ptr))
+        path_seq = np.arange(len(segments.path)) - np.repeat(segments.path_ptr[:-1], np.diff(segments.path_ptr))
+        count('features_written', writer.write_layer(
+            'GeoScheduler_Route_Segments', None, [('route_id', 'int'), ('seq', 'int'), ('corridor_fid', 'int')],
+            ((i, None, (int(r), int(q), int(s) + 1))
+             for i, r, q, s in zip(range(1, len(path_route) + 1), path_route, path_seq, segments.path)),
+            is_canceled=self.isCanceled))
+
+    def run(self):
+        try:
+            ok = self.run_pipeline()
+            self.report.finish('completed' if ok else 'canceled' if self.isCanceled() else 'failed')
+            return ok
+        except Exception as e:
+            self.message = f'GeoScheduler run failed: {e}'
+            self.report.set(error=str(e))
+            self.report.finish('failed')
+            return False
+        finally:
+            self.write_report()
+
+    def write_report(self):
+        p = self.params
+        if self.message:
+            self.report.set(message=self.message)
+        self.report.set(settings={k: p[k] for k in ('maxrep', 'workers', 'threshold', 'snap_tolerance', 'seed',
+                                                     'adaptive', 'adaptive_tol', 'use_cache', 'time_mode',
+                                                     'tile_size', 'sim_vehicles', 'hourly', 'speed_field',
+                                                     'speed_table', 'bin_shape', 'bin_size', 'alternatives',
+                                                     'max_detour', 'out_gpkg') if k in p})
+        try:
+            self.report_file = self.report.write(report_path(p['out_gpkg']))
+        except OSError:
+            # a missing report never fails the run
+            self.report_file = ''
+
+    def run_pipeline(self):
+        p = self.params
+        road_crs = p['road_crs']
+        self.set_status('Computing centroids...')
+        # centroids cached by the dialog from an earlier run are passed in as arrays
+        report = self.report
+        with report.stage('centroids'):
+            orig_pts = p.get('origin_xy')
+            if orig_pts is None:
+                orig_pts = self.cached('centroids', p.get('origin_key'),
+                                       lambda: zone_centroids(p['origin_source'], p['origin_transform'], self.isCanceled))
+            dest_pts = p.get('dest_xy')
+            if dest_pts is None:
+                dest_pts = self.cached('centroids', p.get('dest_key'),
+                                       lambda: zone_centroids(p['dest_source'], p['dest_transform'], self.isCanceled))
+        if self.isCanceled(): return False
+        self.origin_xy, self.dest_xy = orig_pts, dest_pts
+        report.count('origin_zones', len(orig_pts))
+        report.count('destination_zones', len(dest_pts))
+        if not len(orig_pts) or not len(dest_pts):
+            self.message = 'No centroids found'; return False
+
+        m = p['maxrep']
+        with report.stage('representatives'):
+            orig_pts, orig_w = representatives(orig_pts, m, self.seed())
+            dest_pts, dest_w = representatives(dest_pts, m, self.seed())
+        report.count('origin_representatives', len(orig_pts))
+        report.count('destination_representatives', len(dest_pts))
+        self.setProgress(10)
+
+        with report.stage('junctions'):
+            fids, xs, ys = self.cached('junctions', p.get('junction_key'), lambda: point_arrays(p['junction_source']))
+        report.count('junctions', len(fids))
+        if p.get('tile_size'):
+            if p.get('hourly'):
+                report.set(hourly='skipped: tiled runs keep no network for hourly routing')
+            if p.get('alternatives', 1) > 1:
+                report.set(alternatives='skipped: tiled runs route one path per pair')
+            routed = self.route_tiles(orig_pts, dest_pts, xs, ys)
+        else:
+            routed = self.route_network(orig_pts, dest_pts, orig_w, dest_w, xs, ys)
+        if routed is None:
+            return False
+        corridors, node_x, node_y, node_counts, density, self.junction_density, features = routed
+        self.setProgress(75)
+        if self.isCanceled(): return False
+
+        # route counts binned into cells at a few resolutions instead of one point per node
+        shape = p.get('bin_shape', 'hex')
+        with report.stage('binning'):
+            levels = density_levels(node_x, node_y, node_counts, p.get('bin_size', 0.0), shape,
+                                    metres_per_unit=p.get('metres_per_unit', 1.0))
+            sizes = [len(lv.x) for lv in levels]
+            grid = {name: np.concatenate([np.asarray(getattr(lv, name)) for lv in levels])
+                    for name in ('x', 'y', 'routes', 'volume', 'density')}
+            grid['level'] = np.repeat(np.arange(len(levels)), sizes)
+            grid['cell_size'] = np.repeat([lv.cell_size for lv in levels], sizes)
+            rings = np.concatenate([cell_rings(lv.x, lv.y, lv.cell_size, shape) for lv in levels])
+        self.density_levels = [(lv.level, lv.from_scale, lv.to_scale) for lv in levels]
+        report.count('density_cells', len(grid['x']))
+
+        # kept on the task so the dialog can reweight without rerouting
+        self.junction_fids = fids
+        with report.stage('weights'):
+            used, cw, xw = junction_weights(self.junction_density, p['threshold'], p['time_mode'], CORRIDOR_SPLITS)
+        # junctions_weighted fids are assigned here, so the dialog needs no read-back
+        self.out_fids = list(range(1, len(fids) + 1))
+
+        # stream all outputs into the GeoPackage in one transaction
+        self.set_status('Writing GeoPackage...')
+        with report.stage('gpkg_write'):
+            writer = GpkgWriter(p['out_gpkg'], road_crs.toWkt(QgsCoordinateReferenceSystem.WKT_PREFERRED_GDAL))
+            try:
+                # one full linestring per route in earlier versions
+                writer.delete_layer('GeoScheduler_OD_Routes')
+                if corridors is None:
+                    # tiled runs keep no routes; drop the ones of an earlier run
+                    for name in CORRIDOR_LAYERS:
+                        writer.delete_layer(name)
+                else:
+                    self.write_corridors(writer, corridors)
+                self.setProgress(80)
+                # the per-node point layer of earlier versions
+                writer.delete_layer('GeoScheduler_Density_Points')
+                # alternatives make counts expected routes, which are fractional
+                fractional = grid['routes'].dtype.kind == 'f'
+                report.count('features_written', writer.write_layer(
+                    'GeoScheduler_Density_Grid', 'Polygon',
+                    [('level', 'int'), ('cell_size', 'double'), ('routes', 'double' if fractional else 'int'),
+                     ('volume', 'double' if fractional else 'int64'), ('density', 'double')],
+                    ((fid, wkb, (int(lv), float(size), rt, vol, float(dn)))
+                     for fid, wkb, lv, size, rt, vol, dn in zip(
+                         range(1, len(rings) + 1), polygon_wkb(rings), grid['level'], grid['cell_size'],
+                         grid['routes'].tolist(), grid['volume'].tolist(), grid['density'])),
+                    is_canceled=self.isCanceled))
+                self.setProgress(85)
+                report.count('features_written', writer.write_layer(
+                    'junctions_weighted', 'Point',
+                    [('src_fid', 'int64'), ('UsedByComm', 'int'), ('Corridor_Weight', 'double'), ('CrossTraffic_Weight', 'double')],
+                    ((fid, wkb, (int(src), int(u), float(c), float(x)))
+                     for fid, src, wkb, u, c, x in zip(self.out_fids, fids, point_wkb(xs, ys), used, cw, xw)),
+                    is_canceled=self.isCanceled))
+                if self.hourly is None:
+                    writer.delete_layer('junctions_hourly')
+                else:
+                    # one row per junction: corridor weight and density for every hour
+                    hdensity, hcw = self.hourly
+                    report.count('features_written', writer.write_layer(
+                        'junctions_hourly', 'Point',
+                        [('src_fid', 'int64')] + [(f'cw_{h:02d}', 'double') for h in range(HOURS)]
+                        + [(f'dn_{h:02d}', 'double') for h in range(HOURS)],
+                        ((fid, wkb, (int(src),) + tuple(hcw[:, i].tolist()) + tuple(hdensity[:, i].tolist()))
+                         for i, (fid, src, wkb) in enumerate(zip(self.out_fids, fids, point_wkb(xs, ys)))),
+                        is_canceled=self.isCanceled))
+                if self.isCanceled():
+                    writer.rollback()
+                    return False
+                writer.commit()
+            except Exception:
+                writer.rollback()
+                raise
+
+        # typed columns next to the GeoPackage, opened memory-mapped by the dialog and notebooks
+        self.set_status('Writing result store...')
+        with report.stage('result_store'):
+            tables = {
+                'nodes': {'x': node_x, 'y': node_y, 'count': node_counts, 'density': density},
+                'junctions': {'fid': np.asarray(self.out_fids, dtype=np.int64), 'src_fid': np.asarray(fids, dtype=np.int64),
+                              'x': xs, 'y': ys, 'density': self.junction_density},
+                'features': {'fid': features[0], 'count': features[1]},
+                # one row per non-empty cell of every level, fids of GeoScheduler_Density_Grid in order
+                'density_grid': {name: grid[name] for name in ('level', 'x', 'y', 'routes', 'volume', 'density')},
+                # per junction, e.g. simulation.delay_am_peak
+                'simulation': {f'{stat}_{mode.lower().replace("-", "_").replace(" ", "_")}': getattr(r, stat)
+                               for mode, r in self.simulation.items()
+                               for stat in ('mean_delay', 'max_queue', 'mean_queue')},
+                # per junction, density_08 / corridor_weight_08 for 08:00-09:00
+                'hourly': {} if self.hourly is None else {
+                    **{f'density_{h:02d}': self.hourly[0][h] for h in range(HOURS)},
+                    **{f'corridor_weight_{h:02d}': self.hourly[1][h] for h in range(HOURS)}},
+            }
+            if corridors is not None:
+                segments, road_fids, od = corridors
+                tables.update({
+                    'corridors': {'fid': np.arange(1, len(road_fids) + 1), 'road_fid': road_fids,
+                                  'routes': segments.route_count, 'flow': segments.flow, 'rank': segments.rank},
+                    # route r passes corridor fids route_segments[first_segment[r]:][:segment_count[r]]
+                    'routes': {'origin': od[:, 0].astype(np.int64), 'destination': od[:, 1].astype(np.int64),
+                               'cost': od[:, 2], 'alternative': od[:, 3].astype(np.int64), 'probability': od[:, 4],
+                               'first_segment': segments.path_ptr[:-1],
+                               'segment_count': np.diff(segments.path_ptr)},
+                    'route_segments': {'corridor_fid': segments.path + 1},
+                })
+            write_results(store_path(p['out_gpkg']), tables, {
+                'gpkg': os.path.basename(p['out_gpkg']),
+                'crs': road_crs.authid(),
+                'route_count': self.route_count,
+                'threshold': p['threshold'],
+                'time_mode': p['time_mode'],
+                'tile_size': p.get('tile_size', 0),
+                'hourly': self.hourly is not None,
+                'alternatives': p.get('alternatives', 1) if corridors is not None else 1,
+                'density_grid': {'shape': shape, 'levels': [
+                    {'level': lv.level, 'cell_size': lv.cell_size, 'from_scale': lv.from_scale, 'to_scale': lv.to_scale}
+                    for lv in levels]},
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+        self.setProgress(100)
+        return True
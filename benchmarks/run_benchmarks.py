@@ -0,0 +1,245 @@
+"""
+Time every stage of a GeoScheduler run on synthetic inputs.
+
+    python benchmarks/run_benchmarks.py --scales small medium --output bench.json
+
+For each network kind (grid, radial) and scale the stages are timed
+separately and the best of --repeat runs is written to a JSON file together
+with the problem sizes and the environment, so results can be compared
+across commits and engines. Stages that need QGIS (centroids through the
+QGIS adapter, the junction layer write) or GDAL (GeoPackage export) are
+recorded as skipped when those bindings cannot be imported.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geoscheduler_core import (  # noqa: E402
+    ALTERNATIVES, CORRIDOR_SPLITS, RoadGraph, SignalNetwork, cell_rings, compare_modes, corridor_segments, default_workers,
+    density_at, density_levels, junction_weights, match_points, representatives, route_od
+)
+from synthetic import grid_network, network_extent, radial_network, ring_centroids, zones  # noqa: E402
+
+
+# per scale: grid side, (rings, spokes), zones per side, representatives per side
+SCALES = {
+    'small': {'grid': 20, 'radial': (10, 24), 'zones': 500, 'reps': 5},
+    'medium': {'grid': 60, 'radial': (30, 48), 'zones': 5000, 'reps': 10},
+    'large': {'grid': 150, 'radial': (75, 96), 'zones': 50000, 'reps': 20},
+}
+SPACING = 100.0
+
+
+def optional_qgis():
+    """Started QgsApplication, or None when the QGIS bindings are not importable."""
+    try:
+        from qgis.core import QgsApplication
+    except ImportError:
+        return None
+    app = QgsApplication([], False)
+    app.initQgis()
+    return app
+
+
+def optional_gdal():
+    try:
+        from osgeo import ogr  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def zone_layer(rings, name):
+    from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsVectorLayer
+    layer = QgsVectorLayer('Polygon?crs=EPSG:3857', name, 'memory')
+    feats = []
+    for ring in rings:
+        f = QgsFeature()
+        f.setGeometry(QgsGeometry.fromPolygonXY([[QgsPointXY(float(x), float(y)) for x, y in ring]]))
+        feats.append(f)
+    layer.dataProvider().addFeatures(feats)
+    return layer
+
+
+def junction_layer(xy):
+    from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsPointXY, QgsVectorLayer
+    from qgis.PyQt.QtCore import QVariant
+    layer = QgsVectorLayer('Point?crs=EPSG:3857', 'junctions', 'memory')
+    layer.dataProvider().addAttributes([QgsField('UsedByComm', QVariant.Int),
+                                        QgsField('Corridor_Weight', QVariant.Double),
+                                        QgsField('CrossTraffic_Weight', QVariant.Double)])
+    layer.updateFields()
+    feats = []
+    for x, y in xy:
+        f = QgsFeature(layer.fields())
+        f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(float(x), float(y))))
+        feats.append(f)
+    layer.dataProvider().addFeatures(feats)
+    return layer
+
+
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, name, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.stages[name] = min(elapsed, self.stages.get(name, elapsed))
+        return result
+
+
+def run_case(kind, scale, args, timer, skipped, has_qgis, has_gdal):
+    spec = SCALES[scale]
+    if kind == 'grid':
+        polylines, jxy = grid_network(spec['grid'], SPACING)
+    else:
+        polylines, jxy = radial_network(*spec['radial'], spacing=SPACING)
+    extent = network_extent(jxy)
+    o_rings = zones(spec['zones'], extent, 3 * SPACING, seed=args.seed)
+    d_rings = zones(spec['zones'], extent, 3 * SPACING, seed=args.seed + 1)
+
+    graph = timer('graph_build', RoadGraph.from_polylines, polylines)
+
+    o_xy = timer('centroids', ring_centroids, o_rings)
+    d_xy = ring_centroids(d_rings)
+    if has_qgis:
+        from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+        from geoscheduler_core.qgis_io import zone_centroids
+        layer = zone_layer(o_rings, 'origins')
+        crs = QgsCoordinateReferenceSystem('EPSG:3857')
+        transform = QgsCoordinateTransform(crs, crs, QgsProject.instance())
+        timer('centroids_qgis', zone_centroids, layer, transform)
+    else:
+        skipped['centroids_qgis'] = 'qgis not importable'
+
+    o_rep, o_w = timer('km_reduce', representatives, o_xy, spec['reps'], args.seed)
+    d_rep, d_w = representatives(d_xy, spec['reps'], args.seed)
+
+    jnodes = timer('junction_match', match_points, graph.node_x, graph.node_y,
+                   jxy[:, 0], jxy[:, 1], SPACING / 10)
+    res = timer('routing', route_od, graph, o_rep, d_rep, o_w, d_w, jnodes, args.threshold,
+                workers=args.workers, adaptive=args.adaptive, seed=args.seed)
+    # same pairs with alternative routes; the stages below use the shortest paths
+    timer('alternative_routing', route_od, graph, o_rep, d_rep, o_w, d_w, jnodes, args.threshold,
+          workers=args.workers, seed=args.seed, alternatives=ALTERNATIVES)
+
+    def aggregate():
+        return res.usage.node_counts(), density_at(jnodes, res.usage.node_density())
+    node_counts, jdensity = timer('density', aggregate)
+    nz = np.nonzero(node_counts)[0]
+    levels = timer('density_binning', density_levels, graph.node_x[nz], graph.node_y[nz], node_counts[nz])
+    segments = timer('corridor_segments', corridor_segments, graph, res.routes)
+
+    def weights():
+        used, cw, xw = junction_weights(jdensity, args.threshold, 'AM Peak', CORRIDOR_SPLITS)
+        return {fid: {0: int(u), 1: float(c), 2: float(x)}
+                for fid, u, c, x in zip(range(1, len(used) + 1), used, cw, xw)}
+    changes = timer('junction_update', weights)
+
+    def simulation():
+        scenario = SignalNetwork(graph, jnodes, res.usage.edge_counts).scenario(
+            res.routes, vehicles_per_hour=args.sim_vehicles, seed=args.seed)
+        return compare_modes(scenario, jdensity, args.threshold, ('AM Peak', 'Off-Peak'), CORRIDOR_SPLITS)
+    sim = timer('signal_simulation', simulation)
+    if has_qgis:
+        from geoscheduler_core.qgis_io import write_attribute_values
+        layer = junction_layer(jxy)
+        timer('junction_write_qgis', write_attribute_values, layer, changes)
+    else:
+        skipped['junction_write_qgis'] = 'qgis not importable'
+
+    if has_gdal:
+        from geoscheduler_core.gpkg import GpkgWriter, linestring_wkb, point_wkb, polygon_wkb
+
+        def export(folder):
+            path = os.path.join(folder, 'out.gpkg')
+            writer = GpkgWriter(path)
+            ptr = segments.vertex_ptr
+            writer.write_layer('corridors', 'LineString', [('routes', 'int')],
+                               ((s + 1, linestring_wkb(segments.x[ptr[s]:ptr[s + 1]], segments.y[ptr[s]:ptr[s + 1]]),
+                                 (int(segments.route_count[s]),))
+                                for s in range(len(segments.route_count))))
+            writer.write_layer('route_segments', None, [('route_id', 'int'), ('corridor_fid', 'int')],
+                               ((i, None, (int(r) + 1, int(s) + 1))
+                                for i, r, s in zip(range(1, len(segments.path) + 1),
+                                                   np.repeat(np.arange(len(res.routes)), np.diff(segments.path_ptr)),
+                                                   segments.path)))
+            rings = np.concatenate([cell_rings(lv.x, lv.y, lv.cell_size) for lv in levels])
+            routes = np.concatenate([lv.routes for lv in levels])
+            writer.write_layer('density', 'Polygon', [('routes', 'int')],
+                               ((i, wkb, (int(n),))
+                                for i, n, wkb in zip(range(1, len(rings) + 1), routes, polygon_wkb(rings))))
+            writer.write_layer('junctions', 'Point', [('UsedByComm', 'int')],
+                               ((fid, wkb, (attrs[0],))
+                                for (fid, attrs), wkb in zip(changes.items(), point_wkb(jxy[:, 0], jxy[:, 1]))))
+            writer.commit()
+        # only the write is timed; the folder goes away with every repeat
+        with tempfile.TemporaryDirectory(prefix='geosched_bench_') as folder:
+            timer('gpkg_export', export, folder)
+    else:
+        skipped['gpkg_export'] = 'osgeo not importable'
+
+    return {
+        'network': kind, 'scale': scale,
+        'nodes': graph.node_count, 'edges': graph.edge_count, 'junctions': len(jxy),
+        'zones_per_side': spec['zones'], 'representatives': [len(o_rep), len(d_rep)],
+        'routes': len(res.routes),
+        'simulated_passages': sim['AM Peak'].events,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--networks', nargs='+', choices=['grid', 'radial'], default=['grid', 'radial'])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest is kept')
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--adaptive', action='store_true', help='route with adaptive OD sampling')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sim-vehicles', type=int, default=20000, help='routed vehicles per hour simulated')
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args(argv)
+
+    app = optional_qgis()
+    has_gdal = optional_gdal()
+    results = []
+    for scale in args.scales:
+        for kind in args.networks:
+            timer, skipped = Timer(), {}
+            for _ in range(args.repeat):
+                case = run_case(kind, scale, args, timer, skipped, app is not None, has_gdal)
+            case['seconds'] = timer.stages
+            case['skipped'] = skipped
+            results.append(case)
+            stages = ', '.join(f'{k} {v:.3f}s' for k, v in timer.stages.items())
+            print(f'{kind:6s} {scale:6s} {case["nodes"]:7d} nodes {case["routes"]:5d} routes: {stages}')
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f'wrote {args.output}')
+    if app is not None:
+        app.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Synthetic inputs for the benchmarks: road networks, junctions and OD zones.
+
+Everything is generated from a seed in a projected, metre-like coordinate
+space, so runs are reproducible and need no data download.
+"""
+import numpy as np
+
+
+def grid_network(n, spacing=100.0):
+    """
+    n x n street grid. Returns (polylines, junction_xy): one polyline per
+    street as (feat_idx, parts) ready for RoadGraph.from_polylines, and the
+    street intersections as an (n * n, 2) array.
+    """
+    coords = np.arange(n) * spacing
+    lines = []
+    for c in coords:
+        lines.append([[(float(x), float(c)) for x in coords]])
+        lines.append([[(float(c), float(y)) for y in coords]])
+    gx, gy = np.meshgrid(coords, coords)
+    return list(enumerate(lines)), np.column_stack((gx.ravel(), gy.ravel()))
+
+
+def radial_network(rings, spokes, spacing=100.0):
+    """
+    Ring-and-spoke network around the origin: `spokes` radial roads crossing
+    `rings` ring roads. Returns (polylines, junction_xy) like grid_network.
+    """
+    radii = np.arange(1, rings + 1) * spacing
+    angles = np.linspace(0.0, 2 * np.pi, spokes, endpoint=False)
+    lines = []
+    for a in angles:
+        pts = [(0.0, 0.0)] + [(float(r * np.cos(a)), float(r * np.sin(a))) for r in radii]
+        lines.append([pts])
+    for r in radii:
+        ring = [(float(r * np.cos(a)), float(r * np.sin(a))) for a in angles]
+        lines.append([ring + ring[:1]])
+    jx = np.outer(radii, np.cos(angles)).ravel()
+    jy = np.outer(radii, np.sin(angles)).ravel()
+    junctions = np.vstack(([0.0, 0.0], np.column_stack((jx, jy))))
+    return list(enumerate(lines)), junctions
+
+
+def zones(count, extent, size, seed=0):
+    """
+    `count` irregular quadrilateral zones scattered over the extent
+    (xmin, ymin, xmax, ymax). Returns a (count, 5, 2) array of closed rings.
+    """
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = extent
+    centers = rng.uniform((xmin, ymin), (xmax, ymax), size=(count, 2))
+    # corners at jittered radii, counter-clockwise
+    angles = np.array([0.25, 0.75, 1.25, 1.75]) * np.pi
+    radii = size * rng.uniform(0.3, 0.7, size=(count, 4))
+    ring = np.empty((count, 5, 2))
+    ring[:, :4, 0] = centers[:, None, 0] + radii * np.cos(angles)
+    ring[:, :4, 1] = centers[:, None, 1] + radii * np.sin(angles)
+    ring[:, 4] = ring[:, 0]
+    return ring
+
+
+def ring_centroids(rings):
+    """Area centroids of closed rings, (n, k, 2) -> (n, 2), by the shoelace formula."""
+    x, y = rings[..., 0], rings[..., 1]
+    cross = x[:, :-1] * y[:, 1:] - x[:, 1:] * y[:, :-1]
+    area = cross.sum(axis=1) / 2.0
+    cx = ((x[:, :-1] + x[:, 1:]) * cross).sum(axis=1) / (6.0 * area)
+    cy = ((y[:, :-1] + y[:, 1:]) * cross).sum(axis=1) / (6.0 * area)
+    return np.column_stack((cx, cy))
+
+
+def network_extent(junction_xy):
+    xmin, ymin = junction_xy.min(axis=0)
+    xmax, ymax = junction_xy.max(axis=0)
+    return float(xmin), float(ymin), float(xmax), float(ymax)
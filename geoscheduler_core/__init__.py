@@ -0,0 +1,28 @@
+"""
+QGIS-independent engine shared by the GeoScheduler plugins.
+
+Copy this folder next to the plugin folders (the QGIS python/plugins directory
+is on sys.path, so the plugins import it as a top-level package).
+"""
+from .graph import RoadGraph, Route, RoutingCanceled, ShortestPathTree, route_many
+from .parallel import default_workers, route_many_costs, route_many_parallel
+from .usage import CorridorUsage, corridor_usage
+from .spatial import GridIndex, match_points
+from .cluster import KMeansResult, kmeans
+from .sampling import AdaptiveSampler, route_adaptive
+from .cache import RouteCache, network_fingerprint, route_many_cached
+from .weights import CORRIDOR_SPLITS, NS_EW_SPLITS, TIME_MODES, junction_weights
+from .pipeline import ODResult, density_at, representatives, route_od
+from .incremental import EdgeDiff, RouteIndex, diff_graphs, reroute_after_edit
+from .tiling import TileGrid, TiledResult, route_tiled
+from .results import ResultStore, store_path, write_results
+from .instrument import RunReport, current_rss, peak_rss, report_path
+from .simulation import Scenario, SignalNetwork, SimulationResult, compare_modes, junction_signal_weights, simulate
+from .live import FileFeed, LiveReweighter, SlidingWindow, UdpFeed, open_feed, parse_records
+from .hourly import (
+    DEFAULT_CONGESTION, DEFAULT_DEMAND, HOUR_MODES, HOURS, HourlyResult, edge_travel_times, hourly_speeds,
+    hourly_weights, load_speed_table, route_hourly
+)
+from .binning import DensityLevel, bin_counts, cell_rings, density_levels
+from .corridors import CorridorSegments, corridor_segments, listed_route_ids, route_nodes
+from .alternatives import ALTERNATIVES, MAX_DETOUR, ViaRouter, path_probabilities, route_alternatives
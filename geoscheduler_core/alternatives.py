@@ -0,0 +1,305 @@
+"""
+Alternative routes per OD pair, so a pair's demand spreads over near-equal
+parallel roads instead of piling onto its single shortest path.
+
+Via-node method on reused search trees: one tree grown from every origin and
+one from every destination (the graph is undirected, so a destination's tree
+is its backward tree). A via node v stands for the path origin -> v ->
+destination along the two trees, at cost d_o(v) + d_d(v), so all candidates
+of all pairs are read off |origins| + |destinations| searches instead of k
+searches per pair, whatever k is. Origin searches are the one-to-many
+searches of route_many; destination searches run past their farthest origin
+as far as the detour cap needs (RoadGraph.shortest_path_tree `stretch`).
+A via node still on the origin search frontier has a provisional distance,
+but its path is built from the same predecessors, so its cost is exact.
+
+The cost does not grow with k, but it is not small: a run takes about 2.6 to
+3.2 times as long as route_many_parallel on the same pairs, for k = 2 as for
+k = 5. The destination searches add about one k = 1 run (they are as many as
+the origin searches, and run longer), and scoring the reached nodes of every
+pair adds most of another. The destination trees are also held in memory, 16
+bytes per destination and node. The origin tree alone cannot stand in for
+them: it gives d_o(v) but not the cost or path from v on to the destination.
+
+Candidates are checked cheapest first; a path is kept when it
+  - costs at most (1 + max_detour) times the shortest path,
+  - has no loop,
+  - shares at most max_share of the shortest cost with the paths kept so far,
+  - has a plateau (the stretch around v where both trees agree, i.e. where
+    the path is locally shortest) of at least min_plateau of the shortest cost.
+Every via node on one plateau gives the same path, so a plateau is checked
+once. A pair's paths get logit probabilities exp(-theta * (cost / shortest - 1))
+normalised over the pair; corridor counts add them instead of 1 per pair.
+"""
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from .graph import Route, RoutingCanceled
+from .parallel import (
+    MIN_PARALLEL_ORIGINS, attach_arrays, default_workers, route_many_parallel, share_arrays, worker_graph,
+    worker_pool
+)
+
+
+# routes per pair, shortest included
+ALTERNATIVES = 3
+# cost cap of an alternative, as a fraction above the shortest path
+MAX_DETOUR = 0.25
+# length an alternative may share with the paths kept before it, as a fraction of the shortest path
+MAX_SHARE = 0.8
+# plateau an alternative needs, as a fraction of the shortest path; shorter ones only detour around a block
+MIN_PLATEAU = 0.1
+# logit scale: a path 10% longer than the shortest gets exp(-1) of its weight
+LOGIT_SCALE = 10.0
+# plateaus tried per pair before giving up on finding k routes
+MAX_VIA_CHECKS = 50
+
+# destination trees of the run a pool worker serves: (block name, block, router)
+_worker_router = (None, None, None)
+
+
+def destination_trees(graph, dest_nodes, origin_nodes, max_detour=MAX_DETOUR, progress=None, is_canceled=None):
+    """
+    (dist, pred_edge) arrays (destinations x nodes) of the trees grown from
+    every destination; `progress(done)` is called after each one.
+    """
+    dist = np.empty((len(dest_nodes), graph.node_count), dtype=np.float64)
+    pred = np.empty((len(dest_nodes), graph.node_count), dtype=np.int64)
+    for i, dnode in enumerate(dest_nodes):
+        if is_canceled and is_canceled():
+            raise RoutingCanceled()
+        dist[i], pred[i] = _tree_arrays(graph, dnode, origin_nodes, max_detour)
+        if progress:
+            progress(i + 1)
+    return dist, pred
+
+
+def _tree_arrays(graph, source, targets, stretch):
+    tree = graph.shortest_path_tree(int(source), targets=[int(t) for t in targets], stretch=stretch)
+    return np.asarray(tree.dist, dtype=np.float64), np.asarray(tree.pred_edge, dtype=np.int64)
+
+
+def path_probabilities(costs, theta=LOGIT_SCALE):
+    """Logit split of one pair's demand over paths of `costs`, shortest first."""
+    costs = np.asarray(costs, dtype=np.float64)
+    if len(costs) < 2 or costs[0] <= 0:
+        return np.full(len(costs), 1.0 / max(len(costs), 1))
+    w = np.exp(-theta * (costs / costs[0] - 1.0))
+    return w / w.sum()
+
+
+class ViaRouter:
+    """
+    Alternative routes from any origin to a fixed list of destinations, on
+    destination trees built once (see destination_trees).
+    """
+
+    def __init__(self, graph, dest_nodes, dest_dist, dest_pred, k=ALTERNATIVES, max_detour=MAX_DETOUR,
+                 max_share=MAX_SHARE, min_plateau=MIN_PLATEAU, theta=LOGIT_SCALE):
+        self.graph = graph
+        self.dest_nodes = [int(d) for d in dest_nodes]
+        self.dest_dist = dest_dist
+        self.dest_pred = dest_pred
+        self.k = k
+        self.max_detour = max_detour
+        self.max_share = max_share
+        self.min_plateau = min_plateau
+        self.theta = theta
+        # tree walks step through python lists, not array scalars
+        self.edge_u = graph.edge_u.tolist()
+        self.edge_v = graph.edge_v.tolist()
+        self.length = graph.edge_length
+
+    def _back_path(self, di, node):
+        # node -> destination along the destination tree
+        pred = self.dest_pred[di]
+        nodes, edges = [node], []
+        e = int(pred[node])
+        while e >= 0:
+            edges.append(e)
+            node = self.edge_u[e] if self.edge_v[e] == node else self.edge_v[e]
+            nodes.append(node)
+            e = int(pred[node])
+        return nodes, edges
+
+    def via_paths(self, tree, dist, pred_node, pred_edge, reach, di, nodes, edges, best):
+        """Up to k - 1 admissible (nodes, edges, cost) via paths for one pair, cheapest first."""
+        dd, pd = self.dest_dist[di], self.dest_pred[di]
+        total = dist[reach] + dd[reach]
+        within = total <= best * (1.0 + self.max_detour)
+        cand, total = reach[within], total[within]
+        # plateau edges: the origin tree reaches x over the edge the destination tree leaves its parent by
+        pe, pn = pred_edge[cand], pred_node[cand]
+        on = pe >= 0
+        on[on] = pd[pn[on]] == pe[on]
+        if not on.any():
+            return []
+        cand, total, pe = cand[on], total[on], pe[on]
+        # nodes of one plateau share d_o + d_d: one candidate per plateau, by its summed length
+        tol = 1e-9 * best
+        keys, first, inverse = np.unique(np.round(total / tol), return_index=True, return_inverse=True)
+        plateau = np.bincount(inverse.ravel(), weights=self.length[pe], minlength=len(keys))
+        ok = first[plateau >= self.min_plateau * best]
+        cand, total = cand[ok], total[ok]
+
+        covered = set(nodes)
+        kept_edges = set(edges)
+        found = []
+        for v, t in zip(cand.tolist()[:MAX_VIA_CHECKS], total.tolist()):
+            if v in covered:
+                continue
+            head_nodes, head_edges = tree.path(v)
+            tail_nodes, tail_edges = self._back_path(di, v)
+            path_nodes = head_nodes + tail_nodes[1:]
+            path_edges = head_edges + tail_edges
+            # the plateau around v on the built path; equal d_o + d_d across plateaus only merged keys above
+            flat = (dist[path_nodes] + dd[path_nodes]) >= t - tol
+            lo = hi = len(head_nodes) - 1
+            while lo > 0 and flat[lo - 1]:
+                lo -= 1
+            while hi < len(path_nodes) - 1 and flat[hi + 1]:
+                hi += 1
+            covered.update(path_nodes[lo:hi + 1])
+            if len(set(path_nodes)) != len(path_nodes):
+                continue
+            if self.length[path_edges[lo:hi]].sum() < self.min_plateau * best:
+                continue
+            shared = [e for e in path_edges if e in kept_edges]
+            if shared and self.length[shared].sum() > self.max_share * best:
+                continue
+            found.append((path_nodes, path_edges, t))
+            kept_edges.update(path_edges)
+            if len(found) >= self.k - 1:
+                break
+        return found
+
+    def origin(self, oi, onode):
+        """(routes, probabilities) from origin `oi` to every destination; a pair's routes are shortest first."""
+        tree = self.graph.shortest_path_tree(int(onode), targets=self.dest_nodes)
+        dist = np.asarray(tree.dist, dtype=np.float64)
+        pred_node = np.asarray(tree.pred_node, dtype=np.int64)
+        pred_edge = np.asarray(tree.pred_edge, dtype=np.int64)
+        reach = np.flatnonzero(dist < np.inf)
+        routes, probs = [], []
+        for di, dnode in enumerate(self.dest_nodes):
+            res = tree.path(dnode)
+            if res is None:
+                continue
+            nodes, edges = res
+            best = tree.dist[dnode]
+            found = [(nodes, edges, best)]
+            if self.k > 1 and best > 0:
+                found.extend(self.via_paths(tree, dist, pred_node, pred_edge, reach, di, nodes, edges, best))
+            probs.extend(path_probabilities([c for _, _, c in found], self.theta).tolist())
+            routes.extend(Route(oi, di, n, e, c) for n, e, c in found)
+        return routes, probs
+
+
+def _tree_chunk(dests, origin_nodes, stretch):
+    graph = worker_graph()
+    return [(di,) + _tree_arrays(graph, dnode, origin_nodes, stretch) for di, dnode in dests]
+
+
+def _origin_chunk(origins, dest_nodes, shm_name, spec, settings):
+    global _worker_router
+    if _worker_router[0] != shm_name:
+        # the block stays attached for as long as this worker serves the run
+        shm, trees = attach_arrays(shm_name, spec)
+        _worker_router = (shm_name, shm, ViaRouter(worker_graph(), dest_nodes, trees['dist'], trees['pred'],
+                                                   **settings))
+    router = _worker_router[2]
+    return [(oi,) + router.origin(oi, onode) for oi, onode in origins]
+
+
+def route_alternatives(graph, origin_nodes, dest_nodes, k=ALTERNATIVES, max_detour=MAX_DETOUR,
+                       max_share=MAX_SHARE, min_plateau=MIN_PLATEAU, theta=LOGIT_SCALE, workers=None,
+                       progress=None, is_canceled=None):
+    """
+    Up to `k` routes per origin / destination pair and their probabilities
+    (summing to 1 per pair). Routes come ordered by origin, destination and
+    cost; unreachable pairs are left out. `progress(done, total)` counts
+    searches: one per destination, then one per origin. With k 1 this is
+    route_many_parallel with probability 1 everywhere; any k above 1 costs
+    about three times as much (see the module docstring).
+    """
+    if k <= 1:
+        routes = route_many_parallel(graph, origin_nodes, dest_nodes, workers=workers,
+                                     progress=progress, is_canceled=is_canceled)
+        return routes, np.ones(len(routes))
+    settings = dict(k=k, max_detour=max_detour, max_share=max_share, min_plateau=min_plateau, theta=theta)
+    dest_nodes = [int(d) for d in dest_nodes]
+    origins = [(oi, int(o)) for oi, o in enumerate(origin_nodes)]
+    total = len(dest_nodes) + len(origins)
+    workers = default_workers() if workers is None else int(workers)
+    if workers <= 1 or len(origins) < MIN_PARALLEL_ORIGINS:
+        by_origin = _alternatives_serial(graph, origins, dest_nodes, settings, total, progress, is_canceled)
+    else:
+        by_origin = _alternatives_pool(graph, origins, dest_nodes, settings, workers, total, progress,
+                                       is_canceled)
+    routes, probs = [], []
+    for oi in sorted(by_origin):
+        routes.extend(by_origin[oi][0])
+        probs.extend(by_origin[oi][1])
+    return routes, np.asarray(probs, dtype=np.float64)
+
+
+def _alternatives_serial(graph, origins, dest_nodes, settings, total, progress, is_canceled):
+    def tick(done):
+        if progress:
+            progress(done, total)
+    dist, pred = destination_trees(graph, dest_nodes, [o for _, o in origins], settings['max_detour'],
+                                   progress=tick, is_canceled=is_canceled)
+    router = ViaRouter(graph, dest_nodes, dist, pred, **settings)
+    by_origin = {}
+    for done, (oi, onode) in enumerate(origins, len(dest_nodes) + 1):
+        if is_canceled and is_canceled():
+            raise RoutingCanceled()
+        by_origin[oi] = router.origin(oi, onode)
+        tick(done)
+    return by_origin
+
+
+def _completed(pool, futures, is_canceled):
+    for fut in as_completed(futures):
+        if is_canceled and is_canceled():
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise RoutingCanceled()
+        yield fut.result()
+
+
+def _alternatives_pool(graph, origins, dest_nodes, settings, workers, total, progress, is_canceled):
+    workers = min(workers, max(len(origins), len(dest_nodes)))
+    onodes = [o for _, o in origins]
+    dist = np.empty((len(dest_nodes), graph.node_count), dtype=np.float64)
+    pred = np.empty((len(dest_nodes), graph.node_count), dtype=np.int64)
+    by_origin = {}
+    done = 0
+    with worker_pool(graph, workers) as pool:
+        # destination trees first, then copied into one block the origin chunks attach to
+        dests = list(enumerate(dest_nodes))
+        nchunks = min(len(dests), workers * 4)
+        futures = [pool.submit(_tree_chunk, dests[i::nchunks], onodes, settings['max_detour'])
+                   for i in range(nchunks)]
+        for part in _completed(pool, futures, is_canceled):
+            for di, d, p in part:
+                dist[di], pred[di] = d, p
+            done += len(part)
+            if progress:
+                progress(done, total)
+        shm, spec = share_arrays({'dist': dist, 'pred': pred})
+        del dist, pred
+        try:
+            nchunks = min(len(origins), workers * 4)
+            futures = [pool.submit(_origin_chunk, origins[i::nchunks], dest_nodes, shm.name, spec, settings)
+                       for i in range(nchunks)]
+            for part in _completed(pool, futures, is_canceled):
+                for oi, routes, probs in part:
+                    by_origin[oi] = (routes, probs)
+                done += len(part)
+                if progress:
+                    progress(done, total)
+        finally:
+            shm.close()
+            shm.unlink()
+    return by_origin
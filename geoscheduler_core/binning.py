@@ -0,0 +1,134 @@
+"""
+Corridor density binned into hexagon or square cells at several resolutions.
+
+Node route counts are dropped into cells in one vectorised pass per level:
+cell indexes come from coordinate arithmetic, and counts are merged with
+np.unique and bincount. Only non-empty cells are returned. Each level is
+LEVEL_FACTOR times coarser than the one below and carries a map scale range
+in which its cells are drawn about CELL_MM wide, so a renderer can switch
+levels as the map zooms.
+
+`cell_size` is the distance between neighbouring cell centres: the edge of
+a square, or the width across flats of a (pointy-top) hexagon.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+
+SHAPES = ('hex', 'square')
+LEVELS = 4
+LEVEL_FACTOR = 3
+# cells across the routed area at the finest level when no size is given
+CELLS_ACROSS = 400
+# on-screen width of a cell (mm) at which the next coarser level takes over
+CELL_MM = 3.0
+
+_SQRT3 = np.sqrt(3.0)
+
+DensityLevel = namedtuple('DensityLevel', [
+    'level', 'cell_size', 'x', 'y', 'routes', 'volume', 'density', 'from_scale', 'to_scale'])
+
+
+def hex_cells(xs, ys, cell_size):
+    """Axial (q, r) indexes of the hexagons containing each point."""
+    radius = cell_size / _SQRT3
+    qf = (_SQRT3 / 3.0 * xs - ys / 3.0) / radius
+    rf = (2.0 / 3.0 * ys) / radius
+    sf = -qf - rf
+    q, r, s = np.rint(qf), np.rint(rf), np.rint(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    # cube rounding: fix the component with the largest rounding error
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def hex_centres(q, r, cell_size):
+    radius = cell_size / _SQRT3
+    return radius * _SQRT3 * (q + r / 2.0), radius * 1.5 * r
+
+
+def square_cells(xs, ys, cell_size):
+    return np.floor(xs / cell_size).astype(np.int64), np.floor(ys / cell_size).astype(np.int64)
+
+
+def square_centres(i, j, cell_size):
+    return (i + 0.5) * cell_size, (j + 0.5) * cell_size
+
+
+def cell_rings(x, y, cell_size, shape='hex'):
+    """(cells, vertices + 1, 2) closed outer rings around cell centres."""
+    if shape == 'hex':
+        angles = np.radians(30.0 + 60.0 * np.arange(7))
+        radius = cell_size / _SQRT3
+        dx, dy = radius * np.cos(angles), radius * np.sin(angles)
+    else:
+        half = cell_size / 2.0
+        dx = np.array([-half, half, half, -half, -half])
+        dy = np.array([-half, -half, half, half, -half])
+    return np.stack((x[:, None] + dx, y[:, None] + dy), axis=-1)
+
+
+def bin_counts(xs, ys, counts, cell_size, shape='hex'):
+    """
+    (x, y, routes, volume) per non-empty cell: cell centre, routes through
+    the busiest node in the cell and the sum of node counts. Integer counts
+    give integer results; fractional ones (expected routes) stay fractional.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f'Unknown cell shape {shape!r}, expected one of {SHAPES}')
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    counts = np.asarray(counts)
+    dtype = np.float64 if counts.dtype.kind == 'f' else np.int64
+    if not len(xs):
+        empty = np.zeros(0)
+        return empty, empty, np.zeros(0, dtype=dtype), np.zeros(0, dtype=dtype)
+    a, b = (hex_cells if shape == 'hex' else square_cells)(xs, ys, cell_size)
+    span = int(b.max() - b.min()) + 1
+    keys, inverse = np.unique((a - a.min()) * span + (b - b.min()), return_inverse=True)
+    inverse = inverse.ravel()
+    ca, cb = keys // span + a.min(), keys % span + b.min()
+    x, y = (hex_centres if shape == 'hex' else square_centres)(ca, cb, cell_size)
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(np.bincount(inverse))[:-1]))
+    routes = np.maximum.reduceat(counts[order], starts).astype(dtype)
+    volume = np.bincount(inverse, weights=counts, minlength=len(keys))
+    if dtype is np.int64:
+        volume = volume.round().astype(np.int64)
+    return x, y, routes, volume
+
+
+def default_cell_size(xs, ys, cells_across=CELLS_ACROSS):
+    """Finest cell size for points spread over (xs, ys)."""
+    if not len(xs):
+        return 1.0
+    span = max(np.ptp(xs), np.ptp(ys))
+    return span / cells_across if span > 0 else 1.0
+
+
+def density_levels(xs, ys, counts, cell_size=0.0, shape='hex', levels=LEVELS, factor=LEVEL_FACTOR,
+                   metres_per_unit=1.0):
+    """
+    DensityLevel per resolution, finest first, for node coordinates and
+    route counts. `cell_size` 0 picks one from the extent. Density is routes
+    over the busiest cell of the level. A level is drawn while the map
+    scale denominator lies in [from_scale, to_scale); 0 means no limit, so
+    the finest level stays on when zooming in and the coarsest when
+    zooming out.
+    """
+    size = cell_size or default_cell_size(xs, ys)
+    out = []
+    for level in range(levels):
+        x, y, routes, volume = bin_counts(xs, ys, counts, size, shape)
+        peak = routes.max() if len(routes) and routes.max() > 0 else 1
+        # scale at which a cell of this level is CELL_MM wide on screen
+        upper = size * metres_per_unit * 1000.0 / CELL_MM
+        lower = out[-1].to_scale if out else 0.0
+        out.append(DensityLevel(level, size, x, y, routes, volume, routes / float(peak), lower,
+                                0.0 if level == levels - 1 else upper))
+        size *= factor
+    return out
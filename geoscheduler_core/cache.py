@@ -0,0 +1,140 @@
+"""
+Persistent route cache in a small SQLite file.
+
+Routes are keyed by a fingerprint of the road graph and the snapped origin /
+destination node ids and stored as packed int32 edge-id sequences. Pairs that
+had no route are cached too. The table is bounded: after each run the least
+recently used rows beyond `max_entries` are evicted.
+"""
+import hashlib
+import sqlite3
+import time
+
+import numpy as np
+
+from .graph import Route, RoutingCanceled
+from .parallel import route_many_parallel
+
+
+DEFAULT_MAX_ENTRIES = 500000
+
+
+def network_fingerprint(graph):
+    h = hashlib.sha1()
+    for arr in (graph.node_x, graph.node_y, graph.edge_u, graph.edge_v, graph.edge_length):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    return h.hexdigest()
+
+
+def path_nodes(graph, origin, edges):
+    """Node sequence of a route given its start node and edge ids."""
+    nodes = [int(origin)]
+    node = int(origin)
+    for e in edges:
+        u = int(graph.edge_u[e])
+        node = int(graph.edge_v[e]) if u == node else u
+        nodes.append(node)
+    return nodes
+
+
+class RouteCache:
+    MISSING = object()
+
+    def __init__(self, path, graph, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.graph = graph
+        self.fingerprint = network_fingerprint(graph)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._touched = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS routes ('
+            ' fingerprint TEXT NOT NULL, origin INTEGER NOT NULL, dest INTEGER NOT NULL,'
+            ' cost REAL, edges BLOB, last_used REAL NOT NULL,'
+            ' UNIQUE (fingerprint, origin, dest))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS routes_last_used ON routes (last_used)')
+
+    def get(self, onode, dnode):
+        """(nodes, edges, cost), None for a cached 'no route', or RouteCache.MISSING."""
+        row = self.conn.execute(
+            'SELECT rowid, cost, edges FROM routes WHERE fingerprint=? AND origin=? AND dest=?',
+            (self.fingerprint, int(onode), int(dnode))).fetchone()
+        if row is None:
+            self.misses += 1
+            return self.MISSING
+        self.hits += 1
+        self._touched.append(row[0])
+        if row[2] is None:
+            return None
+        edges = np.frombuffer(row[2], dtype=np.int32).tolist()
+        return path_nodes(self.graph, onode, edges), edges, row[1]
+
+    def put(self, onode, dnode, edges, cost):
+        blob = None if edges is None else np.asarray(edges, dtype=np.int32).tobytes()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO routes (fingerprint, origin, dest, cost, edges, last_used)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (self.fingerprint, int(onode), int(dnode), cost, blob, time.time()))
+
+    def close(self):
+        now = time.time()
+        self.conn.executemany('UPDATE routes SET last_used=? WHERE rowid=?',
+                              [(now, rid) for rid in self._touched])
+        count = self.conn.execute('SELECT COUNT(*) FROM routes').fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                'DELETE FROM routes WHERE rowid IN '
+                '(SELECT rowid FROM routes ORDER BY last_used LIMIT ?)',
+                (count - self.max_entries,))
+        self.conn.commit()
+        self.conn.close()
+
+    def summary(self):
+        return f'route cache: {self.hits} hits, {self.misses} misses'
+
+
+def route_many_cached(graph, origin_nodes, dest_nodes, cache, workers=None, progress=None,
+                      is_canceled=None):
+    """
+    route_many_parallel with a RouteCache in front: pairs found in the cache are
+    served from it and only origins with at least one miss are routed.
+    """
+    routes = []
+    missing_origins = []
+    for oi, onode in enumerate(origin_nodes):
+        missed = False
+        for di, dnode in enumerate(dest_nodes):
+            hit = cache.get(onode, dnode)
+            if hit is RouteCache.MISSING:
+                missed = True
+            elif hit is not None:
+                routes.append(Route(oi, di, hit[0], hit[1], hit[2]))
+        if missed:
+            missing_origins.append(oi)
+
+    if missing_origins:
+        sub = [origin_nodes[oi] for oi in missing_origins]
+        fresh = route_many_parallel(graph, sub, dest_nodes, workers=workers, progress=progress,
+                                    is_canceled=is_canceled)
+        found = set()
+        # drop the pairs of these origins served from the cache and take the fresh routes
+        keep = set(missing_origins)
+        routes = [r for r in routes if r.origin not in keep]
+        for r in fresh:
+            oi = missing_origins[r.origin]
+            routes.append(r._replace(origin=oi))
+            found.add((oi, r.dest))
+            cache.put(origin_nodes[oi], dest_nodes[r.dest], r.edges, r.cost)
+        for oi in missing_origins:
+            for di, dnode in enumerate(dest_nodes):
+                if (oi, di) not in found:
+                    cache.put(origin_nodes[oi], dnode, None, None)
+    elif progress:
+        total = len(origin_nodes) * len(dest_nodes)
+        progress(total, total)
+    if is_canceled and is_canceled():
+        raise RoutingCanceled()
+    routes.sort(key=lambda r: (r.origin, r.dest))
+    return routes
@@ -0,0 +1,138 @@
+"""
+Vectorised k-means used to pick representative origin/destination points.
+
+Seeding is k-means++ from a NumPy Generator, so a fixed seed always returns
+the same representatives. Large inputs switch to mini-batch updates and the
+final assignment is done in chunks to keep the n x k distance matrix small.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+
+KMeansResult = namedtuple('KMeansResult', ['centers', 'labels', 'counts', 'iterations'])
+
+# above this many points mini-batch updates replace full Lloyd iterations
+MINIBATCH_THRESHOLD = 50000
+DEFAULT_BATCH_SIZE = 4096
+# rows per chunk when computing point-to-center distances
+CHUNK = 65536
+
+
+def _sq_dist_to_centers(xy, centers):
+    """Squared distance of every point to every center, (n, k)."""
+    xx = np.einsum('ij,ij->i', xy, xy)[:, None]
+    cc = np.einsum('ij,ij->i', centers, centers)[None, :]
+    d2 = xx - 2.0 * xy @ centers.T + cc
+    return np.maximum(d2, 0.0, out=d2)
+
+
+def assign(xy, centers):
+    """(labels, squared distance to the chosen center) computed in chunks."""
+    n = len(xy)
+    labels = np.empty(n, dtype=np.int64)
+    best = np.empty(n, dtype=np.float64)
+    for start in range(0, n, CHUNK):
+        d2 = _sq_dist_to_centers(xy[start:start + CHUNK], centers)
+        lab = d2.argmin(axis=1)
+        labels[start:start + CHUNK] = lab
+        best[start:start + CHUNK] = d2[np.arange(len(lab)), lab]
+    return labels, best
+
+
+def kmeans_plus_plus(xy, k, rng, weights=None):
+    n = len(xy)
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    centers = np.empty((k, 2), dtype=np.float64)
+    first = rng.choice(n, p=w / w.sum())
+    centers[0] = xy[first]
+    closest = ((xy - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        p = closest * w
+        total = p.sum()
+        idx = rng.choice(n, p=p / total) if total > 0 else rng.integers(n)
+        centers[i] = xy[idx]
+        closest = np.minimum(closest, ((xy - centers[i]) ** 2).sum(axis=1))
+    return centers
+
+
+def kmeans(xy, k, seed=None, max_iter=100, tol=1e-4, batch_size=None, weights=None):
+    """
+    Cluster an (n, 2) array into k groups. `tol` is relative to the data
+    variance: iteration stops once no center moves further than that.
+    `batch_size` forces mini-batch mode; by default it is used above
+    MINIBATCH_THRESHOLD points. Returns a KMeansResult.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    n = len(xy)
+    if n <= k:
+        return KMeansResult(xy.copy(), np.arange(n), np.ones(n, dtype=np.int64), 0)
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    if batch_size is None and n > MINIBATCH_THRESHOLD:
+        batch_size = DEFAULT_BATCH_SIZE
+    shift_tol = tol * float(xy.var(axis=0).mean())
+
+    sample = xy
+    sample_w = w
+    if batch_size:
+        # seeding on a sample keeps k-means++ O(sample * k)
+        pick = rng.choice(n, size=min(n, max(batch_size, 10 * k)), replace=False)
+        sample, sample_w = xy[pick], w[pick]
+    centers = kmeans_plus_plus(sample, k, rng, sample_w)
+
+    if batch_size:
+        centers, it = _minibatch(xy, w, centers, rng, batch_size, max_iter, shift_tol)
+    else:
+        centers, it = _lloyd(xy, w, centers, max_iter, shift_tol)
+
+    labels, _ = assign(xy, centers)
+    counts = np.bincount(labels, minlength=k)
+    return KMeansResult(centers, labels, counts, it)
+
+
+def _lloyd(xy, w, centers, max_iter, shift_tol):
+    k = len(centers)
+    it = 0
+    for it in range(1, max_iter + 1):
+        labels, d2 = assign(xy, centers)
+        mass = np.bincount(labels, weights=w, minlength=k)
+        new = np.column_stack([np.bincount(labels, weights=w * xy[:, 0], minlength=k),
+                               np.bincount(labels, weights=w * xy[:, 1], minlength=k)])
+        empty = mass == 0
+        new[~empty] /= mass[~empty, None]
+        if empty.any():
+            # restart empty clusters on the points worst served so far
+            far = np.argsort(d2)[::-1][:int(empty.sum())]
+            new[empty] = xy[far]
+        shift = ((new - centers) ** 2).sum(axis=1).max()
+        centers = new
+        if shift <= shift_tol:
+            break
+    return centers, it
+
+
+def _minibatch(xy, w, centers, rng, batch_size, max_iter, shift_tol):
+    k = len(centers)
+    seen = np.zeros(k)
+    it = 0
+    n = len(xy)
+    for it in range(1, max_iter + 1):
+        idx = rng.choice(n, size=min(batch_size, n), replace=False)
+        batch, bw = xy[idx], w[idx]
+        labels, _ = assign(batch, centers)
+        mass = np.bincount(labels, weights=bw, minlength=k)
+        sums = np.column_stack([np.bincount(labels, weights=bw * batch[:, 0], minlength=k),
+                                np.bincount(labels, weights=bw * batch[:, 1], minlength=k)])
+        hit = mass > 0
+        seen[hit] += mass[hit]
+        # per-center learning rate decays with the mass it has absorbed
+        rate = np.zeros(k)
+        rate[hit] = mass[hit] / seen[hit]
+        new = centers.copy()
+        new[hit] = (1 - rate[hit, None]) * centers[hit] + rate[hit, None] * (sums[hit] / mass[hit, None])
+        shift = ((new - centers) ** 2).sum(axis=1).max()
+        centers = new
+        if shift <= shift_tol:
+            break
+    return centers, it
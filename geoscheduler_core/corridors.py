@@ -0,0 +1,125 @@
+"""
+Corridor segments: routed road geometry written once, however many routes
+share it.
+
+Routes are edge-id sequences on the graph. A corridor segment is a maximal
+run of consecutive edges of one road feature that carry exactly the same
+routes. Edges of a feature part are numbered in vertex order by
+RoadGraph.from_polylines, so runs are found with vectorised comparisons of
+neighbouring edge ids, endpoints, features and route sets; route sets are
+compared through two 64-bit hashes summed and xor-ed per edge. Every route
+covers a whole segment or none of it, so a route is stored as the short
+list of segments it passes (route_segments), not as its own geometry.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+
+# route ids listed per segment in text outputs; route_segments has them all
+MAX_LISTED_ROUTES = 500
+
+CorridorSegments = namedtuple('CorridorSegments', [
+    'feature', 'route_count', 'flow', 'rank', 'vertex_ptr', 'x', 'y', 'nodes',
+    'route_ptr', 'routes', 'path_ptr', 'path', 'route_start'])
+CorridorSegments.__doc__ = """
+Segment arrays of a routed run, in CSR form where a segment or route has
+several entries:
+  feature, route_count, flow   per segment; flow is the summed route weight
+  rank                         per segment; rank 1 is the segment with the most flow
+  vertex_ptr, x, y, nodes      vertices of segment s at vertex_ptr[s]:vertex_ptr[s + 1]
+  route_ptr, routes            indexes (into the routes list) of the routes using each segment
+  path_ptr, path               segments of each route in travel order
+  route_start                  first node of each route
+"""
+
+
+def _mix(values, salt):
+    # splitmix64 finaliser: spreads route indexes over 64 bits
+    with np.errstate(over='ignore'):
+        z = values.astype(np.uint64) + np.uint64(salt)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def corridor_segments(graph, routes, weights=None):
+    """
+    CorridorSegments for a list of Route on `graph`. `weights` (one per
+    route, e.g. path probabilities) make up the flow; by default every route
+    counts 1.
+    """
+    lengths = np.array([len(r.edges) for r in routes], dtype=np.int64)
+    edges = (np.concatenate([np.asarray(r.edges, dtype=np.int64) for r in routes])
+             if len(routes) else np.zeros(0, dtype=np.int64))
+    owner = np.repeat(np.arange(len(routes), dtype=np.int64), lengths)
+
+    # (edge, route) pairs grouped by edge, routes ascending within an edge
+    order = np.argsort(edges, kind='stable')
+    by_edge, by_route = edges[order], owner[order]
+    used, first, count = np.unique(by_edge, return_index=True, return_counts=True)
+    if len(used):
+        with np.errstate(over='ignore'):
+            sig_a = np.add.reduceat(_mix(by_route, 0x9E3779B97F4A7C15), first)
+        sig_b = np.bitwise_xor.reduceat(_mix(by_route, 0x632BE59BD9B4E019), first)
+    else:
+        sig_a = sig_b = np.zeros(0, dtype=np.uint64)
+
+    # a new segment starts wherever the next used edge does not continue the last one
+    u, v = graph.edge_u[used], graph.edge_v[used]
+    feat = graph.edge_feature[used]
+    cont = ((used[1:] == used[:-1] + 1) & (u[1:] == v[:-1]) & (feat[1:] == feat[:-1])
+            & (sig_a[1:] == sig_a[:-1]) & (sig_b[1:] == sig_b[:-1]) & (count[1:] == count[:-1]))
+    breaks = np.r_[True, ~cont] if len(used) else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(breaks)
+    nseg = len(starts)
+    edge_segment = np.full(graph.edge_count, -1, dtype=np.int64)
+    edge_segment[used] = np.cumsum(breaks) - 1
+
+    # vertices: the start node of each segment's first edge, then every edge's end node
+    nodes = np.insert(v, starts, u[starts]) if nseg else np.zeros(0, dtype=np.int64)
+    vertex_ptr = np.zeros(nseg + 1, dtype=np.int64)
+    np.cumsum(np.diff(np.r_[starts, len(used)]) + 1, out=vertex_ptr[1:])
+
+    route_count = count[starts]
+    if weights is None:
+        flow = route_count.astype(np.float64)
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+        flow = (np.add.reduceat(weights[by_route], first)[breaks] if len(used)
+                else np.zeros(0, dtype=np.float64))
+    # competition ranking: 1 + segments with more flow
+    rank = 1 + np.searchsorted(np.sort(-flow), -flow, side='left')
+
+    # routes of a segment are the routes of its first edge
+    route_ptr = np.zeros(nseg + 1, dtype=np.int64)
+    np.cumsum(route_count, out=route_ptr[1:])
+    seg_routes = by_route[np.repeat(breaks, count)]
+
+    # each route's edges mapped to segments, repeats along a segment dropped
+    seg_of = edge_segment[edges]
+    keep = np.r_[True, (seg_of[1:] != seg_of[:-1]) | (owner[1:] != owner[:-1])] if len(edges) else np.zeros(0, dtype=bool)
+    path = seg_of[keep]
+    path_ptr = np.zeros(len(routes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner[keep], minlength=len(routes)), out=path_ptr[1:])
+
+    return CorridorSegments(feat[starts], route_count, flow, rank, vertex_ptr, graph.node_x[nodes], graph.node_y[nodes],
+                            nodes, route_ptr, seg_routes, path_ptr, path,
+                            np.array([r.nodes[0] for r in routes], dtype=np.int64))
+
+
+def route_nodes(segments, route):
+    """Node sequence of route index `route`, rebuilt from its segments."""
+    out = [int(segments.route_start[route])]
+    for s in segments.path[segments.path_ptr[route]:segments.path_ptr[route + 1]]:
+        part = segments.nodes[segments.vertex_ptr[s]:segments.vertex_ptr[s + 1]]
+        # segments run in road digitising order, routes in either direction
+        out.extend((part if part[0] == out[-1] else part[::-1])[1:].tolist())
+    return np.asarray(out, dtype=np.int64)
+
+
+def listed_route_ids(segments, segment, limit=MAX_LISTED_ROUTES):
+    """Route ids (route index + 1) of a segment as 'id,id,...'; cut short with '...' after `limit`."""
+    routes = segments.routes[segments.route_ptr[segment]:segments.route_ptr[segment + 1]]
+    text = ','.join(str(r + 1) for r in routes[:limit].tolist())
+    return text + ',...' if len(routes) > limit else text
@@ -0,0 +1,130 @@
+"""
+Streaming GeoPackage writer on top of OGR (GDAL ships with QGIS).
+
+All layers of a run go into one GeoPackage inside a single transaction.
+Features are built straight from NumPy arrays as WKB, so nothing is staged in
+QGIS memory layers first, and the R-tree spatial indexes are created once
+after the commit instead of being updated row by row.
+"""
+import os
+
+import numpy as np
+from osgeo import ogr, osr
+
+
+# None makes an attribute-only table
+GEOMETRY_TYPES = {'Point': ogr.wkbPoint, 'LineString': ogr.wkbLineString, 'Polygon': ogr.wkbPolygon,
+                  None: ogr.wkbNone}
+FIELD_TYPES = {'int': ogr.OFTInteger, 'int64': ogr.OFTInteger64, 'double': ogr.OFTReal, 'str': ogr.OFTString}
+GEOMETRY_COLUMN = 'geom'
+
+_WKB_POINT = np.dtype([('order', 'u1'), ('type', '<u4'), ('x', '<f8'), ('y', '<f8')])
+_WKB_LINE_HEADER = np.dtype([('order', 'u1'), ('type', '<u4'), ('count', '<u4')])
+_WKB_POLYGON_HEADER = np.dtype([('order', 'u1'), ('type', '<u4'), ('rings', '<u4'), ('count', '<u4')])
+
+
+def point_wkb(xs, ys):
+    """Little-endian WKB points for coordinate arrays, one bytes object each."""
+    rec = np.empty(len(xs), dtype=_WKB_POINT)
+    rec['order'], rec['type'], rec['x'], rec['y'] = 1, 1, xs, ys
+    raw = rec.tobytes()
+    size = _WKB_POINT.itemsize
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def linestring_wkb(xs, ys):
+    """Little-endian WKB linestring through the given coordinates."""
+    head = np.array([(1, 2, len(xs))], dtype=_WKB_LINE_HEADER)
+    coords = np.column_stack((np.asarray(xs, dtype='<f8'), np.asarray(ys, dtype='<f8')))
+    return head.tobytes() + coords.tobytes()
+
+
+def polygon_wkb(rings):
+    """Little-endian WKB polygons from an (n, vertices, 2) array of closed rings, one bytes object each."""
+    rings = np.asarray(rings, dtype='<f8')
+    n, k = rings.shape[:2]
+    rec = np.empty(n, dtype=np.dtype(_WKB_POLYGON_HEADER.descr + [('coords', '<f8', (k, 2))]))
+    rec['order'], rec['type'], rec['rings'], rec['count'], rec['coords'] = 1, 3, 1, k, rings
+    raw = rec.tobytes()
+    size = rec.dtype.itemsize
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class GpkgWriter:
+    """
+    Writes layers into `path` (created if missing, other layers kept) within
+    one transaction. Layers of the same name are replaced. Call commit() to
+    keep the result or rollback() to leave the file as it was.
+    """
+
+    def __init__(self, path, crs_wkt=''):
+        driver = ogr.GetDriverByName('GPKG')
+        self.path = path
+        self.ds = driver.Open(path, 1) if os.path.exists(path) else driver.CreateDataSource(path)
+        if self.ds is None:
+            raise RuntimeError(f'Cannot open {path} for writing')
+        self.srs = None
+        if crs_wkt:
+            self.srs = osr.SpatialReference()
+            self.srs.ImportFromWkt(crs_wkt)
+            self.srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        # layers that get a spatial index on commit
+        self.written = []
+        if self.ds.StartTransaction(force=True) != ogr.OGRERR_NONE:
+            raise RuntimeError(f'Cannot start a transaction on {path}')
+
+    def delete_layer(self, name):
+        """Drop layer `name` if the file has one; returns whether it existed."""
+        for i in range(self.ds.GetLayerCount()):
+            if self.ds.GetLayer(i).GetName() == name:
+                self.ds.DeleteLayer(i)
+                return True
+        return False
+
+    def write_layer(self, name, geometry_type, fields, rows, is_canceled=None):
+        """
+        Create layer `name` and stream `rows` into it. `fields` is a list of
+        (name, 'int' | 'int64' | 'double' | 'str'); every row is (fid, wkb,
+        values), with wkb None for an attribute-only table (geometry_type
+        None). Returns the number of features written.
+        """
+        self.delete_layer(name)
+        if geometry_type is None:
+            layer = self.ds.CreateLayer(name, None, ogr.wkbNone)
+        else:
+            layer = self.ds.CreateLayer(name, self.srs, GEOMETRY_TYPES[geometry_type],
+                                        ['SPATIAL_INDEX=NO', f'GEOMETRY_NAME={GEOMETRY_COLUMN}'])
+        if layer is None:
+            raise RuntimeError(f'Cannot create layer {name} in {self.path}')
+        for fname, ftype in fields:
+            layer.CreateField(ogr.FieldDefn(fname, FIELD_TYPES[ftype]))
+        defn = layer.GetLayerDefn()
+        count = 0
+        for fid, wkb, values in rows:
+            if is_canceled and count % 10000 == 0 and is_canceled():
+                return count
+            feat = ogr.Feature(defn)
+            feat.SetFID(int(fid))
+            if wkb is not None:
+                feat.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+            for i, val in enumerate(values):
+                feat.SetField(i, val)
+            if layer.CreateFeature(feat) != ogr.OGRERR_NONE:
+                raise RuntimeError(f'Cannot write feature {fid} to {name}')
+            count += 1
+        if geometry_type is not None:
+            self.written.append(name)
+        return count
+
+    def commit(self):
+        """Commit the transaction, then build the spatial indexes and close."""
+        if self.ds.CommitTransaction() != ogr.OGRERR_NONE:
+            raise RuntimeError(f'Cannot commit {self.path}')
+        for name in self.written:
+            self.ds.ExecuteSQL(f"SELECT CreateSpatialIndex('{name}', '{GEOMETRY_COLUMN}')")
+        self.ds = None
+
+    def rollback(self):
+        if self.ds is not None:
+            self.ds.RollbackTransaction()
+            self.ds = None
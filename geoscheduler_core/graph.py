@@ -0,0 +1,275 @@
+"""
+In-memory road graph used by the GeoScheduler plugins.
+
+The road layer is read once into a compact undirected graph: node coordinates,
+edge endpoints and lengths live in NumPy arrays and adjacency is stored in CSR
+form (indptr / arc target / arc edge id). Every segment between two consecutive
+vertices of a road polyline becomes one edge, and vertices closer than the
+snapping precision are merged into one node.
+"""
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+from .spatial import GridIndex
+
+
+Route = namedtuple('Route', ['origin', 'dest', 'nodes', 'edges', 'cost'])
+
+# nearest_nodes tries this many ever coarser grids before comparing with every node;
+# a cell of the coarsest one holds a few hundred nodes
+NODE_GRID_LEVELS = 4
+
+
+class RoutingCanceled(Exception):
+    pass
+
+
+class RoadGraph:
+    # arrays that fully describe a graph, see to_arrays() / from_arrays()
+    ARRAYS = ('node_x', 'node_y', 'edge_u', 'edge_v', 'edge_length', 'edge_feature',
+              'indptr', 'arc_target', 'arc_edge')
+
+    def __init__(self, node_x, node_y, edge_u, edge_v, edge_length, edge_feature, csr=None):
+        self.node_x = np.asarray(node_x, dtype=np.float64)
+        self.node_y = np.asarray(node_y, dtype=np.float64)
+        self.edge_u = np.asarray(edge_u, dtype=np.int32)
+        self.edge_v = np.asarray(edge_v, dtype=np.int32)
+        self.edge_length = np.asarray(edge_length, dtype=np.float64)
+        # index of the source road feature each edge was cut from
+        self.edge_feature = np.asarray(edge_feature, dtype=np.int32)
+        if csr is None:
+            self._build_csr()
+        else:
+            self.indptr, self.arc_target, self.arc_edge = csr
+        self._adj = None
+        # node grid indexes for nearest_nodes, finest first, built on demand
+        self._node_grids = []
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a graph from to_arrays() output without recomputing adjacency."""
+        return cls(arrays['node_x'], arrays['node_y'], arrays['edge_u'], arrays['edge_v'],
+                   arrays['edge_length'], arrays['edge_feature'],
+                   csr=(arrays['indptr'], arrays['arc_target'], arrays['arc_edge']))
+
+    def with_costs(self, edge_cost):
+        """
+        The same network with `edge_cost` (e.g. travel times) in place of the
+        segment lengths. Arrays and adjacency are shared, nothing is rebuilt.
+        """
+        arrays = self.to_arrays()
+        arrays['edge_length'] = edge_cost
+        return RoadGraph.from_arrays(arrays)
+
+    @property
+    def node_count(self):
+        return len(self.node_x)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_u)
+
+    @classmethod
+    def from_polylines(cls, polylines, precision=6):
+        """
+        Build a graph from an iterable of (feature_index, parts) where parts is a
+        list of vertex sequences [(x, y), ...]. Coordinates are rounded to
+        `precision` decimals to find shared vertices.
+        """
+        xs, ys, part_ids, part_feature = [], [], [], []
+        pid = 0
+        for feat_idx, parts in polylines:
+            for part in parts:
+                if len(part) < 2:
+                    continue
+                for x, y in part:
+                    xs.append(x)
+                    ys.append(y)
+                    part_ids.append(pid)
+                part_feature.append(feat_idx)
+                pid += 1
+        if not xs:
+            return cls([], [], [], [], [], [])
+
+        xy = np.round(np.column_stack([xs, ys]), precision)
+        nodes, inverse = np.unique(xy, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        part_ids = np.asarray(part_ids, dtype=np.int64)
+
+        same_part = part_ids[:-1] == part_ids[1:]
+        u = inverse[:-1][same_part]
+        v = inverse[1:][same_part]
+        feat = np.asarray(part_feature, dtype=np.int32)[part_ids[:-1][same_part]]
+        keep = u != v
+        u, v, feat = u[keep], v[keep], feat[keep]
+        length = np.hypot(nodes[v, 0] - nodes[u, 0], nodes[v, 1] - nodes[u, 1])
+        return cls(nodes[:, 0], nodes[:, 1], u, v, length, feat)
+
+    def _build_csr(self):
+        n = self.node_count
+        e = self.edge_count
+        src = np.concatenate([self.edge_u, self.edge_v])
+        dst = np.concatenate([self.edge_v, self.edge_u])
+        eid = np.concatenate([np.arange(e, dtype=np.int32)] * 2)
+        order = np.argsort(src, kind='stable')
+        self.arc_target = dst[order]
+        self.arc_edge = eid[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+
+    def _adjacency(self):
+        # plain lists are much faster than array indexing inside the heap loop
+        if self._adj is None:
+            self._adj = (self.indptr.tolist(), self.arc_target.tolist(),
+                         self.arc_edge.tolist(), self.edge_length.tolist())
+        return self._adj
+
+    def _node_grid(self, level):
+        """
+        Grid index over the nodes: level 0 has cells of about two node spacings,
+        each next level twice as coarse. None past NODE_GRID_LEVELS or past the
+        grid that spans the whole network.
+        """
+        while len(self._node_grids) <= level:
+            span = max(float(np.ptp(self.node_x)), float(np.ptp(self.node_y)), 1e-9)
+            if self._node_grids:
+                if len(self._node_grids) == NODE_GRID_LEVELS or self._node_grids[-1].cell >= span:
+                    return None
+                cell = self._node_grids[-1].cell * 2.0
+            else:
+                # the span / 1e6 floor keeps int64 cell keys from overflowing
+                cell = max(2.0 * span / np.sqrt(self.node_count), span / 1e6)
+            self._node_grids.append(GridIndex(self.node_x, self.node_y, cell))
+        return self._node_grids[level]
+
+    def nearest_nodes(self, xs, ys):
+        """
+        Index of the closest graph node for each query point (the lowest index
+        on ties). Queries go through a grid index kept on the graph; points with
+        no node within one cell are retried on coarser grids, and the few left
+        far outside the network are compared with every node.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        out = np.full(len(xs), -1, dtype=np.int64)
+        todo = np.arange(len(xs))
+        level = 0
+        while len(todo) and self.node_count:
+            grid = self._node_grid(level)
+            if grid is None:
+                break
+            idx, _ = grid.nearest(xs[todo], ys[todo])
+            found = idx >= 0
+            out[todo[found]] = idx[found]
+            todo = todo[~found]
+            level += 1
+        for i in todo:
+            d = (self.node_x - xs[i]) ** 2 + (self.node_y - ys[i]) ** 2
+            out[i] = int(np.argmin(d))
+        return out
+
+    def shortest_path_tree(self, source, targets=None, stretch=None):
+        """
+        Dijkstra from `source`. When `targets` is given the search stops as soon
+        as all of them are settled; with `stretch` it goes on until (1 + stretch)
+        times the distance of the farthest target, so every node within that
+        radius is settled too.
+        """
+        indptr, arc_target, arc_edge, length = self._adjacency()
+        n = self.node_count
+        dist = [float('inf')] * n
+        pred_edge = [-1] * n
+        pred_node = [-1] * n
+        done = [False] * n
+        remaining = set(int(t) for t in targets) if targets is not None else None
+
+        radius = float('inf')
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if done[u]:
+                continue
+            if d > radius:
+                break
+            done[u] = True
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    if not stretch:
+                        break
+                    radius = d * (1.0 + stretch)
+                    remaining = None
+            for a in range(indptr[u], indptr[u + 1]):
+                v = arc_target[a]
+                e = arc_edge[a]
+                nd = d + length[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred_edge[v] = e
+                    pred_node[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return ShortestPathTree(source, dist, pred_node, pred_edge)
+
+
+class ShortestPathTree:
+    def __init__(self, source, dist, pred_node, pred_edge):
+        self.source = source
+        self.dist = dist
+        self.pred_node = pred_node
+        self.pred_edge = pred_edge
+
+    def reached(self, target):
+        return self.dist[target] != float('inf')
+
+    def path(self, target):
+        """(nodes, edges) from the source to `target`, or None if unreachable."""
+        if not self.reached(target):
+            return None
+        nodes = [target]
+        edges = []
+        node = target
+        while node != self.source:
+            edges.append(self.pred_edge[node])
+            node = self.pred_node[node]
+            nodes.append(node)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+
+def route_origin(graph, oi, onode, dest_nodes):
+    """Routes from one origin to all destinations using a single search."""
+    tree = graph.shortest_path_tree(int(onode), targets=dest_nodes)
+    routes = []
+    for di, dnode in enumerate(dest_nodes):
+        res = tree.path(int(dnode))
+        if res is not None:
+            nodes, edges = res
+            routes.append(Route(oi, di, nodes, edges, tree.dist[int(dnode)]))
+    return routes
+
+
+def route_many(graph, origin_nodes, dest_nodes, progress=None, is_canceled=None):
+    """
+    Route every origin to every destination with one one-to-many search per
+    origin. Returns a list of Route; unreachable pairs are left out.
+    `progress(done, total)` is called after each origin; RoutingCanceled is
+    raised once `is_canceled()` turns true.
+    """
+    routes = []
+    total = len(origin_nodes) * len(dest_nodes)
+    done = 0
+    for oi, onode in enumerate(origin_nodes):
+        if is_canceled and is_canceled():
+            raise RoutingCanceled()
+        routes.extend(route_origin(graph, oi, onode, dest_nodes))
+        done += len(dest_nodes)
+        if progress:
+            progress(done, total)
+    return routes
@@ -0,0 +1,142 @@
+"""
+Time-dependent routing: hourly edge travel times and demand, all 24 hours in
+one job.
+
+Every road feature gets 24 hourly speeds, either a full profile or a
+free-flow speed scaled by a congestion curve. Edge costs are travel times, so
+slow peak-hour roads can change which routes are chosen. Hours with
+identical costs share one routing pass, and all distinct cost sets go
+through the same worker pool on one graph, with OD points snapped and
+junctions matched once. Corridor counts of hour h are scaled by that hour's
+share of daily demand. Densities are normalised by the busiest junction-hour
+of the whole day, so quiet hours fall below the threshold.
+"""
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+from .parallel import route_many_costs
+from .pipeline import density_at
+from .usage import corridor_usage
+from .weights import junction_weights
+
+
+HOURS = 24
+DEFAULT_SPEED_KMH = 30.0
+
+# share of daily trips starting in each hour: morning and evening peaks
+DEFAULT_DEMAND = np.array([
+    0.5, 0.3, 0.2, 0.2, 0.4, 1.2, 3.5, 7.5, 9.0, 6.0, 4.5, 4.5,
+    5.0, 5.0, 4.8, 5.5, 7.0, 8.5, 7.5, 5.0, 3.5, 2.5, 1.8, 1.1])
+DEFAULT_DEMAND = DEFAULT_DEMAND / DEFAULT_DEMAND.sum()
+
+# speed as a fraction of free flow in each hour
+DEFAULT_CONGESTION = np.array([
+    1.0, 1.0, 1.0, 1.0, 1.0, 0.95, 0.8, 0.6, 0.55, 0.7, 0.85, 0.85,
+    0.8, 0.8, 0.85, 0.8, 0.7, 0.55, 0.6, 0.75, 0.9, 0.95, 1.0, 1.0])
+
+# time-of-day weighting applied in each hour
+HOUR_MODES = tuple('AM Peak' if 6 <= h < 10 else 'PM Peak' if 16 <= h < 20 else 'Off-Peak'
+                   for h in range(HOURS))
+
+HourlyResult = namedtuple('HourlyResult', [
+    'junction_density', 'junction_volume', 'route_counts', 'cost_set', 'costs'])
+
+
+def load_speed_table(path):
+    """
+    {key: 24 speeds} from a CSV side table with a key column followed by
+    either one free-flow speed or 24 hourly speeds (km/h). A header row is
+    skipped when its speed cells are not numbers.
+    """
+    table = {}
+    with open(path, newline='') as fh:
+        for row in csv.reader(fh):
+            if len(row) < 2:
+                continue
+            try:
+                values = [float(v) for v in row[1:] if v.strip()]
+            except ValueError:
+                continue
+            if len(values) not in (1, HOURS):
+                raise ValueError(f'{path}: {row[0]} has {len(values)} speeds, expected 1 or {HOURS}')
+            table[row[0].strip()] = values
+    return table
+
+
+def hourly_speeds(values, congestion=DEFAULT_CONGESTION, default=DEFAULT_SPEED_KMH, table=None):
+    """
+    (features, 24) speeds in km/h. Each entry of `values` is a free-flow
+    speed (scaled by `congestion`), a list of 24 hourly speeds, or with
+    `table` a key looked up there. Missing or non-positive speeds fall back
+    to `default`.
+    """
+    congestion = np.asarray(congestion, dtype=np.float64)
+    out = np.empty((len(values), HOURS))
+    for i, value in enumerate(values):
+        if table is not None:
+            value = table.get(str(value).strip()) if value is not None else None
+        if value is None:
+            speeds = default * congestion
+        elif np.ndim(value) == 0:
+            try:
+                speeds = float(value) * congestion
+            except (TypeError, ValueError):
+                speeds = default * congestion
+        elif len(value) == 1:
+            speeds = float(value[0]) * congestion
+        else:
+            speeds = np.asarray(value, dtype=np.float64)
+        out[i] = np.where(speeds > 0, speeds, default * congestion)
+    return out
+
+
+def edge_travel_times(graph, feature_speeds, metres_per_unit=1.0):
+    """(24, edges) travel times in seconds for per-feature km/h speeds."""
+    speeds = np.asarray(feature_speeds, dtype=np.float64)[graph.edge_feature]
+    return (graph.edge_length * metres_per_unit)[None, :] / (speeds.T / 3.6)
+
+
+def route_hourly(graph, origin_xy, dest_xy, jnodes, travel_times, demand=DEFAULT_DEMAND,
+                 workers=None, progress=None, is_canceled=None):
+    """
+    Route every origin to every destination under each hour's travel times.
+    Returns an HourlyResult with (24, junctions) density and volume, routes
+    per hour, the distinct cost set each hour used and (24, o, d) travel
+    times (inf where unreachable).
+    """
+    origin_xy = np.asarray(origin_xy, dtype=np.float64).reshape(-1, 2)
+    dest_xy = np.asarray(dest_xy, dtype=np.float64).reshape(-1, 2)
+    demand = np.asarray(demand, dtype=np.float64)
+    if demand.shape != (HOURS,):
+        raise ValueError(f'demand needs {HOURS} hourly values')
+    demand = demand / demand.sum() if demand.sum() > 0 else np.full(HOURS, 1.0 / HOURS)
+
+    onodes = graph.nearest_nodes(origin_xy[:, 0], origin_xy[:, 1])
+    dnodes = graph.nearest_nodes(dest_xy[:, 0], dest_xy[:, 1])
+    # hours with the same costs (e.g. free-flow nights) are routed once
+    cost_sets, cost_set = np.unique(np.asarray(travel_times, dtype=np.float64), axis=0, return_inverse=True)
+    cost_set = cost_set.ravel()
+    route_sets = route_many_costs(graph, onodes, dnodes, cost_sets, workers=workers,
+                                  progress=progress, is_canceled=is_canceled)
+
+    jnodes = np.asarray(jnodes)
+    counts = np.empty((len(route_sets), len(jnodes)))
+    costs = np.full((len(route_sets), len(onodes), len(dnodes)), np.inf)
+    for k, routes in enumerate(route_sets):
+        usage = corridor_usage(graph, routes)
+        counts[k] = density_at(jnodes, usage.node_counts().astype(np.float64))
+        for r in routes:
+            costs[k, r.origin, r.dest] = r.cost
+
+    volume = demand[:, None] * counts[cost_set]
+    peak = volume.max() if volume.size and volume.max() > 0 else 1.0
+    return HourlyResult(volume / peak, volume, np.array([len(route_sets[k]) for k in cost_set]),
+                        cost_set, costs[cost_set])
+
+
+def hourly_weights(junction_density, threshold, splits, modes=HOUR_MODES):
+    """(used, first, second) weight curves, each (24, junctions), with each hour's time mode."""
+    curves = [junction_weights(junction_density[h], threshold, modes[h], splits) for h in range(HOURS)]
+    return tuple(np.vstack([c[i] for c in curves]) for i in range(3))
@@ -0,0 +1,240 @@
+"""
+Incremental recomputation after edits to the road network.
+
+A run is kept as a RouteIndex: every routed OD pair with its edge sequence and
+an edge -> routes reverse index in CSR form. After the road layer is edited
+the old and new graphs are matched by segment geometry; only pairs whose
+route uses a removed edge, whose end snaps to a different node of the new
+network, or that might get shorter through an added edge are routed again,
+and corridor counts are patched by subtracting their old routes and adding
+the new ones. Ends are snapped again from the OD point coordinates, so an
+edit that puts a junction closer to a centroid moves its snap as a full run
+would.
+
+Whether an added edge (a, b) can shorten pair (o, d) is decided with the
+straight-line lower bound |o a| + len(a b) + |b d| (either direction), which
+never exceeds a real path cost because every edge is a straight segment.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .graph import Route, RoutingCanceled
+from .usage import CorridorUsage
+
+
+EdgeDiff = namedtuple('EdgeDiff', ['edge_map', 'node_map', 'removed', 'added'])
+
+# added edges tested against all pairs at once
+LOWER_BOUND_CHUNK = 2048
+
+
+def _match_rows(old_rows, new_rows):
+    """
+    For every old row the index of an identical new row, or -1. Repeated rows
+    are paired in order of appearance. Also returns the unmatched new rows.
+    """
+    rows = np.vstack((old_rows, new_rows))
+    _, group = np.unique(rows, axis=0, return_inverse=True)
+    group = group.ravel()
+    n_old = len(old_rows)
+    # occurrence rank of every row within its group, separately per side
+    side = np.r_[np.zeros(n_old, dtype=np.int64), np.ones(len(new_rows), dtype=np.int64)]
+    order = np.lexsort((np.arange(len(rows)), side, group))
+    key = group[order] * 2 + side[order]
+    first = np.r_[0, np.nonzero(np.diff(key))[0] + 1]
+    rank = np.empty(len(rows), dtype=np.int64)
+    rank[order] = np.arange(len(rows)) - np.repeat(first, np.diff(np.r_[first, len(rows)]))
+
+    width = int(rank.max()) + 1 if len(rank) else 1
+    slot = group * width + rank
+    new_slot = dict(zip(slot[n_old:].tolist(), range(len(new_rows))))
+    mapping = np.array([new_slot.get(s, -1) for s in slot[:n_old].tolist()], dtype=np.int64)
+    matched = np.zeros(len(new_rows), dtype=bool)
+    matched[mapping[mapping >= 0]] = True
+    return mapping, np.nonzero(~matched)[0]
+
+
+def _edge_rows(graph):
+    ux, uy = graph.node_x[graph.edge_u], graph.node_y[graph.edge_u]
+    vx, vy = graph.node_x[graph.edge_v], graph.node_y[graph.edge_v]
+    # endpoints in a canonical order so u/v swaps still match
+    swap = (vx < ux) | ((vx == ux) & (vy < uy))
+    ax, ay = np.where(swap, vx, ux), np.where(swap, vy, uy)
+    bx, by = np.where(swap, ux, vx), np.where(swap, uy, vy)
+    return np.column_stack((ax, ay, bx, by))
+
+
+def diff_graphs(old, new):
+    """
+    Match two graphs built from the same layer before and after an edit.
+    edge_map / node_map give the new id of every old edge / node (-1 if gone);
+    removed lists old edges without a match, added new edges without one.
+    """
+    edge_map, added = _match_rows(_edge_rows(old), _edge_rows(new))
+    node_map, _ = _match_rows(np.column_stack((old.node_x, old.node_y)),
+                              np.column_stack((new.node_x, new.node_y)))
+    return EdgeDiff(edge_map, node_map, np.nonzero(edge_map < 0)[0], added)
+
+
+class RouteIndex:
+    """
+    The routed OD pairs of a run on `graph`. `pairs` is an optional boolean
+    (origins x destinations) mask of the pairs that belong to the run (all by
+    default; adaptive runs only drew some of them). `origin_xy` / `dest_xy`
+    are the (n, 2) points the end nodes were snapped from; without them the
+    node coordinates stand in. One route per pair: runs with alternative
+    routes cannot be indexed.
+    """
+
+    def __init__(self, graph, routes, origin_nodes, dest_nodes, pairs=None, origin_xy=None, dest_xy=None):
+        self.graph = graph
+        self.origin_nodes = np.asarray(origin_nodes, dtype=np.int64)
+        self.dest_nodes = np.asarray(dest_nodes, dtype=np.int64)
+        self.origin_xy = self._points(origin_xy, self.origin_nodes)
+        self.dest_xy = self._points(dest_xy, self.dest_nodes)
+        shape = (len(self.origin_nodes), len(self.dest_nodes))
+        self.pairs = np.ones(shape, dtype=bool) if pairs is None else np.asarray(pairs, dtype=bool)
+        self.routes = {}
+        for r in routes:
+            if (r.origin, r.dest) in self.routes:
+                raise ValueError(f'Pair ({r.origin}, {r.dest}) has several routes; '
+                                 'runs with alternative routes cannot be updated incrementally')
+            self.routes[(r.origin, r.dest)] = r
+        self._build_reverse()
+
+    def _points(self, xy, nodes):
+        if xy is None:
+            return np.column_stack((self.graph.node_x[nodes], self.graph.node_y[nodes]))
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if len(xy) != len(nodes):
+            raise ValueError(f'{len(xy)} points given for {len(nodes)} snapped nodes')
+        return xy
+
+    def _build_reverse(self):
+        keys = list(self.routes)
+        lengths = np.array([len(self.routes[k].edges) for k in keys], dtype=np.int64)
+        edges = (np.concatenate([np.asarray(self.routes[k].edges, dtype=np.int64) for k in keys])
+                 if keys else np.zeros(0, dtype=np.int64))
+        owner = np.repeat(np.arange(len(keys)), lengths)
+        order = np.argsort(edges, kind='stable')
+        self._keys = keys
+        self._route_of_arc = owner[order]
+        self._indptr = np.zeros(self.graph.edge_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges, minlength=self.graph.edge_count), out=self._indptr[1:])
+
+    def routes_on(self, edges):
+        """(origin, dest) keys of the routes that use any of `edges`."""
+        found = set()
+        for e in np.asarray(edges, dtype=np.int64):
+            for i in self._route_of_arc[self._indptr[e]:self._indptr[e + 1]]:
+                found.add(self._keys[i])
+        return found
+
+    def costs(self):
+        """Current route cost per pair; inf where no route was found."""
+        out = np.full(self.pairs.shape, np.inf)
+        for (oi, di), r in self.routes.items():
+            out[oi, di] = r.cost
+        return out
+
+    def as_list(self):
+        return [self.routes[k] for k in sorted(self.routes)]
+
+
+def _candidates_through(graph, edges, ox, oy, dx, dy, cost):
+    """Boolean mask of pairs whose lower bound through any of `edges` beats `cost`."""
+    hit = np.zeros(cost.shape, dtype=bool)
+    for start in range(0, len(edges), LOWER_BOUND_CHUNK):
+        e = edges[start:start + LOWER_BOUND_CHUNK]
+        ax, ay = graph.node_x[graph.edge_u[e]], graph.node_y[graph.edge_u[e]]
+        bx, by = graph.node_x[graph.edge_v[e]], graph.node_y[graph.edge_v[e]]
+        length = graph.edge_length[e]
+        # (origins, edges) and (destinations, edges) straight-line distances
+        oa = np.hypot(ox[:, None] - ax, oy[:, None] - ay)
+        ob = np.hypot(ox[:, None] - bx, oy[:, None] - by)
+        da = np.hypot(dx[:, None] - ax, dy[:, None] - ay)
+        db = np.hypot(dx[:, None] - bx, dy[:, None] - by)
+        for oi in range(len(ox)):
+            lb = np.minimum(oa[oi] + db, ob[oi] + da) + length
+            hit[oi] |= (lb < cost[oi, :, None]).any(axis=1)
+    return hit
+
+
+def reroute_after_edit(index, usage, new_graph, progress=None, is_canceled=None):
+    """
+    Bring a run up to date with an edited network. Returns the new RouteIndex,
+    the patched CorridorUsage on `new_graph` and a dict of counts describing
+    what changed. Usage must count whole routes: weighted (probability) usage
+    is rejected with ValueError.
+    """
+    if usage.edge_counts.dtype.kind == 'f':
+        raise ValueError('Weighted corridor usage (alternative routes) cannot be updated incrementally')
+    diff = diff_graphs(index.graph, new_graph)
+
+    # every end is snapped again; one whose node is not the old one carried
+    # over (it vanished, or the edit added a closer one) reroutes its pairs
+    onodes = new_graph.nearest_nodes(index.origin_xy[:, 0], index.origin_xy[:, 1])
+    dnodes = new_graph.nearest_nodes(index.dest_xy[:, 0], index.dest_xy[:, 1])
+    moved_o = onodes != diff.node_map[index.origin_nodes]
+    moved_d = dnodes != diff.node_map[index.dest_nodes]
+
+    affected = np.zeros(index.pairs.shape, dtype=bool)
+    affected[moved_o, :] = True
+    affected[:, moved_d] = True
+    for oi, di in index.routes_on(diff.removed):
+        affected[oi, di] = True
+    if len(diff.added):
+        cost = index.costs()
+        affected |= _candidates_through(new_graph, diff.added,
+                                        new_graph.node_x[onodes], new_graph.node_y[onodes],
+                                        new_graph.node_x[dnodes], new_graph.node_y[dnodes], cost)
+    affected &= index.pairs
+
+    # carry the counts of unchanged edges over, then swap the affected routes
+    patched = CorridorUsage(new_graph)
+    kept_e = diff.edge_map >= 0
+    np.add.at(patched.edge_counts, diff.edge_map[kept_e], usage.edge_counts[kept_e])
+    kept_n = diff.node_map >= 0
+    np.add.at(patched.terminal_counts, diff.node_map[kept_n], usage.terminal_counts[kept_n])
+    patched.route_count = usage.route_count
+
+    routes = {}
+    for (oi, di), r in index.routes.items():
+        if affected[oi, di]:
+            edges = diff.edge_map[np.asarray(r.edges, dtype=np.int64)]
+            edges = edges[edges >= 0]
+            if len(edges):
+                np.subtract.at(patched.edge_counts, edges, 1)
+            for n in (r.nodes[0], r.nodes[-1]):
+                if diff.node_map[n] >= 0:
+                    patched.terminal_counts[diff.node_map[n]] -= 1
+            patched.route_count -= 1
+        else:
+            nodes = diff.node_map[np.asarray(r.nodes, dtype=np.int64)].tolist()
+            edges = diff.edge_map[np.asarray(r.edges, dtype=np.int64)].tolist()
+            routes[(oi, di)] = Route(oi, di, nodes, edges, r.cost)
+
+    rows = np.nonzero(affected.any(axis=1))[0]
+    for step, oi in enumerate(rows, 1):
+        if is_canceled and is_canceled():
+            raise RoutingCanceled()
+        dis = np.nonzero(affected[oi])[0]
+        targets = [int(dnodes[di]) for di in dis]
+        tree = new_graph.shortest_path_tree(int(onodes[oi]), targets=targets)
+        for di, dnode in zip(dis, targets):
+            res = tree.path(dnode)
+            if res is None:
+                continue
+            route = Route(int(oi), int(di), res[0], res[1], tree.dist[dnode])
+            routes[(int(oi), int(di))] = route
+            patched.add_route(route)
+        if progress:
+            progress(step, len(rows))
+
+    new_index = RouteIndex(new_graph, routes.values(), onodes, dnodes, index.pairs,
+                           index.origin_xy, index.dest_xy)
+    stats = {'removed_edges': int(len(diff.removed)), 'added_edges': int(len(diff.added)),
+             'moved_ends': int(moved_o.sum() + moved_d.sum()),
+             'rerouted_pairs': int(affected.sum()), 'total_pairs': int(index.pairs.sum())}
+    return new_index, patched, stats
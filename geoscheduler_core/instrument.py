@@ -0,0 +1,183 @@
+"""
+Run instrumentation: wall time and memory per stage, counters, pair failures
+by reason and peak memory, written as a JSON run report.
+
+    report = RunReport(profile=('routing',))
+    with report.stage('routing'):
+        ...
+    report.count('pairs_attempted', n)
+    report.fail('unreachable', k)
+    report.write(report_path(out_gpkg))
+
+Stages listed in `profile` run under cProfile; each profile is dumped to a
+.prof file next to the report (open it with pstats or snakeviz) and its top
+entries are copied into the report. Profiling covers the calling thread only,
+not route worker processes. Each stage records the resident set size at its
+start and end from /proc/self/statm (Linux only), and the run-wide peak so
+far from the resource module (unavailable on Windows): ru_maxrss never goes
+down, so it is not a per-stage peak. `trace_memory` adds the peak Python
+heap per stage through tracemalloc, which slows allocations.
+"""
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+
+REPORT_SUFFIX = '_run_report.json'
+# profile entries copied into the JSON report per profiled stage
+PROFILE_TOP = 25
+
+
+def report_path(gpkg_path):
+    """The run report belonging to a GeoPackage output."""
+    return os.path.splitext(gpkg_path)[0] + REPORT_SUFFIX
+
+
+def peak_rss(children=False):
+    """Peak resident set size in bytes of this process (or its finished children); None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+def current_rss():
+    """Resident set size in bytes of this process right now; None without /proc."""
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _plain(value):
+    # numpy scalars and arrays in counters and info
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class RunReport:
+    def __init__(self, profile=(), trace_memory=False):
+        self.profile = set(profile)
+        self.trace_memory = trace_memory
+        self.started = time.time()
+        self.stages = {}
+        self.counters = Counter()
+        self.failures = Counter()
+        self.info = {}
+        self.status = 'running'
+        self._profiles = {}
+        self._own_trace = trace_memory and not tracemalloc.is_tracing()
+        if self._own_trace:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage `name`; repeated stages add up."""
+        prof = cProfile.Profile() if name in self.profile else None
+        if self.trace_memory and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        rss_start = current_rss()
+        started = time.perf_counter()
+        if prof is not None:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+                self._profiles.setdefault(name, []).append(prof)
+            entry = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            entry['seconds'] += time.perf_counter() - started
+            entry['calls'] += 1
+            # start of the first call, end of the last; growth adds up over calls
+            rss_end = current_rss()
+            entry.setdefault('rss_start', rss_start)
+            entry['rss_end'] = rss_end
+            if rss_start is not None and rss_end is not None:
+                entry['rss_growth'] = entry.get('rss_growth', 0) + rss_end - rss_start
+            entry['peak_rss_run'] = peak_rss()
+            if self.trace_memory and tracemalloc.is_tracing():
+                entry['peak_python_heap'] = max(entry.get('peak_python_heap', 0), tracemalloc.get_traced_memory()[1])
+
+    def count(self, name, n=1):
+        self.counters[name] += int(n)
+
+    def fail(self, reason, n=1):
+        """Record `n` OD pairs that produced no route because of `reason`."""
+        if n:
+            self.failures[reason] += int(n)
+
+    def set(self, **info):
+        """Free-form facts about the run (settings, sizes, notes)."""
+        self.info.update(info)
+
+    def finish(self, status):
+        self.status = status
+        if self._own_trace:
+            tracemalloc.stop()
+            self._own_trace = False
+
+    def _profile_stats(self, name):
+        stats = pstats.Stats(self._profiles[name][0], stream=io.StringIO())
+        for prof in self._profiles[name][1:]:
+            stats.add(prof)
+        return stats
+
+    def _top_entries(self, stats):
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({'function': f'{os.path.basename(filename)}:{line}({func})',
+                         'calls': nc, 'primitive_calls': cc, 'tottime': tt, 'cumtime': ct})
+        rows.sort(key=lambda r: r['cumtime'], reverse=True)
+        return rows[:PROFILE_TOP]
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'wall_seconds': time.time() - self.started,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'info': self.info,
+            'stages': self.stages,
+            'counters': dict(self.counters),
+            'failures': dict(self.failures),
+            'peak_rss_run': peak_rss(),
+            'peak_rss_children': peak_rss(children=True),
+        }
+
+    def write(self, path):
+        """Write the JSON report (and one .prof file per profiled stage) to `path`."""
+        report = self.as_dict()
+        if self._profiles:
+            report['profiles'] = {}
+            for name in self._profiles:
+                stats = self._profile_stats(name)
+                prof_path = f'{os.path.splitext(path)[0]}_{name}.prof'
+                stats.dump_stats(prof_path)
+                report['profiles'][name] = {'file': os.path.basename(prof_path), 'top': self._top_entries(stats)}
+        # serialised first and swapped in whole, so a failed write never leaves half a report
+        text = json.dumps(report, indent=2, default=_plain)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+        return path
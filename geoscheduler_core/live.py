@@ -0,0 +1,223 @@
+"""
+Live detector counts: feed readers, a sliding-window aggregate and the blend
+with routed corridor density that drives junction reweighting.
+
+A feed delivers one record per line, either CSV `junction,count[,time]` or
+NDJSON `{"junction": 12, "count": 3, "time": 1700000000.5}`; `junction` is
+the fid of the source junction layer and `time` (seconds, default: when the
+record was read) places the count in the window. Feeds are read without
+blocking, so a GUI timer can poll them:
+
+    FileFeed('counts.ndjson')       a file another process appends to
+    UdpFeed(9999)                   datagrams of records on 127.0.0.1
+
+SlidingWindow keeps per-junction counts in a ring of time buckets: adding a
+count is O(1) and expiring a bucket costs one vectorised subtraction, so the
+window total per junction is always current.
+"""
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+from .weights import junction_weights
+
+
+# lines handed out per read call, so one poll never stalls the caller
+MAX_LINES = 200000
+
+
+class FileFeed:
+    """Tail a text file. Reading starts at its end; a file that shrank (rotated) is read from the start."""
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self._fh = open(path, 'r', encoding='utf-8', newline='')
+        if not from_start:
+            self._fh.seek(0, os.SEEK_END)
+        self._partial = ''
+
+    def read_lines(self, limit=MAX_LINES):
+        if os.path.getsize(self.path) < self._fh.tell():
+            self._fh.seek(0)
+            self._partial = ''
+        lines = []
+        while len(lines) < limit:
+            chunk = self._fh.readline()
+            if not chunk:
+                break
+            if not chunk.endswith('\n'):
+                # the writer is mid-line; keep it for the next poll
+                self._partial += chunk
+                break
+            lines.append(self._partial + chunk)
+            self._partial = ''
+        return lines
+
+    def close(self):
+        self._fh.close()
+
+
+class UdpFeed:
+    """Records sent as UDP datagrams (one or more lines each) to a local port."""
+
+    def __init__(self, port, host='127.0.0.1'):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self._sock.bind((host, port))
+        self._sock.setblocking(False)
+
+    def read_lines(self, limit=MAX_LINES):
+        lines = []
+        while len(lines) < limit:
+            try:
+                data = self._sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            lines.extend(data.decode('utf-8', 'replace').splitlines())
+        return lines
+
+    def close(self):
+        self._sock.close()
+
+
+def open_feed(spec):
+    """A feed for 'udp://host:port', 'udp://port' or a file path."""
+    if spec.startswith('udp://'):
+        host, _, port = spec[len('udp://'):].rpartition(':')
+        return UdpFeed(int(port), host or '127.0.0.1')
+    return FileFeed(spec)
+
+
+def parse_records(lines, now=None):
+    """
+    (junction ids, counts, times, bad) from feed lines: three arrays and the
+    number of malformed lines (headers included), which are skipped.
+    """
+    now = time.time() if now is None else now
+    ids, counts, times = [], [], []
+    bad = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            if line[0] == '{':
+                rec = json.loads(line)
+                ids.append(int(rec['junction']))
+                counts.append(float(rec.get('count', 1)))
+                times.append(float(rec.get('time', now)))
+            else:
+                parts = line.split(',')
+                ids.append(int(parts[0]))
+                counts.append(float(parts[1]) if len(parts) > 1 and parts[1] else 1.0)
+                times.append(float(parts[2]) if len(parts) > 2 and parts[2] else now)
+        except (ValueError, KeyError, TypeError, IndexError):
+            # keep the three lists the same length
+            del ids[len(times):], counts[len(times):]
+            bad += 1
+    return (np.asarray(ids, dtype=np.int64), np.asarray(counts, dtype=np.float64),
+            np.asarray(times, dtype=np.float64), bad)
+
+
+class SlidingWindow:
+    """Counts per junction over the last `window` seconds, in buckets of `bucket` seconds."""
+
+    def __init__(self, size, window=300.0, bucket=10.0):
+        self.bucket = float(bucket)
+        self.slots = max(1, int(np.ceil(window / bucket)))
+        self.ring = np.zeros((self.slots, size))
+        self.totals = np.zeros(size)
+        self.head = None  # absolute index of the newest bucket
+
+    def advance(self, now):
+        """Expire the buckets that fell out of the window by `now`."""
+        b = int(now // self.bucket)
+        if self.head is None:
+            self.head = b
+            return
+        if b <= self.head:
+            return
+        # at most one full turn of the ring has to be cleared
+        for old in range(max(self.head + 1, b - self.slots + 1), b + 1):
+            slot = old % self.slots
+            self.totals -= self.ring[slot]
+            self.ring[slot] = 0.0
+        self.head = b
+
+    def add(self, index, counts, times):
+        """Add counts for junction indexes at the given times; stale records are dropped."""
+        if not len(index):
+            return 0
+        self.advance(float(times.max()))
+        b = (times // self.bucket).astype(np.int64)
+        keep = b > self.head - self.slots
+        index, counts, b = index[keep], counts[keep], b[keep]
+        np.add.at(self.ring, (b % self.slots, index), counts)
+        np.add.at(self.totals, index, counts)
+        return int(keep.sum())
+
+
+class LiveReweighter:
+    """
+    Blend routed density with live counts and report the junctions whose
+    weights changed since the last call.
+
+    `junction_ids` are the source fids in the order of `routed_density`.
+    Blended density is (1 - blend) * routed + blend * live, where live is the
+    window count normalised by the busiest junction.
+    """
+
+    def __init__(self, junction_ids, routed_density, threshold, mode, splits,
+                 blend=0.5, window=300.0, bucket=10.0):
+        ids = np.asarray(junction_ids, dtype=np.int64)
+        self.order = np.argsort(ids, kind='stable')
+        self.sorted_ids = ids[self.order]
+        self.routed = np.asarray(routed_density, dtype=np.float64)
+        self.threshold, self.mode, self.splits = threshold, mode, splits
+        self.blend = blend
+        self.window = SlidingWindow(len(ids), window, bucket)
+        self.unknown = 0
+        self.records = 0
+        # the layer already holds the routed weights
+        self.pushed = None
+        self.changes()
+
+    def index_of(self, ids):
+        """Junction index per id, -1 for ids not in the junction layer."""
+        if not len(self.sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.sorted_ids, ids), len(self.sorted_ids) - 1)
+        return np.where(self.sorted_ids[pos] == ids, self.order[pos], -1)
+
+    def ingest(self, lines, now=None):
+        now = time.time() if now is None else now
+        ids, counts, times, bad = parse_records(lines, now)
+        index = self.index_of(ids)
+        known = index >= 0
+        self.unknown += int((~known).sum()) + bad
+        self.records += self.window.add(index[known], counts[known], times[known])
+        self.window.advance(now)
+
+    def density(self):
+        live = self.window.totals
+        peak = live.max() if len(live) else 0.0
+        if peak <= 0:
+            return self.routed
+        return (1.0 - self.blend) * self.routed + self.blend * live / peak
+
+    def changes(self):
+        """
+        (indexes, used, first, second) for junctions whose weights changed
+        since the last call; a changed threshold or mode shows up here too.
+        """
+        used, first, second = junction_weights(self.density(), self.threshold, self.mode, self.splits)
+        current = np.column_stack((used, first, second))
+        if self.pushed is None:
+            changed = np.zeros(0, dtype=np.int64)
+        else:
+            changed = np.nonzero((current != self.pushed).any(axis=1))[0]
+        self.pushed = current
+        return changed, used[changed], first[changed], second[changed]
@@ -0,0 +1,201 @@
+"""
+Process-pool routing. The graph arrays are copied once into a shared memory
+block; every worker attaches to it read-only and routes whole origins (one
+one-to-many search each), so results merge back as plain Route lists.
+Several edge cost sets (e.g. hourly travel times) can share one pool: they
+go into the same block and every chunk names the set it routes on.
+share_arrays / attach_arrays pass any other per-run arrays to the workers
+the same way.
+"""
+import multiprocessing as mp
+import os
+import sys
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .graph import RoadGraph, RoutingCanceled, route_many, route_origin
+
+
+# below this many origins the pool start-up costs more than it saves
+MIN_PARALLEL_ORIGINS = 4
+
+_worker_graph = None
+_worker_shm = None
+_worker_costs = None
+# graph of the cost set routed last; chunks come roughly in cost set order
+_worker_cost_graph = (None, None)
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _python_executable():
+    # inside QGIS sys.executable is the QGIS binary, spawn needs a real interpreter
+    exe = sys.executable or ''
+    if os.path.basename(exe).lower().startswith('python'):
+        return exe
+    names = ['python.exe', 'pythonw.exe'] if os.name == 'nt' else ['python3', 'python']
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, 'bin')):
+        for name in names:
+            cand = os.path.join(folder, name)
+            if os.path.isfile(cand):
+                return cand
+    return exe
+
+
+def share_arrays(arrays):
+    """
+    Copy a dict of arrays into one new shared memory block; returns (block,
+    spec). The caller closes and unlinks the block once no worker needs it.
+    """
+    spec = []
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        spec.append((name, arr.dtype.str, arr.shape, offset))
+        offset += arr.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, dtype, shape, off), arr in zip(spec, arrays.values()):
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        view[...] = arr
+    return shm, spec
+
+
+def attach_arrays(shm_name, spec):
+    """Read-only views of a block made by share_arrays; the block must stay open while they are used."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = {}
+    for name, dtype, shape, off in spec:
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        view.flags.writeable = False
+        arrays[name] = view
+    return shm, arrays
+
+
+def _share_graph(graph, cost_sets=None):
+    arrays = graph.to_arrays()
+    if cost_sets is not None:
+        arrays['cost_sets'] = cost_sets
+    return share_arrays(arrays)
+
+
+def _init_worker(shm_name, spec):
+    global _worker_graph, _worker_shm, _worker_costs
+    _worker_shm, arrays = attach_arrays(shm_name, spec)
+    _worker_costs = arrays.pop('cost_sets', None)
+    _worker_graph = RoadGraph.from_arrays(arrays)
+
+
+def worker_graph():
+    """Graph of the pool this worker process serves, for chunk functions of other modules."""
+    return _worker_graph
+
+
+@contextmanager
+def worker_pool(graph, workers, cost_sets=None):
+    """
+    Spawn ProcessPoolExecutor whose workers see `graph` (and `cost_sets`)
+    through one shared memory block, released when the block is left.
+    """
+    shm, spec = _share_graph(graph, cost_sets)
+    try:
+        ctx = mp.get_context('spawn')
+        ctx.set_executable(_python_executable())
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(shm.name, spec)) as pool:
+            yield pool
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _cost_graph(k):
+    global _worker_cost_graph
+    if k is None:
+        return _worker_graph
+    if _worker_cost_graph[0] != k:
+        _worker_cost_graph = (k, _worker_graph.with_costs(_worker_costs[k]))
+    return _worker_cost_graph[1]
+
+
+def _route_chunk(origins, dest_nodes, k=None):
+    graph = _cost_graph(k)
+    routes = []
+    for oi, onode in origins:
+        routes.extend(route_origin(graph, oi, onode, dest_nodes))
+    return k, len(origins), routes
+
+
+def route_many_parallel(graph, origin_nodes, dest_nodes, workers=None, progress=None,
+                        is_canceled=None):
+    """
+    Same result as route_many, with origins spread over `workers` processes.
+    Falls back to the serial path for one worker or very few origins.
+    """
+    return _route_pool(graph, origin_nodes, dest_nodes, None, workers, progress, is_canceled)[0]
+
+
+def route_many_costs(graph, origin_nodes, dest_nodes, cost_sets, workers=None, progress=None,
+                     is_canceled=None):
+    """
+    route_many once per row of `cost_sets` (sets x edges), with route costs
+    in those units. Returns one Route list per cost set; all sets are routed
+    by the same worker pool.
+    """
+    cost_sets = np.ascontiguousarray(cost_sets, dtype=np.float64).reshape(-1, graph.edge_count)
+    return _route_pool(graph, origin_nodes, dest_nodes, cost_sets, workers, progress, is_canceled)
+
+
+def _route_pool(graph, origin_nodes, dest_nodes, cost_sets, workers, progress, is_canceled):
+    keys = [None] if cost_sets is None else list(range(len(cost_sets)))
+    workers = default_workers() if workers is None else int(workers)
+    if workers <= 1 or len(origin_nodes) * len(keys) < MIN_PARALLEL_ORIGINS:
+        return _route_serial(graph, origin_nodes, dest_nodes, cost_sets, progress, is_canceled)
+
+    workers = min(workers, len(origin_nodes) * len(keys))
+    dest_nodes = [int(d) for d in dest_nodes]
+    origins = [(oi, int(o)) for oi, o in enumerate(origin_nodes)]
+    # a few chunks per worker keeps the pool busy when search costs differ
+    nchunks = min(len(origins), max(1, workers * 4 // len(keys)))
+    chunks = [(k, origins[i::nchunks]) for k in keys for i in range(nchunks)]
+
+    total = len(origin_nodes) * len(dest_nodes) * len(keys)
+    done = 0
+    routes = {k: [] for k in keys}
+    with worker_pool(graph, workers, cost_sets) as pool:
+        futures = [pool.submit(_route_chunk, chunk, dest_nodes, k) for k, chunk in chunks]
+        for fut in as_completed(futures):
+            if is_canceled and is_canceled():
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise RoutingCanceled()
+            k, n, part = fut.result()
+            routes[k].extend(part)
+            done += n * len(dest_nodes)
+            if progress:
+                progress(done, total)
+    out = []
+    for k in keys:
+        routes[k].sort(key=lambda r: (r.origin, r.dest))
+        out.append(routes[k])
+    return out
+
+
+def _route_serial(graph, origin_nodes, dest_nodes, cost_sets, progress, is_canceled):
+    if cost_sets is None:
+        return [route_many(graph, origin_nodes, dest_nodes, progress=progress, is_canceled=is_canceled)]
+    out = []
+    step = len(origin_nodes) * len(dest_nodes)
+    total = step * len(cost_sets)
+    for k, costs in enumerate(cost_sets):
+        base = k * step
+
+        def tick(done, _total, base=base):
+            if progress:
+                progress(base + done, total)
+        out.append(route_many(graph.with_costs(costs), origin_nodes, dest_nodes,
+                              progress=tick, is_canceled=is_canceled))
+    return out
@@ -0,0 +1,92 @@
+"""
+The routing stages shared by both plugins, on plain arrays.
+
+Zone centroids come in as (n, 2) coordinate arrays in the road CRS (see
+qgis_io.zone_centroids); everything from representative selection to the
+per-junction corridor density runs here without touching QGIS objects.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .alternatives import MAX_DETOUR, route_alternatives
+from .cache import RouteCache, route_many_cached
+from .cluster import kmeans
+from .parallel import route_many_parallel
+from .sampling import AdaptiveSampler, route_adaptive
+from .usage import corridor_usage
+
+
+ODResult = namedtuple('ODResult', ['routes', 'usage', 'sampler', 'cache_summary', 'origin_nodes', 'dest_nodes',
+                                   'probability'])
+
+
+def representatives(xy, k, seed=None):
+    """
+    At most `k` representative points for an (n, 2) array and how many input
+    points each one stands for. Inputs with no more than k points are kept.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    if len(xy) <= k:
+        return xy, np.ones(len(xy))
+    res = kmeans(xy, k, seed=seed)
+    return res.centers, res.counts
+
+
+def density_at(nodes, node_density):
+    """Density at matched graph nodes; unmatched entries (-1) get 0."""
+    nodes = np.asarray(nodes)
+    return np.where(nodes >= 0, node_density[nodes], 0.0)
+
+
+def route_od(graph, origin_xy, dest_xy, origin_w, dest_w, jnodes, threshold,
+             workers=None, adaptive=False, adaptive_tol=0.02, seed=None, cache_path='',
+             alternatives=1, max_detour=MAX_DETOUR, progress=None, is_canceled=None):
+    """
+    Route every representative origin to every representative destination.
+
+    Points are snapped to their nearest graph nodes. With `adaptive` the pairs
+    are drawn by an AdaptiveSampler that stops once the top corridors and the
+    junctions at or above `threshold` (through `jnodes`, the junction -> node
+    match) stop changing. A `cache_path` puts a RouteCache in front of the
+    search. With `alternatives` above 1 every pair gets up to that many
+    routes within `max_detour` of its shortest path (see
+    alternatives.route_alternatives), weighted by their probabilities in the
+    usage counts; those runs route all pairs and skip the sampler and the
+    cache. Returns an ODResult with the snapped origin / destination nodes;
+    `sampler` is None unless adaptive, `probability` (one per route) None
+    unless alternatives are on.
+    """
+    origin_xy = np.asarray(origin_xy, dtype=np.float64).reshape(-1, 2)
+    dest_xy = np.asarray(dest_xy, dtype=np.float64).reshape(-1, 2)
+    onodes = graph.nearest_nodes(origin_xy[:, 0], origin_xy[:, 1])
+    dnodes = graph.nearest_nodes(dest_xy[:, 0], dest_xy[:, 1])
+    if alternatives > 1:
+        routes, prob = route_alternatives(graph, onodes, dnodes, k=alternatives, max_detour=max_detour,
+                                          workers=workers, progress=progress, is_canceled=is_canceled)
+        return ODResult(routes, corridor_usage(graph, routes, prob), None, '', onodes, dnodes, prob)
+    # unchanged pairs from earlier runs on the same network come from the route cache
+    cache = RouteCache(cache_path, graph) if cache_path else None
+    try:
+        if adaptive:
+            # one batch offers every origin stratum roughly one new destination
+            sampler = AdaptiveSampler(origin_w, dest_w, batch_pairs=max(len(origin_xy), 10),
+                                      tol=adaptive_tol, seed=seed)
+            routes, usage = route_adaptive(
+                graph, onodes, dnodes, sampler,
+                lambda u: density_at(jnodes, u.node_density()) >= threshold,
+                progress=progress, is_canceled=is_canceled, cache=cache)
+            return ODResult(routes, usage, sampler, cache.summary() if cache else '', onodes, dnodes, None)
+
+        # one one-to-many search per origin, spread over the worker pool
+        if cache is not None:
+            routes = route_many_cached(graph, onodes, dnodes, cache, workers=workers,
+                                       progress=progress, is_canceled=is_canceled)
+        else:
+            routes = route_many_parallel(graph, onodes, dnodes, workers=workers,
+                                         progress=progress, is_canceled=is_canceled)
+        return ODResult(routes, corridor_usage(graph, routes), None, cache.summary() if cache else '',
+                        onodes, dnodes, None)
+    finally:
+        if cache is not None:
+            cache.close()
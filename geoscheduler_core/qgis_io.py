@@ -0,0 +1,259 @@
+"""
+QGIS side of the core engine: turns layers into plain arrays and back.
+This is the only module of geoscheduler_core that imports qgis.
+"""
+import os
+
+import numpy as np
+from qgis.core import (
+    QgsCsException, QgsFeatureRequest, QgsFillSymbol, QgsGeometry, QgsLineString, QgsPointXY, QgsProperty,
+    QgsRectangle, QgsRuleBasedRenderer, QgsSymbolLayer, QgsVectorDataProvider, NULL
+)
+
+from .graph import RoadGraph
+
+
+# features per changeAttributeValues call
+WRITE_CHUNK = 5000
+
+
+class AttributeWriteError(Exception):
+    """Attribute changes were refused; `written` features had already been committed."""
+
+    def __init__(self, message, written=0):
+        super().__init__(message)
+        self.written = written
+
+
+def _polyline_parts(geom):
+    if geom.isMultipart():
+        return geom.asMultiPolyline()
+    return [geom.asPolyline()]
+
+
+def graph_from_layer(layer, precision=6):
+    """Build a RoadGraph from a line layer (or feature source); fids kept on graph.feature_ids."""
+    request = QgsFeatureRequest().setNoAttributes()
+    fids = []
+
+    def parts():
+        for feat in layer.getFeatures(request):
+            geom = feat.geometry()
+            if not geom or geom.isEmpty():
+                continue
+            idx = len(fids)
+            fids.append(feat.id())
+            yield idx, [[(p.x(), p.y()) for p in part] for part in _polyline_parts(geom)]
+
+    graph = RoadGraph.from_polylines(parts(), precision=precision)
+    graph.feature_ids = fids
+    return graph
+
+
+def tile_loader(layer):
+    """
+    load_tile callable for tiling.route_tiled: yields (fid, parts) for the
+    features of a line layer (or feature source) intersecting a rectangle.
+    """
+    def load(rect):
+        request = QgsFeatureRequest().setFilterRect(QgsRectangle(*rect)).setNoAttributes()
+        for feat in layer.getFeatures(request):
+            geom = feat.geometry()
+            if not geom or geom.isEmpty():
+                continue
+            yield feat.id(), [[(p.x(), p.y()) for p in part] for part in _polyline_parts(geom)]
+    return load
+
+
+def feature_values(layer, field_index, fids):
+    """Values of one attribute for `fids`, in that order (None where missing); geometry is not read."""
+    request = QgsFeatureRequest().setFilterFids(list(fids))
+    request.setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([field_index])
+    found = {}
+    for feat in layer.getFeatures(request):
+        value = feat.attributes()[field_index]
+        # NULL comes back as a QVariant that is not None
+        found[feat.id()] = None if value is None or value == NULL else value
+    return [found.get(fid) for fid in fids]
+
+
+def point_arrays(layer):
+    """(fids, xs, ys) for a point layer or feature source, geometry only."""
+    fids, xs, ys = [], [], []
+    for feat in layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        geom = feat.geometry()
+        if not geom or geom.isEmpty():
+            continue
+        pt = geom.asPoint()
+        fids.append(feat.id())
+        xs.append(pt.x())
+        ys.append(pt.y())
+    return fids, np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+
+
+def zone_centroids(source, transform, is_canceled=None):
+    """
+    (n, 2) array of polygon centroids, transformed into the target CRS.
+    Only geometries are read, and all points are transformed in one call.
+    """
+    xs, ys = [], []
+    for feat in source.getFeatures(QgsFeatureRequest().setNoAttributes()):
+        if is_canceled and is_canceled():
+            break
+        geom = feat.geometry()
+        if geom.isEmpty():
+            continue
+        c = geom.centroid()
+        if c.isEmpty():
+            continue
+        pt = c.constGet()
+        xs.append(pt.x())
+        ys.append(pt.y())
+    return transform_xy(transform, xs, ys)
+
+
+def transform_xy(transform, xs, ys):
+    """Transform coordinate lists into an (n, 2) array with one QgsCoordinateTransform call."""
+    if xs and not transform.isShortCircuited():
+        coords = QgsLineString(xs, ys)
+        try:
+            coords.transform(transform)
+            xs, ys = coords.xVector(), coords.yVector()
+        except QgsCsException:
+            # some points lie outside the target CRS: transform one by one and drop those
+            kept = []
+            for x, y in zip(xs, ys):
+                try:
+                    pt = transform.transform(QgsPointXY(x, y))
+                except QgsCsException:
+                    continue
+                kept.append((pt.x(), pt.y()))
+            return np.asarray(kept, dtype=np.float64).reshape(-1, 2)
+    return np.column_stack((np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)))
+
+
+def _source_mtime(layer):
+    path = layer.source().split('|')[0]
+    return os.path.getmtime(path) if os.path.isfile(path) else None
+
+
+class CentroidCache:
+    """
+    Zone centroids per layer and target CRS, kept between runs of a dialog.
+    Entries are dropped when the layer reports a data or CRS change and miss
+    when the underlying file has been modified, filtered or reprojected.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.watched = set()
+
+    def key(self, layer, crs):
+        return (layer.id(), layer.crs().toWkt(), crs.toWkt(), layer.subsetString(), _source_mtime(layer))
+
+    def get(self, layer, crs):
+        return self.entries.get(self.key(layer, crs))
+
+    def put(self, layer, crs, xy):
+        if xy is None:
+            return
+        try:
+            key = self.key(layer, crs)
+        except RuntimeError:
+            # layer deleted while the run was going
+            return
+        self.entries[key] = xy
+        lid = layer.id()
+        if lid not in self.watched:
+            self.watched.add(lid)
+            layer.dataChanged.connect(lambda: self.invalidate(lid))
+            layer.crsChanged.connect(lambda: self.invalidate(lid))
+            layer.willBeDeleted.connect(lambda: self.invalidate(lid))
+
+    def invalidate(self, layer_id):
+        self.entries = {k: v for k, v in self.entries.items() if k[0] != layer_id}
+
+
+def route_geometry(graph, route):
+    return QgsGeometry.fromPolylineXY(
+        [QgsPointXY(float(graph.node_x[n]), float(graph.node_y[n])) for n in route.nodes])
+
+
+def density_grid_renderer(levels, ramp='Reds'):
+    """
+    Rule-based renderer for a binned density layer: one rule per
+    (level, from_scale, to_scale), so only the level matching the map scale
+    is drawn. Cells are filled from the `ramp` colour ramp by density.
+    """
+    root = QgsRuleBasedRenderer.Rule(None)
+    for level, from_scale, to_scale in levels:
+        symbol = QgsFillSymbol.createSimple({'outline_style': 'no'})
+        symbol.symbolLayer(0).setDataDefinedProperty(
+            QgsSymbolLayer.PropertyFillColor, QgsProperty.fromExpression(f"ramp_color('{ramp}', \"density\")"))
+        # QGIS names the zoomed-in limit the maximum scale and the zoomed-out one the minimum
+        root.appendChild(QgsRuleBasedRenderer.Rule(
+            symbol, int(from_scale), int(to_scale), f'"level" = {int(level)}', f'Level {int(level)}'))
+    return QgsRuleBasedRenderer(root)
+
+
+def _changed_values(layer, values):
+    """Drop the values that already hold in the layer."""
+    indexes = sorted({idx for attrs in values.values() for idx in attrs})
+    request = QgsFeatureRequest().setFilterFids(list(values))
+    request.setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes(indexes)
+    changes = {}
+    for feat in layer.getFeatures(request):
+        attrs = feat.attributes()
+        diff = {idx: val for idx, val in values[feat.id()].items() if attrs[idx] != val}
+        if diff:
+            changes[feat.id()] = diff
+    return changes
+
+
+def write_attribute_values(layer, values, chunk_size=WRITE_CHUNK, reload=True):
+    """
+    Write {fid: {field_index: value}} to a layer and return the number of
+    features that changed. Values already stored are skipped; the rest go to
+    the provider with batched changeAttributeValues calls, after which the
+    layer is reloaded so attribute tables and expressions see the new values.
+    With `reload` false (frequent live updates) the layer is only repainted:
+    the renderer reads from the provider, while a reload would also refetch
+    every open attribute table on each call.
+    Layers whose provider cannot change attributes, or that are in edit mode,
+    are written through the edit buffer instead. Raises AttributeWriteError
+    when the provider or the edit buffer refuses the changes; chunks written
+    before a refused one stay committed.
+    """
+    changes = _changed_values(layer, values)
+    if not changes:
+        return 0
+    provider = layer.dataProvider()
+    if layer.isEditable() or not provider.capabilities() & QgsVectorDataProvider.ChangeAttributeValues:
+        was_editing = layer.isEditable()
+        if not was_editing and not layer.startEditing():
+            raise AttributeWriteError(f'Layer {layer.name()} cannot be edited')
+        for fid, attrs in changes.items():
+            for idx, val in attrs.items():
+                layer.changeAttributeValue(fid, idx, val)
+        if not was_editing and not layer.commitChanges():
+            errors = '; '.join(layer.commitErrors())
+            layer.rollBack()
+            raise AttributeWriteError(f'Layer {layer.name()} refused the changes: {errors}')
+        return len(changes)
+    fids = list(changes)
+    written = 0
+    try:
+        for start in range(0, len(fids), chunk_size):
+            chunk = {fid: changes[fid] for fid in fids[start:start + chunk_size]}
+            if not provider.changeAttributeValues(chunk):
+                errors = '; '.join(provider.errors()[-3:]) if provider.hasErrors() else 'no details'
+                raise AttributeWriteError(
+                    f'Layer {layer.name()} refused attribute changes after {written} of {len(fids)} '
+                    f'features ({errors})', written)
+            written += len(chunk)
+    finally:
+        # provider writes bypass the layer's feature cache
+        if reload:
+            layer.reload()
+        layer.triggerRepaint()
+    return written
@@ -0,0 +1,130 @@
+"""
+Run results as typed columns in one memory-mappable file next to the GeoPackage.
+
+The file holds an 8-byte magic, the header length as a little-endian uint64,
+a JSON header and then the raw little-endian data of every column at a
+64-byte aligned offset. Columns belong to tables (nodes, junctions,
+features, ...) and all columns of a table have the same length. Opening a
+store maps the file once with numpy.memmap; columns are views into that map,
+so nothing is parsed or copied until the values are used. Notebooks can read
+the file with numpy alone:
+
+    with ResultStore('out_results.gsr') as rs:
+        density = rs.column('junctions', 'density')
+"""
+import json
+import os
+
+import numpy as np
+
+
+MAGIC = b'GSRES001'
+ALIGN = 64
+STORE_SUFFIX = '_results.gsr'
+
+
+def store_path(gpkg_path):
+    """The result store belonging to a GeoPackage output."""
+    return os.path.splitext(gpkg_path)[0] + STORE_SUFFIX
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def write_results(path, tables, meta=None):
+    """
+    Write `tables`, a {table: {column: 1-d array}} dict, and a JSON-serialisable
+    `meta` dict to `path`. The file is written next to the target and moved
+    into place, so readers never see a half-written store.
+    """
+    columns, data = {}, []
+    offset = 0
+    for table, cols in tables.items():
+        lengths = {name: len(values) for name, values in cols.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f'Columns of table {table} differ in length: {lengths}')
+        for name, values in cols.items():
+            arr = np.ascontiguousarray(values)
+            if arr.ndim != 1 or arr.dtype.hasobject:
+                raise ValueError(f'Column {table}.{name} must be a 1-d numeric array')
+            arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+            offset = _aligned(offset)
+            columns[f'{table}.{name}'] = {'dtype': arr.dtype.str, 'length': len(arr), 'offset': offset}
+            data.append((offset, arr))
+            offset += arr.nbytes
+
+    header = json.dumps({'columns': columns, 'meta': meta or {}}).encode('utf-8')
+    start = _aligned(len(MAGIC) + 8 + len(header))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(MAGIC)
+        fh.write(np.uint64(len(header)).astype('<u8').tobytes())
+        fh.write(header)
+        for off, arr in data:
+            fh.seek(start + off)
+            fh.write(arr.tobytes())
+        # the last column may be empty; keep the file as long as the header says
+        fh.truncate(start + offset)
+    os.replace(tmp, path)
+    return path
+
+
+class ResultStore:
+    """
+    Read-only view of a file written by write_results. Close it and drop the
+    columns taken from it before the same path is written again; on Windows
+    a mapped file cannot be replaced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a GeoScheduler result store')
+            size = int(np.frombuffer(fh.read(8), dtype='<u8')[0])
+            header = json.loads(fh.read(size).decode('utf-8'))
+        self.meta = header['meta']
+        self._columns = header['columns']
+        self._start = _aligned(len(MAGIC) + 8 + size)
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # arrays handed out earlier keep the mapping alive until they are dropped
+        self._map = None
+
+    def tables(self):
+        return sorted({key.split('.', 1)[0] for key in self._columns})
+
+    def columns(self, table):
+        prefix = table + '.'
+        return [key[len(prefix):] for key in self._columns if key.startswith(prefix)]
+
+    def length(self, table):
+        """Rows in `table` (0 for a table the store does not have)."""
+        for key, spec in self._columns.items():
+            if key.startswith(table + '.'):
+                return spec['length']
+        return 0
+
+    def column(self, table, name):
+        """A read-only array backed by the file."""
+        if self._map is None:
+            raise ValueError(f'{self.path} is closed')
+        try:
+            spec = self._columns[f'{table}.{name}']
+        except KeyError:
+            raise KeyError(f'No column {table}.{name} in {self.path}') from None
+        dtype = np.dtype(spec['dtype'])
+        begin = self._start + spec['offset']
+        return self._map[begin:begin + spec['length'] * dtype.itemsize].view(dtype)
+
+    def table(self, table):
+        """{column: array} for every column of `table`."""
+        return {name: self.column(table, name) for name in self.columns(table)}
@@ -0,0 +1,162 @@
+"""
+Adaptive OD sampling: pairs are drawn in batches, stratified by origin zone
+and weighted by zone size, and routing stops once the corridor picture stops
+moving. After each batch the top-N edges by usage and the set of junctions
+marked as used are compared with the previous batch; when both change less
+than `tol` for `patience` batches in a row the run is considered converged.
+"""
+import numpy as np
+
+from .graph import Route, RoutingCanceled
+from .usage import CorridorUsage
+
+
+def _jaccard_change(a, b):
+    if not a and not b:
+        return 0.0
+    return 1.0 - len(a & b) / float(len(a | b))
+
+
+class AdaptiveSampler:
+    def __init__(self, origin_weights, dest_weights, batch_pairs=25, top_n=50,
+                 tol=0.02, patience=2, seed=None):
+        self.wo = np.asarray(origin_weights, dtype=np.float64)
+        self.wd = np.asarray(dest_weights, dtype=np.float64)
+        self.batch_pairs = int(batch_pairs)
+        self.top_n = int(top_n)
+        self.tol = float(tol)
+        self.patience = int(patience)
+        self.rng = np.random.default_rng(seed)
+        # destinations not drawn yet, per origin
+        self.remaining = [np.arange(len(self.wd)) for _ in range(len(self.wo))]
+        self.drawn = 0
+        self.batches = 0
+        self.stable = 0
+        self.last_change = 1.0
+        self.converged = False
+        self._top = None
+        self._used = None
+
+    @property
+    def total_pairs(self):
+        return len(self.wo) * len(self.wd)
+
+    @property
+    def confidence(self):
+        """1 - the largest relative change seen in the last batch."""
+        return max(0.0, 1.0 - self.last_change)
+
+    def drawn_mask(self):
+        """Boolean (origins x destinations) mask of the pairs drawn so far."""
+        mask = np.ones((len(self.wo), len(self.wd)), dtype=bool)
+        for oi, rest in enumerate(self.remaining):
+            mask[oi, rest] = False
+        return mask
+
+    def _allocate(self, slots):
+        # slots per origin stratum in proportion to its weight (largest remainder)
+        open_ = np.array([len(r) > 0 for r in self.remaining])
+        if not open_.any():
+            return np.zeros(len(self.wo), dtype=np.int64)
+        w = np.where(open_, self.wo, 0.0)
+        w = w / w.sum() if w.sum() > 0 else open_ / float(open_.sum())
+        share = w * slots
+        alloc = np.floor(share).astype(np.int64)
+        rest = slots - alloc.sum()
+        if rest > 0:
+            order = np.argsort(share - alloc)[::-1]
+            alloc[order[:rest]] += 1
+        cap = np.array([len(r) for r in self.remaining])
+        return np.minimum(alloc, cap)
+
+    def next_batch(self):
+        """List of (origin_index, dest_index) pairs not routed yet."""
+        if self.converged:
+            return []
+        left = self.total_pairs - self.drawn
+        if left <= 0:
+            return []
+        alloc = self._allocate(min(self.batch_pairs, left))
+        if alloc.sum() == 0:
+            # tiny weights rounded away: take one pair from every open stratum
+            alloc = np.array([1 if len(r) else 0 for r in self.remaining])
+        pairs = []
+        for oi, n in enumerate(alloc):
+            if n <= 0:
+                continue
+            cand = self.remaining[oi]
+            p = self.wd[cand]
+            p = p / p.sum() if p.sum() > 0 else None
+            pick = self.rng.choice(len(cand), size=int(n), replace=False, p=p)
+            pairs.extend((oi, int(cand[j])) for j in pick)
+            self.remaining[oi] = np.delete(cand, pick)
+        self.drawn += len(pairs)
+        return pairs
+
+    def update(self, edge_counts, used_junctions):
+        """
+        Record the state after a batch. `used_junctions` is a boolean mask over
+        junctions. Returns True once the rankings have converged.
+        """
+        nz = np.count_nonzero(edge_counts)
+        n = min(self.top_n, nz)
+        top = set(np.argpartition(edge_counts, -n)[-n:].tolist()) if n else set()
+        used = set(np.nonzero(used_junctions)[0].tolist())
+        self.batches += 1
+        if self._top is not None:
+            self.last_change = max(_jaccard_change(top, self._top),
+                                   _jaccard_change(used, self._used))
+            self.stable = self.stable + 1 if self.last_change <= self.tol else 0
+            self.converged = self.stable >= self.patience
+        self._top, self._used = top, used
+        return self.converged
+
+
+def route_adaptive(graph, origin_nodes, dest_nodes, sampler, used_fn, progress=None,
+                   is_canceled=None, cache=None):
+    """
+    Route batches drawn from `sampler` until it converges or runs out of pairs.
+    `used_fn(usage)` returns the boolean junction mask for the current usage.
+    Pairs found in an optional RouteCache are not routed again.
+    Returns (routes, usage).
+    """
+    usage = CorridorUsage(graph)
+    routes = []
+    while True:
+        batch = sampler.next_batch()
+        if not batch:
+            break
+        by_origin = {}
+        for oi, di in batch:
+            by_origin.setdefault(oi, []).append(di)
+        for oi, dis in by_origin.items():
+            if is_canceled and is_canceled():
+                raise RoutingCanceled()
+            onode = int(origin_nodes[oi])
+            todo = []
+            for di in dis:
+                hit = cache.get(onode, dest_nodes[di]) if cache is not None else None
+                if cache is None or hit is cache.MISSING:
+                    todo.append(di)
+                elif hit is not None:
+                    route = Route(oi, di, hit[0], hit[1], hit[2])
+                    routes.append(route)
+                    usage.add_route(route)
+            if not todo:
+                continue
+            targets = [int(dest_nodes[di]) for di in todo]
+            tree = graph.shortest_path_tree(onode, targets=targets)
+            for di, dnode in zip(todo, targets):
+                res = tree.path(dnode)
+                if cache is not None:
+                    cache.put(onode, dnode, res[1] if res else None, tree.dist[dnode] if res else None)
+                if res is None:
+                    continue
+                route = Route(oi, di, res[0], res[1], tree.dist[dnode])
+                routes.append(route)
+                usage.add_route(route)
+        if progress:
+            progress(sampler.drawn, sampler.total_pairs)
+        if sampler.update(usage.edge_counts, used_fn(usage)):
+            break
+    return routes, usage
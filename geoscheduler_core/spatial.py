@@ -0,0 +1,89 @@
+"""
+Uniform grid hash over a point set for batch nearest-neighbour queries.
+
+Points are bucketed by cell and sorted by cell key once; a batch query then
+scans the 3x3 block of cells around every query point with vectorised
+searchsorted ranges, so lookups never fall back to a nested Python scan.
+"""
+import numpy as np
+
+
+class GridIndex:
+    def __init__(self, xs, ys, cell_size):
+        if cell_size <= 0:
+            raise ValueError('cell_size must be positive')
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.cell = float(cell_size)
+        if len(self.xs):
+            self.x0 = float(self.xs.min())
+            self.y0 = float(self.ys.min())
+        else:
+            self.x0 = self.y0 = 0.0
+        cx, cy = self._cells(self.xs, self.ys)
+        self.ncols = int(cx.max()) + 3 if len(cx) else 3
+        keys = self._key(cx, cy)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def _cells(self, xs, ys):
+        cx = np.floor((xs - self.x0) / self.cell).astype(np.int64)
+        cy = np.floor((ys - self.y0) / self.cell).astype(np.int64)
+        return cx, cy
+
+    def _key(self, cx, cy):
+        # +1 keeps the neighbours of column 0 non-negative
+        return (cy + 1) * self.ncols + (cx + 1)
+
+    def nearest(self, qx, qy, max_dist=None):
+        """
+        Index of the nearest indexed point for each query and its distance
+        (the lowest index on ties). Only the surrounding 3x3 cells are scanned,
+        so `max_dist` may not exceed the cell size; queries with nothing in
+        reach get index -1 and inf.
+        """
+        max_dist = self.cell if max_dist is None else float(max_dist)
+        if max_dist > self.cell:
+            raise ValueError('max_dist larger than the grid cell size')
+        qx = np.asarray(qx, dtype=np.float64)
+        qy = np.asarray(qy, dtype=np.float64)
+        best = np.full(len(qx), -1, dtype=np.int64)
+        best_d2 = np.full(len(qx), np.inf)
+        if not len(self.xs) or not len(qx):
+            return best, np.sqrt(best_d2)
+
+        cx, cy = self._cells(qx, qy)
+        inside = (cx >= -1) & (cy >= -1) & (cx <= self.ncols - 2)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._key(cx + dx, cy + dy)
+                lo = np.searchsorted(self.sorted_keys, keys, side='left')
+                hi = np.searchsorted(self.sorted_keys, keys, side='right')
+                span = np.where(inside, hi - lo, 0)
+                # walk the k-th candidate of every cell at once
+                for k in range(int(span.max()) if len(span) else 0):
+                    q = np.nonzero(span > k)[0]
+                    cand = self.order[lo[q] + k]
+                    d2 = (self.xs[cand] - qx[q]) ** 2 + (self.ys[cand] - qy[q]) ** 2
+                    better = (d2 < best_d2[q]) | ((d2 == best_d2[q]) & (cand < best[q]))
+                    best_d2[q[better]] = d2[better]
+                    best[q[better]] = cand[better]
+
+        too_far = best_d2 > max_dist * max_dist
+        best[too_far] = -1
+        best_d2[too_far] = np.inf
+        return best, np.sqrt(best_d2)
+
+
+def match_points(src_x, src_y, query_x, query_y, tolerance):
+    """Nearest source point within `tolerance` for every query point (-1 if none)."""
+    tolerance = max(float(tolerance), 1e-9)
+    src_x = np.asarray(src_x, dtype=np.float64)
+    src_y = np.asarray(src_y, dtype=np.float64)
+    cell = tolerance
+    if len(src_x):
+        # keep the cell count bounded so int64 cell keys cannot overflow
+        span = max(np.ptp(src_x), np.ptp(src_y))
+        cell = max(cell, span / 1e6)
+    idx, _ = GridIndex(src_x, src_y, cell).nearest(query_x, query_y, tolerance)
+    return idx
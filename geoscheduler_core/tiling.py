@@ -0,0 +1,321 @@
+"""
+Tiled routing for networks too large to hold in memory at once.
+
+The network extent is cut into square tiles and every road segment belongs to
+the tile containing its midpoint. Nodes shared by segments of different tiles
+are boundary nodes. Each tile is loaded on its own (through `load_tile`, e.g.
+a filterRect request) to compute shortest distances between its boundary
+nodes; those distances form a small overlay graph. A route then leaves its
+origin tile through a boundary node, crosses the overlay and enters its
+destination tile, which gives the same cost as routing on the full network
+because every path splits into single-tile pieces between boundary nodes.
+
+Routing happens in three passes over the tiles:
+  1. boundary overlay, snapping of OD points and junctions, and the legs
+     from every origin / destination to the boundary of its tile;
+  2. overlay search per origin, choosing for each pair the best boundary
+     crossing (or a path inside a shared tile);
+  3. every tile is loaded once more and the route pieces inside it are
+     expanded into segment counts.
+Only one tile graph is alive at a time; what is kept between tiles grows with
+the number of boundary nodes, OD points and used nodes, not with the city.
+
+The overlay is all-pairs within a tile: a tile with B boundary nodes runs B
+searches and keeps up to B (B - 1) / 2 distances (one dict entry each) for
+the whole run. B grows with the tile side and the number of streets crossing
+its border, so the tile size trades the largest tile graph held in memory
+against the overlay size: halving it roughly halves B per tile but doubles
+the total border length.
+"""
+import heapq
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from .graph import RoadGraph, RoutingCanceled
+from .spatial import match_points
+
+
+TiledResult = namedtuple('TiledResult', [
+    'node_x', 'node_y', 'node_counts', 'node_density', 'junction_density',
+    'feature_counts', 'costs', 'route_count', 'tile_count', 'boundary_count'])
+
+
+class TileGrid:
+    def __init__(self, extent, tile_size):
+        if tile_size <= 0:
+            raise ValueError('tile_size must be positive')
+        self.xmin, self.ymin, xmax, ymax = (float(v) for v in extent)
+        self.size = float(tile_size)
+        self.cols = max(1, int(np.ceil((xmax - self.xmin) / self.size)))
+        self.rows = max(1, int(np.ceil((ymax - self.ymin) / self.size)))
+
+    def __len__(self):
+        return self.cols * self.rows
+
+    def tile_of(self, xs, ys):
+        """Tile index per point; points outside the extent go to the nearest edge tile."""
+        cx = np.clip(np.floor((np.asarray(xs) - self.xmin) / self.size), 0, self.cols - 1)
+        cy = np.clip(np.floor((np.asarray(ys) - self.ymin) / self.size), 0, self.rows - 1)
+        return (cy * self.cols + cx).astype(np.int64)
+
+    def rect(self, tile):
+        cy, cx = divmod(int(tile), self.cols)
+        x0 = self.xmin + cx * self.size
+        y0 = self.ymin + cy * self.size
+        return x0, y0, x0 + self.size, y0 + self.size
+
+    def center(self, tile):
+        x0, y0, x1, y1 = self.rect(tile)
+        return (x0 + x1) / 2.0, (y0 + y1) / 2.0
+
+
+class _Tile:
+    """Graph of the segments owned by one tile, plus its boundary nodes."""
+
+    def __init__(self, grid, tile, load_tile, precision):
+        fids = []
+
+        def parts():
+            for fid, feature_parts in load_tile(grid.rect(tile)):
+                fids.append(fid)
+                yield len(fids) - 1, feature_parts
+
+        full = RoadGraph.from_polylines(parts(), precision=precision)
+        mx = (full.node_x[full.edge_u] + full.node_x[full.edge_v]) / 2.0
+        my = (full.node_y[full.edge_u] + full.node_y[full.edge_v]) / 2.0
+        owned = grid.tile_of(mx, my) == tile
+
+        # boundary: touches a segment of another tile or lies outside this tile
+        foreign = np.zeros(full.node_count, dtype=bool)
+        foreign[full.edge_u[~owned]] = True
+        foreign[full.edge_v[~owned]] = True
+        foreign |= grid.tile_of(full.node_x, full.node_y) != tile
+
+        used = np.zeros(full.node_count, dtype=bool)
+        used[full.edge_u[owned]] = True
+        used[full.edge_v[owned]] = True
+        remap = np.cumsum(used) - 1
+        self.graph = RoadGraph(full.node_x[used], full.node_y[used],
+                               remap[full.edge_u[owned]], remap[full.edge_v[owned]],
+                               full.edge_length[owned], full.edge_feature[owned])
+        self.fids = fids
+        self.boundary = np.nonzero(foreign[used])[0]
+
+    def key(self, node):
+        return (float(self.graph.node_x[node]), float(self.graph.node_y[node]))
+
+    def nearest(self, xs, ys):
+        return self.graph.nearest_nodes(xs, ys) if len(xs) else np.zeros(0, dtype=np.int64)
+
+    def legs(self, node, extra=()):
+        """Distances from `node` to the tile's boundary nodes (by key) and to `extra` nodes."""
+        targets = [int(b) for b in self.boundary] + [int(t) for t in extra]
+        tree = self.graph.shortest_path_tree(int(node), targets=targets or None)
+        to_boundary = {self.key(b): tree.dist[b] for b in self.boundary if tree.reached(b)}
+        return to_boundary, [tree.dist[int(t)] for t in extra]
+
+
+def _multi_source(indptr, arc_target, arc_edge, length, seeds):
+    """Dijkstra from several (node, start distance) seeds; returns (dist, pred_edge, pred_node)."""
+    n = len(indptr) - 1
+    dist = [float('inf')] * n
+    pred_edge = [-1] * n
+    pred_node = [-1] * n
+    heap = []
+    for node, d in seeds:
+        if d < dist[node]:
+            dist[node] = d
+            heap.append((d, node))
+    heapq.heapify(heap)
+    done = [False] * n
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        for a in range(indptr[u], indptr[u + 1]):
+            v = arc_target[a]
+            nd = d + length[arc_edge[a]]
+            if nd < dist[v]:
+                dist[v] = nd
+                pred_edge[v] = arc_edge[a]
+                pred_node[v] = u
+                heapq.heappush(heap, (nd, v))
+    return dist, pred_edge, pred_node
+
+
+def route_tiled(load_tile, extent, tile_size, origin_xy, dest_xy, junction_xy=None,
+                snap_tolerance=1e-6, precision=6, progress=None, is_canceled=None):
+    """
+    Route every origin to every destination tile by tile. `load_tile(rect)`
+    yields (feature_id, parts) for the road features intersecting the
+    (xmin, ymin, xmax, ymax) rectangle. Returns a TiledResult: counts and
+    density for every used node (by coordinates), the corridor density of
+    each junction, per road feature route counts and the pair costs.
+
+    OD points snap to the nearest node of the tile they fall in (or of the
+    nearest tile with roads), which can differ from the nearest node of the
+    whole network for points close to a tile border.
+    """
+    grid = TileGrid(extent, tile_size)
+    origin_xy = np.asarray(origin_xy, dtype=np.float64).reshape(-1, 2)
+    dest_xy = np.asarray(dest_xy, dtype=np.float64).reshape(-1, 2)
+    junction_xy = np.zeros((0, 2)) if junction_xy is None else np.asarray(junction_xy, dtype=np.float64).reshape(-1, 2)
+    n_o, n_d = len(origin_xy), len(dest_xy)
+    total = 2 * len(grid) + n_o
+    step = [0]
+
+    def tick():
+        step[0] += 1
+        if progress:
+            progress(step[0], total)
+        if is_canceled and is_canceled():
+            raise RoutingCanceled()
+
+    o_tile = grid.tile_of(origin_xy[:, 0], origin_xy[:, 1])
+    d_tile = grid.tile_of(dest_xy[:, 0], dest_xy[:, 1])
+    j_tile = grid.tile_of(junction_xy[:, 0], junction_xy[:, 1])
+    o_key, d_key = [None] * n_o, [None] * n_d
+    o_leg, d_leg = [{} for _ in range(n_o)], [{} for _ in range(n_d)]
+    direct = {}
+    junction_key = [None] * len(junction_xy)
+    overlay = {}
+    nonempty = []
+
+    def snap_points(tile, t, os_, ds_):
+        # snap OD points to the tile's nodes and measure their legs to the boundary
+        onodes = t.nearest(origin_xy[os_, 0], origin_xy[os_, 1])
+        dnodes = t.nearest(dest_xy[ds_, 0], dest_xy[ds_, 1])
+        for di, node in zip(ds_, dnodes):
+            d_key[di] = t.key(node)
+            d_leg[di], _ = t.legs(node)
+        for oi, node in zip(os_, onodes):
+            o_key[oi] = t.key(node)
+            o_leg[oi], dd = t.legs(node, dnodes)
+            for di, d in zip(ds_, dd):
+                if d != float('inf'):
+                    direct[(int(oi), int(di))] = (tile, d)
+
+    # pass 1: boundary overlay, snapping and legs
+    for tile in range(len(grid)):
+        t = _Tile(grid, tile, load_tile, precision)
+        if t.graph.edge_count:
+            nonempty.append(tile)
+            for b in t.boundary:
+                tree = t.graph.shortest_path_tree(int(b), targets=[int(c) for c in t.boundary])
+                kb = t.key(b)
+                for c in t.boundary:
+                    if c > b and tree.reached(c):
+                        kc = t.key(c)
+                        if tree.dist[c] < overlay.get((kb, kc, tile), float('inf')):
+                            overlay[(kb, kc, tile)] = tree.dist[c]
+            snap_points(tile, t, np.nonzero(o_tile == tile)[0], np.nonzero(d_tile == tile)[0])
+            js = np.nonzero(j_tile == tile)[0]
+            if len(js):
+                jn = match_points(t.graph.node_x, t.graph.node_y,
+                                  junction_xy[js, 0], junction_xy[js, 1], snap_tolerance)
+                for ji, node in zip(js, jn):
+                    if node >= 0:
+                        junction_key[ji] = t.key(node)
+        tick()
+
+    # OD points in tiles without roads are moved to the nearest tile that has some
+    if nonempty:
+        centers = np.array([grid.center(t) for t in nonempty])
+        for tiles, xy in ((o_tile, origin_xy), (d_tile, dest_xy)):
+            empty = ~np.isin(tiles, nonempty)
+            if empty.any():
+                near = ((xy[empty, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+                tiles[empty] = np.asarray(nonempty)[near]
+        moved = sorted(set(o_tile[[k is None for k in o_key]].tolist()) |
+                       set(d_tile[[k is None for k in d_key]].tolist()))
+        for tile in moved:
+            # redo the whole tile so pairs sharing it get their direct paths
+            t = _Tile(grid, tile, load_tile, precision)
+            snap_points(tile, t, np.nonzero(o_tile == tile)[0], np.nonzero(d_tile == tile)[0])
+
+    # pass 2: overlay search per origin
+    keys = sorted({k for kb, kc, _ in overlay for k in (kb, kc)}
+                  | {k for leg in o_leg + d_leg for k in leg})
+    kid = {k: i for i, k in enumerate(keys)}
+    ov_edges = list(overlay.items())
+    ov = RoadGraph([k[0] for k in keys], [k[1] for k in keys],
+                   [kid[kb] for (kb, kc, _), _ in ov_edges], [kid[kc] for (kb, kc, _), _ in ov_edges],
+                   [d for _, d in ov_edges], [tile for (_, _, tile), _ in ov_edges])
+    indptr, arc_target, arc_edge, length = ov._adjacency()
+    pieces = {}
+    costs = np.full((n_o, n_d), np.inf)
+    touched = Counter()
+
+    def add_piece(tile, a, b):
+        if a != b:
+            pieces.setdefault(tile, Counter())[(a, b)] += 1
+
+    for oi in range(n_o):
+        dist, pred_edge, pred_node = _multi_source(
+            indptr, arc_target, arc_edge, length, [(kid[k], d) for k, d in o_leg[oi].items()])
+        for di in range(n_d):
+            best, via = float('inf'), None
+            for k, d in d_leg[di].items():
+                c = dist[kid[k]] + d
+                if c < best:
+                    best, via = c, kid[k]
+            dr = direct.get((oi, di))
+            if dr is not None and dr[1] <= best:
+                best, via = dr[1], None
+            if best == float('inf'):
+                continue
+            costs[oi, di] = best
+            touched[o_key[oi]] += 1
+            touched[d_key[di]] += 1
+            if via is None:
+                add_piece(dr[0], o_key[oi], d_key[di])
+                continue
+            add_piece(int(d_tile[di]), keys[via], d_key[di])
+            node = via
+            while pred_node[node] >= 0:
+                e = pred_edge[node]
+                add_piece(int(ov.edge_feature[e]), keys[pred_node[node]], keys[node])
+                node = pred_node[node]
+            add_piece(int(o_tile[oi]), o_key[oi], keys[node])
+        tick()
+
+    # pass 3: expand route pieces into segment counts, one tile at a time
+    feature_counts = {}
+    for tile in range(len(grid)):
+        demand = pieces.get(tile)
+        if demand:
+            t = _Tile(grid, tile, load_tile, precision)
+            g = t.graph
+            local = {t.key(n): n for n in range(g.node_count)}
+            counts = np.zeros(g.edge_count, dtype=np.int64)
+            by_source = {}
+            for (a, b), mult in demand.items():
+                by_source.setdefault(a, []).append((b, mult))
+            for a, targets in by_source.items():
+                tree = g.shortest_path_tree(local[a], targets=[local[b] for b, _ in targets])
+                for b, mult in targets:
+                    res = tree.path(local[b])
+                    if res is not None and res[1]:
+                        np.add.at(counts, np.asarray(res[1], dtype=np.int64), mult)
+            node_sum = (np.bincount(g.edge_u, weights=counts, minlength=g.node_count)
+                        + np.bincount(g.edge_v, weights=counts, minlength=g.node_count))
+            for n in np.nonzero(node_sum)[0]:
+                touched[t.key(n)] += node_sum[n]
+            per_feature = np.zeros(len(t.fids), dtype=np.int64)
+            np.maximum.at(per_feature, g.edge_feature, counts)
+            for i in np.nonzero(per_feature)[0]:
+                fid = t.fids[i]
+                feature_counts[fid] = max(feature_counts.get(fid, 0), int(per_feature[i]))
+        tick()
+
+    used = sorted(touched)
+    node_counts = np.round(np.array([touched[k] for k in used], dtype=np.float64) / 2.0).astype(np.int64)
+    top = node_counts.max() if len(node_counts) and node_counts.max() > 0 else 1
+    node_density = node_counts / float(top)
+    density_of = dict(zip(used, node_density))
+    junction_density = np.array([density_of.get(k, 0.0) if k is not None else 0.0 for k in junction_key])
+    return TiledResult(np.array([k[0] for k in used]), np.array([k[1] for k in used]),
+                       node_counts, node_density, junction_density, feature_counts, costs,
+                       int(np.isfinite(costs).sum()), len(grid), len(keys))
@@ -0,0 +1,67 @@
+"""
+Corridor usage counted on the network itself: one counter per graph edge,
+filled route by route, so memory depends on the network and not on how many
+routes were sampled. Node (junction) usage is derived from edge endpoints.
+"""
+import numpy as np
+
+
+class CorridorUsage:
+    def __init__(self, graph, weighted=False):
+        self.graph = graph
+        # weighted counts are expected routes (e.g. path probabilities), so fractional
+        dtype = np.float64 if weighted else np.int64
+        self.edge_counts = np.zeros(graph.edge_count, dtype=dtype)
+        # routes that start or end at a node touch only one of its edges
+        self.terminal_counts = np.zeros(graph.node_count, dtype=dtype)
+        self.route_count = 0
+
+    def add_route(self, route, weight=1):
+        if len(route.edges):
+            np.add.at(self.edge_counts, np.asarray(route.edges, dtype=np.int64), weight)
+        self.terminal_counts[route.nodes[0]] += weight
+        self.terminal_counts[route.nodes[-1]] += weight
+        self.route_count += 1
+
+    def add_routes(self, routes, weights=None):
+        if weights is None:
+            for route in routes:
+                self.add_route(route)
+        else:
+            for route, weight in zip(routes, weights):
+                self.add_route(route, weight)
+        return self
+
+    def node_counts(self):
+        """
+        Routes passing through each node: every route enters and leaves an
+        interior node once. Weighted counts are returned unrounded.
+        """
+        g = self.graph
+        n = g.node_count
+        touched = (np.bincount(g.edge_u, weights=self.edge_counts, minlength=n)
+                   + np.bincount(g.edge_v, weights=self.edge_counts, minlength=n)
+                   + self.terminal_counts)
+        if self.edge_counts.dtype.kind == 'f':
+            return touched / 2.0
+        return (touched / 2.0).round().astype(np.int64)
+
+    def feature_counts(self, feature_count=None):
+        """Per road feature: routes on its busiest segment."""
+        g = self.graph
+        if feature_count is None:
+            feature_count = int(g.edge_feature.max()) + 1 if g.edge_count else 0
+        out = np.zeros(feature_count, dtype=self.edge_counts.dtype)
+        np.maximum.at(out, g.edge_feature, self.edge_counts)
+        return out
+
+    def node_density(self):
+        """Node usage normalised by the busiest node (0-1)."""
+        counts = self.node_counts()
+        maxc = counts.max() if len(counts) and counts.max() > 0 else 1
+        return counts / float(maxc)
+
+
+def corridor_usage(graph, routes, weights=None):
+    """CorridorUsage of `routes`; with `weights` (one per route) the counts are weighted sums."""
+    return CorridorUsage(graph, weighted=weights is not None).add_routes(routes, weights)
@@ -0,0 +1,28 @@
+"""
+Junction weighting rule, vectorised over all junctions.
+
+A junction whose corridor density reaches the threshold is "used by
+commuters" and gets the time-of-day split; every other junction stays at an
+even 0.5 / 0.5. Only this step depends on the time mode and threshold, so the
+per-junction density from one routing run can be reweighted instantly.
+"""
+import numpy as np
+
+
+TIME_MODES = ('AM Peak', 'PM Peak', 'Off-Peak')
+
+# (N_S_Weight, E_W_Weight) for used junctions, Attr4 plugin
+NS_EW_SPLITS = {'AM Peak': (0.75, 0.25), 'PM Peak': (0.25, 0.75), 'Off-Peak': (0.5, 0.5)}
+# (Corridor_Weight, CrossTraffic_Weight) for used junctions, V3 plugin:
+# the corridor keeps priority in both peaks, it just flows the other way
+CORRIDOR_SPLITS = {'AM Peak': (0.75, 0.25), 'PM Peak': (0.75, 0.25), 'Off-Peak': (0.5, 0.5)}
+
+
+def junction_weights(density, threshold, mode, splits):
+    """(used, first, second) arrays for a density array, time mode and split table."""
+    density = np.asarray(density, dtype=np.float64)
+    used = density >= threshold
+    first, second = splits.get(mode, (0.5, 0.5))
+    a = np.where(used, first, 0.5)
+    b = np.where(used, second, 0.5)
+    return used.astype(np.int32), a, b
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# geoscheduler_core is a plain folder next to the plugins, not an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
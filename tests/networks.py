@@ -0,0 +1,67 @@
+"""
+Small synthetic road networks and brute-force references for the tests.
+"""
+import numpy as np
+
+from geoscheduler_core import RoadGraph
+
+
+def grid_lines(n, spacing=100.0, jitter=0.0, seed=0):
+    """
+    (feature_index, parts) of an n x n street grid, one polyline per street.
+    Jittered vertices give every pair a unique shortest path.
+    """
+    offset = np.random.default_rng(seed).uniform(-jitter, jitter, size=(n, n, 2))
+
+    def vertex(i, j):
+        return float(i * spacing + offset[i, j, 0]), float(j * spacing + offset[i, j, 1])
+    lines = []
+    for i in range(n):
+        lines.append([[vertex(i, j) for j in range(n)]])
+        lines.append([[vertex(j, i) for j in range(n)]])
+    return list(enumerate(lines))
+
+
+def grid_graph(n, spacing=100.0, jitter=0.0, seed=0):
+    return RoadGraph.from_polylines(grid_lines(n, spacing, jitter, seed))
+
+
+def random_costs(graph, seed=0):
+    """The same network with every edge cost scaled by a random factor."""
+    rng = np.random.default_rng(seed)
+    scaled = graph.edge_length * rng.uniform(0.5, 2.0, graph.edge_count)
+    return RoadGraph(graph.node_x, graph.node_y, graph.edge_u, graph.edge_v, scaled, graph.edge_feature)
+
+
+def reference_distances(graph, source):
+    """Shortest distances from `source` by Bellman-Ford relaxation over the edge list."""
+    dist = np.full(graph.node_count, np.inf)
+    dist[source] = 0.0
+    u, v, w = graph.edge_u, graph.edge_v, graph.edge_length
+    for _ in range(graph.node_count):
+        new = dist.copy()
+        np.minimum.at(new, v, dist[u] + w)
+        np.minimum.at(new, u, dist[v] + w)
+        if np.array_equal(new, dist):
+            break
+        dist = new
+    return dist
+
+
+def tile_loader(polylines):
+    """load_tile for route_tiled: the features whose bounding box meets the rectangle."""
+    boxes = {}
+    for fid, parts in polylines:
+        xy = np.array([p for part in parts for p in part])
+        boxes[fid] = (*xy.min(axis=0), *xy.max(axis=0))
+
+    def load(rect):
+        for fid, parts in polylines:
+            b = boxes[fid]
+            if b[0] <= rect[2] and b[2] >= rect[0] and b[1] <= rect[3] and b[3] >= rect[1]:
+                yield fid, parts
+    return load
+
+
+def route_key(routes):
+    return [(r.origin, r.dest, list(r.nodes), list(r.edges), r.cost) for r in routes]
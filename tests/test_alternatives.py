@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from geoscheduler_core import path_probabilities, route_alternatives, route_many
+
+from networks import grid_graph, random_costs, route_key
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return random_costs(grid_graph(14), seed=1)
+
+
+@pytest.fixture(scope='module')
+def pairs(graph):
+    rng = np.random.default_rng(2)
+    return rng.integers(0, graph.node_count, 6).tolist(), rng.integers(0, graph.node_count, 5).tolist()
+
+
+def by_pair(routes, probs):
+    out = defaultdict(list)
+    for r, p in zip(routes, probs):
+        out[(r.origin, r.dest)].append((r, p))
+    return out
+
+
+def test_one_route_per_pair_is_route_many(graph, pairs):
+    routes, probs = route_alternatives(graph, *pairs, k=1, workers=1)
+    assert route_key(routes) == route_key(route_many(graph, *pairs))
+    assert np.array_equal(probs, np.ones(len(routes)))
+
+
+@pytest.mark.parametrize('k', [2, 3, 5])
+def test_probabilities_sum_to_one_per_pair(graph, pairs, k):
+    routes, probs = route_alternatives(graph, *pairs, k=k, max_detour=0.25, workers=1)
+    shortest = {(r.origin, r.dest): r.cost for r in route_many(graph, *pairs)}
+    grouped = by_pair(routes, probs)
+    assert grouped.keys() == shortest.keys()
+    assert len(routes) > len(grouped)
+    for key, found in grouped.items():
+        assert 1 <= len(found) <= k
+        assert sum(p for _, p in found) == pytest.approx(1.0)
+        costs = [r.cost for r, _ in found]
+        # the shortest path first, alternatives within the detour cap, cheaper ones more likely
+        assert costs[0] == pytest.approx(shortest[key])
+        assert costs == sorted(costs) and costs[-1] <= 1.25 * costs[0] + 1e-9
+        assert [p for _, p in found] == sorted((p for _, p in found), reverse=True)
+        for r, _ in found:
+            assert len(set(r.nodes)) == len(r.nodes)
+            assert graph.edge_length[r.edges].sum() == pytest.approx(r.cost)
+
+
+def test_parallel_matches_serial(graph, pairs):
+    serial = route_alternatives(graph, *pairs, k=3, workers=1)
+    parallel = route_alternatives(graph, *pairs, k=3, workers=2)
+    assert route_key(parallel[0]) == route_key(serial[0])
+    assert np.allclose(parallel[1], serial[1])
+
+
+def test_path_probabilities():
+    assert path_probabilities([100.0]).tolist() == [1.0]
+    p = path_probabilities([100.0, 110.0], theta=10.0)
+    assert p.sum() == pytest.approx(1.0)
+    assert p[1] / p[0] == pytest.approx(np.exp(-1.0))
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import bin_counts, density_levels
+from geoscheduler_core.binning import hex_cells, hex_centres, square_cells, square_centres
+
+
+def nearest_lattice_centre(xs, ys, cell_size):
+    """Brute force: the closest of all hexagon centres around the points."""
+    q, r = np.meshgrid(np.arange(-40, 41), np.arange(-40, 41))
+    cx, cy = hex_centres(q.ravel(), r.ravel(), cell_size)
+    d = (cx[None, :] - xs[:, None]) ** 2 + (cy[None, :] - ys[:, None]) ** 2
+    best = d.argmin(axis=1)
+    return cx[best], cy[best]
+
+
+def test_hex_cells_pick_the_nearest_centre():
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(-1000, 1000, (2, 3000))
+    cx, cy = hex_centres(*hex_cells(xs, ys, 100.0), 100.0)
+    bx, by = nearest_lattice_centre(xs, ys, 100.0)
+    assert np.allclose(cx, bx) and np.allclose(cy, by)
+    # a hexagon 100 across flats reaches at most 100 / sqrt(3) from its centre
+    assert np.hypot(cx - xs, cy - ys).max() <= 100.0 / np.sqrt(3.0) + 1e-9
+
+
+def test_square_cells_contain_their_points():
+    rng = np.random.default_rng(1)
+    xs, ys = rng.uniform(-500, 500, (2, 1000))
+    cx, cy = square_centres(*square_cells(xs, ys, 50.0), 50.0)
+    assert (np.abs(cx - xs) <= 25.0).all() and (np.abs(cy - ys) <= 25.0).all()
+
+
+@pytest.mark.parametrize('shape', ['hex', 'square'])
+def test_bin_counts_totals(shape):
+    rng = np.random.default_rng(2)
+    xs, ys = rng.uniform(0, 1000, (2, 500))
+    counts = rng.integers(0, 20, 500)
+    x, y, routes, volume = bin_counts(xs, ys, counts, 120.0, shape)
+    assert volume.sum() == counts.sum()
+    assert routes.max() == counts.max()
+    assert routes.dtype == volume.dtype == np.int64
+    assert len(set(zip(x.round(6), y.round(6)))) == len(x)
+    _, _, routes_f, volume_f = bin_counts(xs, ys, counts * 0.5, 120.0, shape)
+    assert routes_f.dtype == np.float64 and volume_f.sum() == pytest.approx(counts.sum() / 2)
+
+
+def test_bin_counts_rejects_unknown_shapes():
+    with pytest.raises(ValueError):
+        bin_counts([0.0], [0.0], [1], 10.0, 'triangle')
+
+
+def test_density_levels_get_coarser():
+    rng = np.random.default_rng(3)
+    xs, ys = rng.uniform(0, 5000, (2, 2000))
+    counts = rng.integers(1, 10, 2000)
+    levels = density_levels(xs, ys, counts, 50.0)
+    sizes = [lv.cell_size for lv in levels]
+    assert sizes == sorted(sizes) and len(set(sizes)) == len(sizes)
+    assert all(lv.volume.sum() == counts.sum() for lv in levels)
+    assert [len(lv.x) for lv in levels] == sorted((len(lv.x) for lv in levels), reverse=True)
@@ -0,0 +1,78 @@
+import itertools
+
+import pytest
+
+from geoscheduler_core import RouteCache, route_many, route_many_cached
+from geoscheduler_core import cache as cache_module
+
+from networks import grid_graph, route_key
+
+
+class FakeClock:
+    """Stands in for the time module so last_used values are strictly increasing."""
+
+    def __init__(self):
+        self.ticks = itertools.count(1)
+
+    def time(self):
+        return float(next(self.ticks))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(cache_module, 'time', FakeClock())
+
+
+@pytest.fixture
+def graph():
+    return grid_graph(6)
+
+
+def test_hits_misses_and_cached_no_route(tmp_path, graph):
+    cache = RouteCache(str(tmp_path / 'cache.sqlite'), graph)
+    assert cache.get(0, 35) is RouteCache.MISSING
+    route = route_many(graph, [0], [35])[0]
+    cache.put(0, 35, route.edges, route.cost)
+    cache.put(0, 7, None, None)
+    assert cache.get(0, 35) == (route.nodes, route.edges, route.cost)
+    assert cache.get(0, 7) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.summary() == 'route cache: 2 hits, 1 misses'
+    cache.close()
+
+
+def test_other_network_misses(tmp_path, graph):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = RouteCache(path, graph)
+    cache.put(0, 1, [0], 100.0)
+    cache.close()
+    other = RouteCache(path, grid_graph(6, jitter=1.0))
+    assert other.get(0, 1) is RouteCache.MISSING
+    other.close()
+
+
+def test_least_recently_used_rows_are_evicted(tmp_path, graph, clock):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = RouteCache(path, graph, max_entries=2)
+    for dnode in (1, 2, 3):
+        cache.put(0, dnode, [0], 1.0)
+    # reading the oldest row makes it the most recently used
+    assert cache.get(0, 1) is not RouteCache.MISSING
+    cache.close()
+    cache = RouteCache(path, graph, max_entries=2)
+    assert cache.get(0, 2) is RouteCache.MISSING
+    assert cache.get(0, 1) is not RouteCache.MISSING
+    assert cache.get(0, 3) is not RouteCache.MISSING
+    cache.close()
+
+
+def test_route_many_cached_serves_the_second_run(tmp_path, graph):
+    path = str(tmp_path / 'cache.sqlite')
+    onodes, dnodes = [0, 14, 30], [5, 20, 35]
+    expected = route_key(route_many(graph, onodes, dnodes))
+    for run in range(2):
+        cache = RouteCache(path, graph)
+        routes = route_many_cached(graph, onodes, dnodes, cache, workers=1)
+        assert route_key(routes) == expected
+        assert cache.hits == (9 if run else 0)
+        cache.close()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from geoscheduler_core import kmeans
+
+
+def points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, 10000, (6, 2))
+    return centres[rng.integers(0, 6, n)] + rng.normal(0, 300, (n, 2))
+
+
+def test_kmeans_fixed_seed_is_reproducible():
+    xy = points(2000)
+    a, b = kmeans(xy, 8, seed=42), kmeans(xy, 8, seed=42)
+    assert np.array_equal(a.centers, b.centers)
+    assert np.array_equal(a.labels, b.labels)
+    assert a.counts.sum() == len(xy)
+
+
+def test_minibatch_kmeans_fixed_seed_is_reproducible():
+    xy = points(5000, seed=1)
+    a = kmeans(xy, 10, seed=3, batch_size=256)
+    b = kmeans(xy, 10, seed=3, batch_size=256)
+    assert np.array_equal(a.centers, b.centers)
+    assert np.array_equal(a.labels, b.labels)
+
+
+def test_kmeans_labels_point_to_nearest_center():
+    xy = points(1000, seed=2)
+    res = kmeans(xy, 5, seed=0)
+    d = ((xy[:, None, :] - res.centers[None, :, :]) ** 2).sum(axis=2)
+    assert np.array_equal(res.labels, d.argmin(axis=1))
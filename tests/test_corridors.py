@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import (
+    corridor_segments, corridor_usage, listed_route_ids, route_alternatives, route_many, route_nodes
+)
+
+from networks import grid_graph, random_costs
+
+
+@pytest.fixture(scope='module')
+def run():
+    g = random_costs(grid_graph(10, jitter=10.0, seed=3), seed=4)
+    rng = np.random.default_rng(5)
+    routes = route_many(g, rng.integers(0, g.node_count, 6), rng.integers(0, g.node_count, 6))
+    return g, routes
+
+
+def test_segments_rebuild_every_route(run):
+    g, routes = run
+    segments = corridor_segments(g, routes)
+    for i, r in enumerate(routes):
+        assert route_nodes(segments, i).tolist() == list(r.nodes)
+
+
+def test_segment_counts_match_corridor_usage(run):
+    g, routes = run
+    segments = corridor_segments(g, routes)
+    edge_counts = corridor_usage(g, routes).edge_counts
+    # every segment vertex pair is one edge carrying exactly the segment's routes
+    for s in range(len(segments.feature)):
+        nodes = segments.nodes[segments.vertex_ptr[s]:segments.vertex_ptr[s + 1]]
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            e = np.nonzero(((g.edge_u == a) & (g.edge_v == b)) | ((g.edge_u == b) & (g.edge_v == a)))[0]
+            assert edge_counts[e].max() == segments.route_count[s]
+            assert g.edge_feature[e[0]] == segments.feature[s]
+        users = segments.routes[segments.route_ptr[s]:segments.route_ptr[s + 1]]
+        assert len(users) == segments.route_count[s]
+    # ties share a rank, the next one skips ahead
+    flow = segments.flow
+    assert segments.rank.tolist() == [1 + int((flow > f).sum()) for f in flow]
+
+
+def test_segments_with_alternative_routes(run):
+    g, _ = run
+    routes, probs = route_alternatives(g, [0, 55], [99, 9], k=3, workers=1)
+    segments = corridor_segments(g, routes, probs)
+    for i, r in enumerate(routes):
+        assert route_nodes(segments, i).tolist() == list(r.nodes)
+    # flow adds the probabilities of the routes on each segment
+    for s in range(len(segments.feature)):
+        users = segments.routes[segments.route_ptr[s]:segments.route_ptr[s + 1]]
+        assert segments.flow[s] == pytest.approx(probs[users].sum())
+
+
+def test_listed_route_ids_are_cut_short(run):
+    g, routes = run
+    segments = corridor_segments(g, routes)
+    busiest = int(np.argmax(segments.route_count))
+    count = int(segments.route_count[busiest])
+    assert len(listed_route_ids(segments, busiest).split(',')) == count
+    if count > 1:
+        assert listed_route_ids(segments, busiest, limit=1).endswith(',...')
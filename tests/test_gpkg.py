@@ -0,0 +1,47 @@
+import struct
+
+import pytest
+
+ogr = pytest.importorskip('osgeo.ogr')
+
+from geoscheduler_core.gpkg import GpkgWriter, linestring_wkb, point_wkb, polygon_wkb  # noqa: E402
+
+
+def test_point_and_linestring_wkb():
+    assert point_wkb([1.0, 3.0], [2.0, 4.0]) == [struct.pack('<BIdd', 1, 1, 1.0, 2.0),
+                                                 struct.pack('<BIdd', 1, 1, 3.0, 4.0)]
+    line = linestring_wkb([0.0, 10.0, 10.0], [0.0, 0.0, 5.0])
+    assert line == struct.pack('<BII6d', 1, 2, 3, 0.0, 0.0, 10.0, 0.0, 10.0, 5.0)
+    assert ogr.CreateGeometryFromWkb(line).Length() == pytest.approx(15.0)
+
+
+def test_polygon_wkb():
+    square = [(0.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0), (0.0, 0.0)]
+    wkbs = polygon_wkb([square, [(x + 5.0, y) for x, y in square]])
+    assert len(wkbs) == 2
+    assert wkbs[0] == struct.pack('<BIII10d', 1, 3, 1, 5, *[c for p in square for c in p])
+    assert ogr.CreateGeometryFromWkb(wkbs[1]).Area() == pytest.approx(4.0)
+
+
+def test_commit_writes_every_layer(tmp_path):
+    path = str(tmp_path / 'out.gpkg')
+    writer = GpkgWriter(path)
+    rows = [(i + 1, wkb, (i, 0.5 * i)) for i, wkb in enumerate(point_wkb([0.0, 1.0, 2.0], [0.0, 1.0, 2.0]))]
+    assert writer.write_layer('points', 'Point', [('n', 'int'), ('w', 'double')], rows) == 3
+    writer.commit()
+    ds = ogr.Open(path)
+    layer = ds.GetLayerByName('points')
+    assert layer.GetFeatureCount() == 3
+    assert sorted(f.GetField('w') for f in layer) == [0.0, 0.5, 1.0]
+
+
+def test_rollback_keeps_the_file_as_it_was(tmp_path):
+    path = str(tmp_path / 'out.gpkg')
+    writer = GpkgWriter(path)
+    writer.write_layer('a', 'Point', [], [(1, point_wkb([0.0], [0.0])[0], ())])
+    writer.commit()
+    writer = GpkgWriter(path)
+    writer.write_layer('b', 'Point', [], [(1, point_wkb([0.0], [0.0])[0], ())])
+    writer.rollback()
+    ds = ogr.Open(path)
+    assert [ds.GetLayer(i).GetName() for i in range(ds.GetLayerCount())] == ['a']
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import RoadGraph, RoutingCanceled, route_many, route_many_costs, route_many_parallel
+
+from networks import grid_graph, grid_lines, random_costs, reference_distances, route_key
+
+
+def check_path(graph, route, onode, dnode):
+    assert route.nodes[0] == onode and route.nodes[-1] == dnode
+    for a, b, e in zip(route.nodes, route.nodes[1:], route.edges):
+        assert {int(graph.edge_u[e]), int(graph.edge_v[e])} == {a, b}
+    assert graph.edge_length[route.edges].sum() == pytest.approx(route.cost)
+
+
+def test_from_polylines_merges_shared_vertices():
+    g = grid_graph(5)
+    assert g.node_count == 25
+    assert g.edge_count == 2 * 5 * 4
+    assert np.allclose(g.edge_length, 100.0)
+
+
+def test_nearest_nodes_matches_brute_force():
+    rng = np.random.default_rng(8)
+    # dense clusters, sparse gaps and queries far outside the network
+    xy = np.vstack((rng.normal(0, 50, (300, 2)), rng.normal(3000, 20, (200, 2)), rng.uniform(-500, 5000, (50, 2))))
+    g = RoadGraph(xy[:, 0], xy[:, 1], [], [], [], [])
+    qx, qy = rng.uniform(-20000, 20000, (2, 400))
+    qx[:100], qy[:100] = xy[:100, 0], xy[:100, 1]
+    d = (g.node_x[None, :] - qx[:, None]) ** 2 + (g.node_y[None, :] - qy[:, None]) ** 2
+    assert np.array_equal(g.nearest_nodes(qx, qy), d.argmin(axis=1))
+    # equally close nodes resolve to the lowest index, as argmin does
+    tie = RoadGraph([1.0, -1.0, 0.0], [0.0, 0.0, 5.0], [], [], [], [])
+    assert tie.nearest_nodes([0.0], [0.0]).tolist() == [0]
+    assert len(g.nearest_nodes([], [])) == 0
+
+
+def test_route_many_matches_reference():
+    g = random_costs(grid_graph(9, jitter=20.0, seed=1), seed=2)
+    onodes = [0, 31, 57, 80]
+    dnodes = list(range(0, g.node_count, 5))
+    routes = route_many(g, onodes, dnodes)
+    assert len(routes) == len(onodes) * len(dnodes)
+    for r in routes:
+        ref = reference_distances(g, onodes[r.origin])
+        assert r.cost == pytest.approx(ref[dnodes[r.dest]])
+        check_path(g, r, onodes[r.origin], dnodes[r.dest])
+
+
+def test_route_many_leaves_out_unreachable_pairs():
+    # two grids far apart: no route between them
+    lines = grid_lines(3) + [(fid + 100, [[(x + 10000.0, y) for x, y in part] for part in parts])
+                             for fid, parts in grid_lines(3)]
+    g = RoadGraph.from_polylines(lines)
+    left = int(np.argmin(g.node_x))
+    right = int(np.argmax(g.node_x))
+    routes = route_many(g, [left], [left, right])
+    assert [(r.origin, r.dest) for r in routes] == [(0, 0)]
+    assert routes[0].cost == 0.0
+
+
+def test_route_many_parallel_matches_serial():
+    g = random_costs(grid_graph(12, jitter=10.0, seed=3), seed=4)
+    rng = np.random.default_rng(5)
+    onodes = rng.integers(0, g.node_count, 10).tolist()
+    dnodes = rng.integers(0, g.node_count, 7).tolist()
+    serial = route_many(g, onodes, dnodes)
+    parallel = route_many_parallel(g, onodes, dnodes, workers=2)
+    assert route_key(parallel) == route_key(serial)
+
+
+def test_route_many_stops_once_canceled():
+    g = grid_graph(5)
+    done = []
+    with pytest.raises(RoutingCanceled):
+        route_many(g, [0, 6, 12], [24], progress=lambda n, total: done.append(n),
+                   is_canceled=lambda: len(done) > 0)
+    # the check runs before each origin, so one origin was routed
+    assert done == [1]
+
+
+def test_route_many_costs_matches_each_cost_set():
+    g = grid_graph(8, jitter=10.0, seed=6)
+    rng = np.random.default_rng(7)
+    cost_sets = g.edge_length * rng.uniform(0.5, 2.0, (2, g.edge_count))
+    onodes, dnodes = [0, 9, 20, 33, 63], [5, 40, 58]
+    per_set = route_many_costs(g, onodes, dnodes, cost_sets, workers=2)
+    for costs, routes in zip(cost_sets, per_set):
+        assert route_key(routes) == route_key(route_many(g.with_costs(costs), onodes, dnodes))
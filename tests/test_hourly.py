@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import (
+    CORRIDOR_SPLITS, DEFAULT_CONGESTION, HOUR_MODES, HOURS, corridor_usage, edge_travel_times, hourly_speeds,
+    hourly_weights, load_speed_table, route_hourly, route_many
+)
+
+from networks import grid_graph
+
+
+def test_load_speed_table(tmp_path):
+    path = tmp_path / 'speeds.csv'
+    path.write_text('road,speed\nA,50\nB,' + ','.join(['40'] * 24) + '\n')
+    table = load_speed_table(str(path))
+    assert table == {'A': [50.0], 'B': [40.0] * 24}
+    path.write_text('A,50,40\n')
+    with pytest.raises(ValueError):
+        load_speed_table(str(path))
+
+
+def test_hourly_speeds():
+    profile = list(range(1, 25))
+    speeds = hourly_speeds([50, profile, None, 'fast', 0, 'B'], default=30.0, table=None)
+    assert speeds.shape == (6, HOURS)
+    assert np.allclose(speeds[0], 50 * DEFAULT_CONGESTION)
+    assert speeds[1].tolist() == profile
+    for row in speeds[2:]:
+        assert np.allclose(row, 30 * DEFAULT_CONGESTION)
+    looked_up = hourly_speeds(['A', 'B'], default=30.0, table={'A': [60.0]})
+    assert np.allclose(looked_up[0], 60 * DEFAULT_CONGESTION)
+    assert np.allclose(looked_up[1], 30 * DEFAULT_CONGESTION)
+
+
+def test_edge_travel_times():
+    g = grid_graph(3)
+    # 100 map units of 2 m at 36 km/h (10 m/s) take 20 s
+    times = edge_travel_times(g, np.full((g.edge_feature.max() + 1, HOURS), 36.0), metres_per_unit=2.0)
+    assert times.shape == (HOURS, g.edge_count)
+    assert np.allclose(times, 20.0)
+
+
+def test_route_hourly_matches_each_hour():
+    g = grid_graph(6)
+    speeds = np.full((g.edge_feature.max() + 1, HOURS), 36.0)
+    # the street along x = 200 crawls in the evening peak
+    speeds[4, 16:20] = 5.0
+    times = edge_travel_times(g, speeds)
+    origin_xy, dest_xy = [(0.0, 0.0), (200.0, 0.0)], [(200.0, 500.0), (500.0, 500.0)]
+    jnodes = np.arange(g.node_count)
+    demand = np.ones(HOURS)
+    res = route_hourly(g, origin_xy, dest_xy, jnodes, times, demand=demand, workers=1)
+
+    assert len(np.unique(res.cost_set)) == 2
+    assert res.route_counts.tolist() == [4] * HOURS
+    assert res.junction_volume.shape == res.junction_density.shape == (HOURS, g.node_count)
+    assert res.junction_density.max() == 1.0
+    onodes = g.nearest_nodes(*np.array(origin_xy).T)
+    dnodes = g.nearest_nodes(*np.array(dest_xy).T)
+    for h in (8, 17):
+        routes = route_many(g.with_costs(times[h]), onodes, dnodes)
+        for r in routes:
+            assert res.costs[h, r.origin, r.dest] == pytest.approx(r.cost)
+        counts = corridor_usage(g, routes).node_counts()
+        assert np.allclose(res.junction_volume[h], counts / HOURS)
+
+
+def test_hourly_weights_follow_the_hour_modes():
+    density = np.tile([0.9, 0.1], (HOURS, 1))
+    used, a, b = hourly_weights(density, 0.5, CORRIDOR_SPLITS)
+    assert used.shape == a.shape == b.shape == (HOURS, 2)
+    assert used[:, 1].sum() == 0
+    for h in range(HOURS):
+        assert (a[h, 0], b[h, 0]) == CORRIDOR_SPLITS[HOUR_MODES[h]]
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import RoadGraph, RouteIndex, corridor_usage, reroute_after_edit, route_many
+
+from networks import grid_lines
+
+
+def rerun(lines_before, lines_after, seed=0):
+    """(incremental, full) reroutes of the same pairs after an edit of the road lines."""
+    before, after = RoadGraph.from_polylines(lines_before), RoadGraph.from_polylines(lines_after)
+    rng = np.random.default_rng(seed)
+    onodes = rng.integers(0, before.node_count, 8)
+    dnodes = rng.integers(0, before.node_count, 8)
+    routes = route_many(before, onodes, dnodes)
+    index = RouteIndex(before, routes, onodes, dnodes)
+    new_index, usage, stats = reroute_after_edit(index, corridor_usage(before, routes), after)
+    full = route_many(after, new_index.origin_nodes, new_index.dest_nodes)
+    return new_index, usage, stats, full, after
+
+
+@pytest.mark.parametrize('edit', ['closure', 'new_link', 'reopening'])
+def test_reroute_after_edit_matches_full_reroute(edit):
+    lines = grid_lines(12, jitter=15.0, seed=1)
+    # feature 6 is the street along x = 300
+    closed = [(fid, parts) for fid, parts in lines if fid != 6]
+    # through every grid vertex on the diagonal, so it is a real shortcut
+    diagonal = [(len(lines), [[lines[2 * k][1][0][k] for k in range(12)]])]
+    before, after = {'closure': (lines, closed), 'new_link': (lines, lines + diagonal),
+                     'reopening': (closed, lines)}[edit]
+    index, usage, stats, full, graph = rerun(before, after)
+
+    assert {k: r.cost for k, r in index.routes.items()} == pytest.approx(
+        {(r.origin, r.dest): r.cost for r in full})
+    # the patched counts are those of the routes now in the index
+    fresh = corridor_usage(graph, index.as_list())
+    assert np.array_equal(usage.edge_counts, fresh.edge_counts)
+    assert np.array_equal(usage.terminal_counts, fresh.terminal_counts)
+    assert usage.route_count == len(full)
+    assert 0 < stats['rerouted_pairs'] <= stats['total_pairs'] == 64
+
+
+def test_unrelated_edit_reroutes_nothing():
+    lines = grid_lines(8)
+    # a dead end far outside the grid
+    spur = [(len(lines), [[(5000.0, 5000.0), (5100.0, 5000.0)]])]
+    index, usage, stats, full, _ = rerun(lines, lines + spur)
+    assert stats['rerouted_pairs'] == 0 and stats['added_edges'] == 1
+    assert len(index.routes) == len(full)
+
+
+def test_weighted_usage_is_rejected():
+    g = RoadGraph.from_polylines(grid_lines(4))
+    routes = route_many(g, [0], [15])
+    index = RouteIndex(g, routes, [0], [15])
+    with pytest.raises(ValueError):
+        reroute_after_edit(index, corridor_usage(g, routes, [0.5]), g)
+
+
+def test_route_index_rejects_several_routes_per_pair():
+    g = RoadGraph.from_polylines(grid_lines(4))
+    routes = route_many(g, [0], [15])
+    with pytest.raises(ValueError):
+        RouteIndex(g, routes * 2, [0], [15])
+
+
+def test_ends_snap_to_a_closer_new_node():
+    lines = grid_lines(6)
+    before = RoadGraph.from_polylines(lines)
+    origin_xy, dest_xy = np.array([[240.0, 250.0], [10.0, 480.0]]), np.array([[500.0, 0.0], [490.0, 510.0]])
+    onodes = before.nearest_nodes(origin_xy[:, 0], origin_xy[:, 1])
+    dnodes = before.nearest_nodes(dest_xy[:, 0], dest_xy[:, 1])
+    routes = route_many(before, onodes, dnodes)
+    index = RouteIndex(before, routes, onodes, dnodes, origin_xy=origin_xy, dest_xy=dest_xy)
+    # a diagonal street with a vertex right on the first origin point
+    diagonal = [(len(lines), [[(200.0, 200.0), (240.0, 250.0), (300.0, 300.0)]])]
+    after = RoadGraph.from_polylines(lines + diagonal)
+    new_index, usage, stats = reroute_after_edit(index, corridor_usage(before, routes), after)
+
+    moved = new_index.origin_nodes[0]
+    assert (after.node_x[moved], after.node_y[moved]) == (240.0, 250.0)
+    assert stats['moved_ends'] == 1
+    full = route_many(after, new_index.origin_nodes, new_index.dest_nodes)
+    assert {k: r.cost for k, r in new_index.routes.items()} == pytest.approx(
+        {(r.origin, r.dest): r.cost for r in full})
+    assert np.array_equal(usage.terminal_counts, corridor_usage(after, full).terminal_counts)
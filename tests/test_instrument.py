@@ -0,0 +1,77 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from geoscheduler_core import RunReport, current_rss, report_path
+
+
+def test_report_round_trip(tmp_path):
+    report = RunReport()
+    for _ in range(2):
+        with report.stage('routing'):
+            pass
+    report.count('pairs_attempted', np.int64(12))
+    report.count('pairs_routed', 10)
+    report.fail('unreachable', 2)
+    report.fail('unmatched', 0)
+    report.set(network_nodes=np.int32(25), mode='AM Peak')
+    report.finish('completed')
+    path = report.write(str(tmp_path / 'run_run_report.json'))
+    with open(path) as fh:
+        data = json.load(fh)
+    assert data['status'] == 'completed'
+    assert data['stages']['routing']['calls'] == 2
+    assert data['counters'] == {'pairs_attempted': 12, 'pairs_routed': 10}
+    assert data['failures'] == {'unreachable': 2}
+    assert data['info'] == {'network_nodes': 25, 'mode': 'AM Peak'}
+
+
+def test_array_info_is_written_as_lists(tmp_path):
+    report = RunReport()
+    used = np.array([[1, 0, 1], [1, 1, 1]], dtype=np.int32)
+    report.set(hourly={'used_junctions': used.sum(axis=1), 'cost_set': np.array([0, 1], dtype=np.int64)},
+               peak=np.float32(0.5))
+    report.finish('completed')
+    path = str(tmp_path / 'run_run_report.json')
+    report.write(path)
+    with open(path) as fh:
+        info = json.load(fh)['info']
+    assert info == {'hourly': {'used_junctions': [2, 3], 'cost_set': [0, 1]}, 'peak': 0.5}
+    assert os.listdir(str(tmp_path)) == ['run_run_report.json']
+
+
+@pytest.mark.skipif(current_rss() is None, reason='needs /proc/self/statm')
+def test_stage_memory_is_measured_at_its_ends():
+    report = RunReport()
+    with report.stage('alloc'):
+        # touched pages, so they are resident
+        kept = np.ones(64 * 1024 * 1024 // 8)
+    with report.stage('idle'):
+        pass
+    alloc, idle = report.stages['alloc'], report.stages['idle']
+    assert alloc['rss_growth'] >= kept.nbytes // 2
+    assert alloc['rss_end'] - alloc['rss_start'] == alloc['rss_growth']
+    assert abs(idle['rss_growth']) < kept.nbytes // 2
+    # ru_maxrss only ever grows, so it is reported as the peak of the whole run
+    assert idle['peak_rss_run'] >= alloc['rss_end']
+    assert report.as_dict()['peak_rss_run'] >= idle['peak_rss_run']
+
+
+def test_profiled_stages_get_a_prof_file(tmp_path):
+    report = RunReport(profile=('graph',))
+    with report.stage('graph'):
+        sorted(range(1000))
+    with report.stage('routing'):
+        pass
+    report.finish('completed')
+    path = report.write(str(tmp_path / 'run_run_report.json'))
+    with open(path) as fh:
+        profiles = json.load(fh)['profiles']
+    assert list(profiles) == ['graph'] and profiles['graph']['top']
+    assert os.path.exists(str(tmp_path / profiles['graph']['file']))
+
+
+def test_report_path():
+    assert report_path('/data/run.gpkg') == '/data/run_run_report.json'
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import CORRIDOR_SPLITS, FileFeed, LiveReweighter, SlidingWindow, parse_records
+
+
+def test_window_totals_match_brute_force():
+    rng = np.random.default_rng(0)
+    window = SlidingWindow(6, window=60.0, bucket=10.0)
+    records = []
+    for t in np.sort(rng.uniform(0, 400, 300)).reshape(-1, 10):
+        index, counts = rng.integers(0, 6, len(t)), rng.integers(1, 5, len(t)).astype(float)
+        window.add(index, counts, t)
+        records.extend(zip(index, counts, t))
+        # a record counts while its bucket is one of the last six
+        newest = int(t.max() // 10.0)
+        expected = np.zeros(6)
+        for i, c, rt in records:
+            if int(rt // 10.0) > newest - 6:
+                expected[i] += c
+        assert np.allclose(window.totals, expected)
+
+
+def test_window_expires_everything_after_a_gap():
+    window = SlidingWindow(3, window=30.0, bucket=10.0)
+    window.add(np.array([0, 1, 1]), np.array([1.0, 2.0, 3.0]), np.array([0.0, 5.0, 15.0]))
+    assert window.totals.tolist() == [1.0, 5.0, 0.0]
+    window.advance(25.0)
+    assert window.totals.tolist() == [1.0, 5.0, 0.0]
+    window.advance(35.0)
+    assert window.totals.tolist() == [0.0, 3.0, 0.0]
+    window.advance(1000.0)
+    assert window.totals.tolist() == [0.0, 0.0, 0.0]
+    # records older than the window are dropped
+    assert window.add(np.array([2]), np.array([1.0]), np.array([10.0])) == 0
+
+
+def test_parse_records():
+    lines = ['junction,count,time', '12,3,100', '{"junction": 7, "count": 2, "time": 90.5}',
+             '5', '', '{"count": 1}', '9,,']
+    ids, counts, times, bad = parse_records(lines, now=50.0)
+    assert ids.tolist() == [12, 7, 5, 9]
+    assert counts.tolist() == [3.0, 2.0, 1.0, 1.0]
+    assert times.tolist() == [100.0, 90.5, 50.0, 50.0]
+    assert bad == 2
+
+
+def test_reweighter_reports_changed_junctions():
+    live = LiveReweighter([10, 20, 30], np.array([0.9, 0.2, 0.0]), 0.3, 'AM Peak', CORRIDOR_SPLITS,
+                          blend=0.5, window=60.0, bucket=10.0)
+    assert len(live.changes()[0]) == 0
+    live.ingest(['30,50,100', '99,1,100', 'oops'], now=100.0)
+    assert (live.records, live.unknown) == (1, 2)
+    assert live.density() == pytest.approx([0.45, 0.1, 0.5])
+    changed, used, _, _ = live.changes()
+    assert changed.tolist() == [2] and used.tolist() == [1]
+    # the count leaves the window and the junction falls back
+    live.ingest([], now=200.0)
+    assert live.changes()[0].tolist() == [2]
+
+
+def test_file_feed_reads_appended_lines(tmp_path):
+    path = tmp_path / 'counts.csv'
+    path.write_text('1,1\n')
+    feed = FileFeed(str(path))
+    assert feed.read_lines() == []
+    with open(path, 'a') as fh:
+        fh.write('2,5\n3,')
+    assert feed.read_lines() == ['2,5\n']
+    with open(path, 'a') as fh:
+        fh.write('7\n')
+    # the half-written line waits for its end
+    assert feed.read_lines() == ['3,7\n']
+    feed.close()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from geoscheduler_core import density_at, representatives, route_od
+
+from networks import grid_graph
+
+
+def zone_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, 10000, (6, 2))
+    return centres[rng.integers(0, 6, n)] + rng.normal(0, 300, (n, 2))
+
+
+def test_representatives_keep_the_zone_count():
+    xy = zone_points(500, seed=3)
+    reps, weights = representatives(xy, 20, 7)
+    assert len(reps) == 20
+    assert weights.sum() == len(xy)
+    reps2, weights2 = representatives(xy, 20, 7)
+    assert np.array_equal(reps, reps2) and np.array_equal(weights, weights2)
+    # few enough points are kept as they are
+    reps, weights = representatives(xy[:5], 20, 7)
+    assert np.array_equal(reps, xy[:5]) and weights.tolist() == [1.0] * 5
+
+
+def test_density_at_gives_unmatched_junctions_zero():
+    assert density_at([2, -1, 0], np.array([0.5, 0.25, 1.0])).tolist() == [1.0, 0.0, 0.5]
+
+
+def test_route_od_snaps_and_routes_every_pair(tmp_path):
+    g = grid_graph(6)
+    origin_xy = np.array([(3.0, 2.0), (297.0, 104.0)])
+    dest_xy = np.array([(502.0, 498.0), (96.0, 401.0), (204.0, 0.0)])
+    jnodes = np.arange(g.node_count)
+    cache_path = str(tmp_path / 'cache.sqlite')
+    for run in range(2):
+        res = route_od(g, origin_xy, dest_xy, np.ones(2), np.ones(3), jnodes, 0.5, workers=1,
+                       cache_path=cache_path)
+        assert res.cache_summary == ('route cache: 6 hits, 0 misses' if run else 'route cache: 0 hits, 6 misses')
+    assert len(res.routes) == res.usage.route_count == 6 and res.sampler is None
+    for r in res.routes:
+        start, end = r.nodes[0], r.nodes[-1]
+        assert np.hypot(g.node_x[start] - origin_xy[r.origin, 0], g.node_y[start] - origin_xy[r.origin, 1]) <= 5
+        assert np.hypot(g.node_x[end] - dest_xy[r.dest, 0], g.node_y[end] - dest_xy[r.dest, 1]) <= 5
+
+
+def test_adaptive_route_od_keeps_its_sampler():
+    g = grid_graph(6)
+    rng = np.random.default_rng(1)
+    origin_xy, dest_xy = rng.uniform(0, 500, (2, 12, 2))
+    res = route_od(g, origin_xy, dest_xy, np.ones(12), np.ones(12), np.arange(g.node_count), 0.5,
+                   workers=1, adaptive=True, seed=0)
+    assert res.sampler is not None
+    assert len(res.routes) == res.sampler.drawn <= 144
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import ResultStore, store_path, write_results
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'out_results.gsr')
+    tables = {
+        'junctions': {'fid': np.arange(5, dtype=np.int64), 'density': np.linspace(0, 1, 5),
+                      'used': np.array([1, 0, 1, 1, 0], dtype=np.uint8)},
+        'hours': {'routes': np.arange(24, dtype=np.int32)},
+        'empty': {'x': np.zeros(0)},
+    }
+    write_results(path, tables, meta={'route_count': 12, 'mode': 'AM Peak'})
+    with ResultStore(path) as rs:
+        assert rs.meta == {'route_count': 12, 'mode': 'AM Peak'}
+        assert rs.tables() == ['empty', 'hours', 'junctions']
+        assert rs.length('junctions') == 5 and rs.length('empty') == 0 and rs.length('missing') == 0
+        for table, cols in tables.items():
+            got = rs.table(table)
+            assert got.keys() == cols.keys()
+            for name, values in cols.items():
+                assert got[name].dtype == values.dtype
+                assert np.array_equal(got[name], values)
+        with pytest.raises(KeyError):
+            rs.column('junctions', 'nope')
+    with pytest.raises(ValueError):
+        rs.column('junctions', 'fid')
+
+
+def test_rewrite_replaces_the_store(tmp_path):
+    path = str(tmp_path / 'out_results.gsr')
+    write_results(path, {'t': {'a': np.arange(3)}})
+    write_results(path, {'t': {'a': np.arange(7)}})
+    with ResultStore(path) as rs:
+        assert rs.column('t', 'a').tolist() == list(range(7))
+
+
+def test_invalid_tables_are_rejected(tmp_path):
+    path = str(tmp_path / 'bad.gsr')
+    with pytest.raises(ValueError):
+        write_results(path, {'t': {'a': np.arange(3), 'b': np.arange(4)}})
+    with pytest.raises(ValueError):
+        write_results(path, {'t': {'a': np.zeros((2, 2))}})
+    (tmp_path / 'other.gsr').write_bytes(b'not a store')
+    with pytest.raises(ValueError):
+        ResultStore(str(tmp_path / 'other.gsr'))
+
+
+def test_store_path():
+    assert store_path('/data/run.gpkg') == '/data/run_results.gsr'
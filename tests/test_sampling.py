@@ -0,0 +1,57 @@
+import numpy as np
+
+from geoscheduler_core import AdaptiveSampler, route_adaptive
+
+from networks import grid_graph
+
+
+def test_sampler_converges_after_patience_stable_batches():
+    sampler = AdaptiveSampler(np.ones(10), np.ones(10), batch_pairs=5, top_n=3, tol=0.0, patience=2, seed=0)
+    counts = np.array([5, 0, 3, 9, 1, 0, 7])
+    used = np.array([True, False, True])
+    results = []
+    for _ in range(3):
+        assert len(sampler.next_batch()) == 5
+        results.append(sampler.update(counts, used))
+    # the first batch has nothing to compare with, then two unchanged batches
+    assert results == [False, False, True]
+    assert sampler.converged and sampler.confidence == 1.0
+    assert sampler.next_batch() == []
+    assert sampler.drawn == 15
+
+
+def test_sampler_change_resets_the_stable_count():
+    sampler = AdaptiveSampler(np.ones(4), np.ones(4), top_n=2, tol=0.1, patience=2, seed=0)
+    used = np.zeros(3, dtype=bool)
+    sampler.update(np.array([9, 8, 0, 0]), used)
+    assert not sampler.update(np.array([9, 8, 0, 0]), used)
+    # top-2 edges {0, 1} -> {2, 3}: Jaccard change 1
+    assert not sampler.update(np.array([0, 0, 9, 8]), used)
+    assert sampler.stable == 0 and sampler.last_change == 1.0
+    assert not sampler.update(np.array([0, 0, 9, 8]), used)
+    assert sampler.update(np.array([0, 0, 9, 8]), used)
+
+
+def test_sampler_draws_every_pair_once():
+    sampler = AdaptiveSampler(np.arange(1, 6), np.arange(1, 5), batch_pairs=3, seed=1)
+    pairs = []
+    while True:
+        batch = sampler.next_batch()
+        if not batch:
+            break
+        pairs.extend(batch)
+    assert sorted(pairs) == [(o, d) for o in range(5) for d in range(4)]
+    assert sampler.drawn_mask().all()
+
+
+def test_route_adaptive_stops_once_corridors_settle():
+    g = grid_graph(10)
+    # every pair runs the same way, so the top edges never change
+    onodes, dnodes = [0] * 20, [g.node_count - 1] * 20
+    sampler = AdaptiveSampler(np.ones(20), np.ones(20), batch_pairs=10, tol=0.02, patience=2, seed=0)
+    routes, usage = route_adaptive(g, onodes, dnodes, sampler, lambda u: u.node_counts() > 0)
+    assert sampler.converged
+    assert sampler.drawn == 30 < sampler.total_pairs
+    assert len(routes) == usage.route_count == 30
+    mask = sampler.drawn_mask()
+    assert mask.sum() == 30 and all(mask[r.origin, r.dest] for r in routes)
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import (
+    CORRIDOR_SPLITS, RoadGraph, SignalNetwork, compare_modes, corridor_usage, route_many, simulate
+)
+
+
+@pytest.fixture(scope='module')
+def crossing():
+    """One signalised crossing: an east-west road over a north-south road."""
+    g = RoadGraph.from_polylines([(0, [[(-100.0, 0.0), (0.0, 0.0), (100.0, 0.0)]]),
+                                  (1, [[(0.0, -100.0), (0.0, 0.0), (0.0, 100.0)]])])
+    node = {(x, y): i for i, (x, y) in enumerate(zip(g.node_x, g.node_y))}
+    west, east, south, north, centre = (node[p] for p in [(-100.0, 0.0), (100.0, 0.0), (0.0, -100.0),
+                                                          (0.0, 100.0), (0.0, 0.0)])
+    through = route_many(g, [west], [east])
+    crossing_routes = route_many(g, [south], [north])
+    # the east-west road carries most routes, so it is the corridor
+    usage = corridor_usage(g, through * 3 + crossing_routes)
+    net = SignalNetwork(g, [centre], usage.edge_counts)
+    return net, through, crossing_routes
+
+
+def test_corridor_and_cross_approaches(crossing):
+    net, through, crossing_routes = crossing
+    stops, gaps = net.approaches(through[0].nodes, through[0].edges)
+    assert stops.tolist() == [0] and gaps.tolist() == [100.0]
+    assert net.approaches(crossing_routes[0].nodes, crossing_routes[0].edges)[0].tolist() == [1]
+
+
+def test_every_vehicle_is_served(crossing):
+    net, through, crossing_routes = crossing
+    scenario = net.scenario(through + crossing_routes, vehicles_per_hour=900, cross_flow=200, seed=1)
+    res = simulate(scenario, [0.6], [0.4])
+    assert res.vehicles.sum() == res.events == scenario.vehicle_count
+    assert (res.delay >= 0).all() and res.max_queue[0] >= 1
+    assert res.mean_queue[0] == pytest.approx(res.delay[0] / scenario.duration)
+
+
+def test_same_traffic_for_every_weighting(crossing):
+    net, through, crossing_routes = crossing
+    scenario = net.scenario(through + crossing_routes, vehicles_per_hour=900, seed=2)
+    a = simulate(scenario, [0.7], [0.3])
+    b = simulate(scenario, [0.7], [0.3])
+    assert all(np.array_equal(x, y) for x, y in zip(a, b))
+    modes = compare_modes(scenario, np.array([1.0]), 0.5, ('AM Peak', 'Off-Peak'), CORRIDOR_SPLITS)
+    assert modes['AM Peak'].total_vehicles == modes['Off-Peak'].total_vehicles
+
+
+def test_more_green_means_less_corridor_delay(crossing):
+    net, through, _ = crossing
+    scenario = net.scenario(through, vehicles_per_hour=600, cross_flow=0, seed=3)
+    short = simulate(scenario, [0.2], [0.8])
+    long_ = simulate(scenario, [0.8], [0.2])
+    assert long_.network_mean_delay < short.network_mean_delay
+
+
+def test_speed_is_converted_to_map_units(crossing):
+    net, through, _ = crossing
+    metres = net.scenario(through, vehicles_per_hour=600, seed=5)
+    # the same 100 map units drawn in feet are only about 30 m long
+    feet = net.scenario(through, vehicles_per_hour=600, seed=5, metres_per_unit=0.3048)
+    assert metres.leg_gaps[0] == pytest.approx([100.0 / 13.9])
+    assert feet.leg_gaps[0] == pytest.approx([100.0 * 0.3048 / 13.9])
+
+
+def test_light_traffic_waits_half_the_red_on_average(crossing):
+    net, through, _ = crossing
+    # light, uniform arrivals: no queues, so the mean delay is red^2 / (2 * cycle)
+    scenario = net.scenario(through, vehicles_per_hour=20, cross_flow=0, duration=3600.0 * 200, seed=4)
+    cycle, lost_time = 90.0, 4.0
+    res = simulate(scenario, [0.5], [0.5], cycle=cycle, lost_time=lost_time)
+    red = cycle - (cycle - 2 * lost_time) * 0.5
+    assert res.network_mean_delay == pytest.approx(red ** 2 / (2 * cycle), rel=0.05)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import GridIndex, match_points
+
+
+def brute_nearest(xs, ys, qx, qy, tolerance):
+    d = np.hypot(xs[None, :] - qx[:, None], ys[None, :] - qy[:, None])
+    best = d.argmin(axis=1)
+    return np.where(d[np.arange(len(qx)), best] <= tolerance, best, -1)
+
+
+@pytest.mark.parametrize('tolerance', [5.0, 25.0, 200.0])
+def test_match_points_matches_brute_force(tolerance):
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(0, 1000, (2, 400))
+    qx, qy = rng.uniform(-50, 1050, (2, 300))
+    assert np.array_equal(match_points(xs, ys, qx, qy, tolerance), brute_nearest(xs, ys, qx, qy, tolerance))
+
+
+def test_match_points_exact_hits_and_empty_source():
+    xs, ys = np.array([0.0, 10.0, 20.0]), np.array([0.0, 0.0, 5.0])
+    assert match_points(xs, ys, xs, ys, 0.0).tolist() == [0, 1, 2]
+    assert match_points([], [], [1.0], [1.0], 10.0).tolist() == [-1]
+
+
+def test_grid_index_distances_and_cell_limit():
+    rng = np.random.default_rng(1)
+    xs, ys = rng.uniform(0, 100, (2, 50))
+    index = GridIndex(xs, ys, 10.0)
+    qx, qy = rng.uniform(0, 100, (2, 40))
+    idx, dist = index.nearest(qx, qy, 10.0)
+    found = idx >= 0
+    assert np.allclose(dist[found], np.hypot(xs[idx[found]] - qx[found], ys[idx[found]] - qy[found]))
+    assert np.array_equal(idx, brute_nearest(xs, ys, qx, qy, 10.0))
+    with pytest.raises(ValueError):
+        index.nearest(qx, qy, 11.0)
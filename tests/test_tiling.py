@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import RoadGraph, corridor_usage, match_points, route_many, route_tiled
+
+from networks import grid_lines, tile_loader
+
+
+def whole_network(lines, origin_xy, dest_xy):
+    g = RoadGraph.from_polylines(lines)
+    onodes = g.nearest_nodes(origin_xy[:, 0], origin_xy[:, 1])
+    dnodes = g.nearest_nodes(dest_xy[:, 0], dest_xy[:, 1])
+    routes = route_many(g, onodes, dnodes)
+    costs = np.full((len(onodes), len(dnodes)), np.inf)
+    for r in routes:
+        costs[r.origin, r.dest] = r.cost
+    return g, routes, costs
+
+
+@pytest.mark.parametrize('tile_size', [350.0, 700.0, 5000.0])
+def test_route_tiled_matches_whole_network(tile_size):
+    lines = grid_lines(15, jitter=20.0, seed=2)
+    g = RoadGraph.from_polylines(lines)
+    rng = np.random.default_rng(3)
+    # OD points on network nodes, so both runs snap them to the same node
+    pick_o, pick_d = rng.integers(0, g.node_count, 9), rng.integers(0, g.node_count, 7)
+    origin_xy = np.column_stack((g.node_x[pick_o], g.node_y[pick_o]))
+    dest_xy = np.column_stack((g.node_x[pick_d], g.node_y[pick_d]))
+    extent = (g.node_x.min(), g.node_y.min(), g.node_x.max(), g.node_y.max())
+    junction_xy = np.column_stack((g.node_x, g.node_y))
+
+    res = route_tiled(tile_loader(lines), extent, tile_size, origin_xy, dest_xy, junction_xy)
+    _, routes, costs = whole_network(lines, origin_xy, dest_xy)
+
+    assert res.route_count == len(routes)
+    assert np.allclose(res.costs, costs)
+    # jittered vertices make every shortest path unique, so node counts agree exactly
+    usage = corridor_usage(g, routes)
+    node = match_points(g.node_x, g.node_y, res.node_x, res.node_y, 1e-6)
+    assert (node >= 0).all()
+    full_counts = usage.node_counts()
+    assert np.array_equal(res.node_counts, full_counts[node])
+    assert full_counts.sum() == res.node_counts.sum()
+    assert np.allclose(res.junction_density, usage.node_density())
+
+
+def test_route_tiled_counts_tiles():
+    lines = grid_lines(10)
+    res = route_tiled(tile_loader(lines), (0.0, 0.0, 900.0, 900.0), 300.0,
+                      [(0.0, 0.0)], [(900.0, 900.0)])
+    assert res.tile_count == 9
+    assert res.boundary_count > 0
+    assert res.costs[0, 0] == pytest.approx(1800.0)
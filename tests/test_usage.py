@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import corridor_usage, route_many
+
+from networks import grid_graph, random_costs
+
+
+@pytest.fixture(scope='module')
+def run():
+    g = random_costs(grid_graph(8, jitter=10.0, seed=1), seed=2)
+    rng = np.random.default_rng(3)
+    routes = route_many(g, rng.integers(0, g.node_count, 5), rng.integers(0, g.node_count, 6))
+    return g, routes
+
+
+def test_counts_match_the_route_paths(run):
+    g, routes = run
+    usage = corridor_usage(g, routes)
+    edges = np.concatenate([np.asarray(r.edges, dtype=np.int64) for r in routes])
+    nodes = np.concatenate([np.asarray(r.nodes, dtype=np.int64) for r in routes])
+    assert np.array_equal(usage.edge_counts, np.bincount(edges, minlength=g.edge_count))
+    # shortest paths visit a node at most once
+    assert np.array_equal(usage.node_counts(), np.bincount(nodes, minlength=g.node_count))
+    assert usage.route_count == len(routes)
+
+
+def test_feature_counts_take_the_busiest_segment(run):
+    g, routes = run
+    usage = corridor_usage(g, routes)
+    features = usage.feature_counts()
+    for f in range(len(features)):
+        assert features[f] == usage.edge_counts[g.edge_feature == f].max()
+    density = usage.node_density()
+    assert density.max() == 1.0 and density.min() >= 0.0
+
+
+def test_a_route_without_edges_counts_its_node_once():
+    g = grid_graph(3)
+    usage = corridor_usage(g, route_many(g, [4], [4]))
+    assert usage.node_counts().tolist() == [1 if n == 4 else 0 for n in range(g.node_count)]
+    assert usage.edge_counts.sum() == 0
+
+
+def test_weighted_counts_are_expected_routes(run):
+    g, routes = run
+    weights = np.random.default_rng(4).uniform(0.1, 1.0, len(routes))
+    usage = corridor_usage(g, routes, weights)
+    expected = np.zeros(g.node_count)
+    for r, w in zip(routes, weights):
+        expected[list(r.nodes)] += w
+    assert usage.edge_counts.dtype == np.float64
+    assert np.allclose(usage.node_counts(), expected)
+    assert usage.feature_counts().dtype == np.float64
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from geoscheduler_core import CORRIDOR_SPLITS, NS_EW_SPLITS, TIME_MODES, junction_weights
+
+
+def test_used_junctions_get_the_time_of_day_split():
+    used, a, b = junction_weights([0.0, 0.29, 0.3, 1.0], 0.3, 'AM Peak', NS_EW_SPLITS)
+    assert used.tolist() == [0, 0, 1, 1] and used.dtype == np.int32
+    assert a.tolist() == [0.5, 0.5, 0.75, 0.75]
+    assert b.tolist() == [0.5, 0.5, 0.25, 0.25]
+
+
+@pytest.mark.parametrize('splits', [NS_EW_SPLITS, CORRIDOR_SPLITS])
+def test_every_mode_splits_the_whole_cycle(splits):
+    density = np.linspace(0, 1, 11)
+    for mode in TIME_MODES:
+        used, a, b = junction_weights(density, 0.5, mode, splits)
+        assert np.allclose(a + b, 1.0)
+        # the threshold only decides which junctions change, not how
+        assert np.array_equal(used, junction_weights(density, 0.5, 'Off-Peak', splits)[0])
+
+
+def test_peaks_swap_ns_ew_but_keep_the_corridor():
+    _, am, _ = junction_weights([1.0], 0.3, 'AM Peak', NS_EW_SPLITS)
+    _, pm, _ = junction_weights([1.0], 0.3, 'PM Peak', NS_EW_SPLITS)
+    assert (am[0], pm[0]) == (0.75, 0.25)
+    _, am, _ = junction_weights([1.0], 0.3, 'AM Peak', CORRIDOR_SPLITS)
+    _, pm, _ = junction_weights([1.0], 0.3, 'PM Peak', CORRIDOR_SPLITS)
+    assert am[0] == pm[0] == 0.75
+
+
+def test_unknown_mode_is_even():
+    used, a, b = junction_weights([0.9], 0.3, 'Night', NS_EW_SPLITS)
+    assert used.tolist() == [1] and (a[0], b[0]) == (0.5, 0.5)